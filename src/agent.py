@@ -1,94 +1,140 @@
 import json
 import time
 import os
+import re
 import argparse
 from datetime import datetime
 from urllib.parse import urlparse
 from selenium.webdriver.common.keys import Keys
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 
-OUTPUT_JSON = "output.json"
+from cdp import cdp_session, insert_text, run_script
+from chat_watch import ChatWatcher
+from driver_resolver import start_driver
+from inventory import Inventory, OUTPUT_JSON, get_price, get_min_price
+from network_capture import NetworkCapture
+from dom_snapshot import CHAT_LIST_JS, TRANSCRIPT_JS, classify_row, rank_conversations
+from selector_registry import selector_registry
+from thread_queue import ThreadQueue
+from transcript import Transcript
+from waits import (wait_until, any_of, percentile, chat_list_rendered, composer_empty, composer_present, document_ready,
+                   on_thread, rows_stable, thread_key, thread_switched, url_on_thread)
 
 try:
-    from buyer_state import BuyerStateStore
+    from buyer_state import BuyerStateStore, RetentionPolicy, open_buyer_state
 except Exception:
     BuyerStateStore = None
 
 ###########################################################################
 # SETUP: Connect to already-open Chrome in remote debugging mode
 ###########################################################################
-def get_driver():
+DEFAULT_DEBUGGER_ADDRESS = os.getenv("DEBUGGER_ADDRESS", "127.0.0.1:9222")
+
+
+def get_driver(debugger_address: str = DEFAULT_DEBUGGER_ADDRESS):
     """Connect to existing Chrome instance via remote debugging."""
     chrome_options = Options()
     chrome_options.add_argument("--start-maximized")
     
-    print("🔗 Connecting to existing Chrome instance at 127.0.0.1:9222...")
-    chrome_options.debugger_address = "127.0.0.1:9222"
+    print(f"🔗 Connecting to existing Chrome instance at {debugger_address}...")
+    chrome_options.debugger_address = debugger_address
 
     try:
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver = start_driver(chrome_options, debugger_address, log=lambda msg: print(f"⏱️ {msg}"))
         print("✅ Successfully connected to Chrome")
         return driver
     except Exception as e:
         print(f"❌ Failed to connect to Chrome: {e}")
-        print("💡 Make sure Chrome is running with: --remote-debugging-port=9222")
+        print(f"💡 Make sure Chrome is running with: --remote-debugging-port={debugger_address.split(':')[-1]}")
         raise
 
 
 ###########################################################################
-# JSON Storage Helpers
+# Messenger Agent (Selenium)
 ###########################################################################
-class Inventory:
-    def __init__(self, output_path):
-        # Get the directory where this script is located
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        self.path = os.path.join(script_dir, output_path)
-        self.items = self.load()
-
-    def load(self):
-        try:
-            with open(self.path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print(f"⚠️ Warning: {self.path} not found. Starting with empty inventory.")
-            return []
-        except json.JSONDecodeError as e:
-            print(f"⚠️ Error parsing {self.path}: {e}")
-            return []
-
-    def save(self):
-        with open(self.path, "w") as f:
-            json.dump(self.items, f, indent=4)
-
-    def get_item_by_title(self, message_text):
-        """Find item if any words from its Title appear in the message."""
-        for item in self.items:
-            item_title = item.get("Title", "")  # Note: Capital T to match output.json
-            if not item_title:
-                continue
-            # Check if any significant words from title appear in message
-            title_words = [w.lower() for w in item_title.split() if len(w) > 3]
-            message_lower = message_text.lower()
-            if any(word in message_lower for word in title_words):
-                return item
-        return None
+# Chat list rows on the Messages page
+CHAT_LIST_XPATHS = [
+    "//a[@role='link' and contains(@href, '/messages/t/')]",  # Direct thread links first
+    "//div[@aria-label='Chats']//div[@role='row']",  # Chats pane rows
+    "//div[@role='grid']//div[@role='row']",  # Grid rows (broad)
+    "//div[@role='listitem']",  # List items
+]
+# Buyer name and item in the thread header - often formatted as "Name · Item Title"
+THREAD_HEADER_SELECTORS = [
+    "div[aria-label='Conversation Information'] h1 span[dir='auto']",
+    "header h2 span[dir='auto']",
+    "div[role='banner'] span[dir='auto']",
+    "h2[class] span[dir='auto']",
+]
+# Common patterns for item title in conversation header
+THREAD_ITEM_SELECTORS = [
+    "a[href*='/marketplace/item/'] span[dir='auto']",  # Marketplace item link
+    "div[aria-label*='Marketplace'] span[dir='auto']",
+    "a[role='link'][href*='/marketplace/'] span",
+]
+
+# arguments: [thread id]; clicks the chat list link for that thread, true if there was one
+CLICK_THREAD_LINK_JS = r"""
+var id = arguments[0], re = new RegExp('/messages/t/' + id + '(?:[/?#]|$)');
+var links = document.querySelectorAll("a[href*='/messages/t/" + id + "']");
+for (var i = 0; i < links.length; i++) {
+    if (re.test(links[i].getAttribute('href') || '')) { links[i].click(); return true; }
+}
+return false;
+"""
 
 
-###########################################################################
-# Messenger Agent (Selenium)
-###########################################################################
 class MessengerAgent:
-    def __init__(self, driver, inventory):
+    def __init__(self, driver, inventory, state_flush_interval=None, retention_days=30, max_hot_threads=2000,
+                 network_capture=False, state=None, account=None):
         self.driver = driver
         self.inventory = inventory
-        self.state = BuyerStateStore() if BuyerStateStore else None
+        # Threads are opened at <messages_url>/t/<id>/
+        self.messages_url = "https://www.facebook.com/messages"
+        # Ranked rows from the last chat list snapshot (see dom_snapshot.rank_conversations)
+        self.conversation_rows = []
+        # Messages of the thread read last (see get_transcript)
+        self.transcript = Transcript()
+        # iframe path (list of frame descriptors) where conversations were last found
+        self._conversation_frame_path = None
+        self.iframe_scan_budget = 20.0
+        # Thread data parsed from Messenger's GraphQL responses (opt-in; DOM is the fallback)
+        self.capture = None
+        # When the open thread was last navigated to; captured data older than this is stale
+        self.thread_opened_at = 0.0
+        if network_capture:
+            capture = NetworkCapture(cdp_session(driver))
+            if capture.start():
+                print("📡 Network capture on: reading threads from GraphQL responses")
+                self.capture = capture
+            else:
+                print("⚠️ Network capture needs the CDP websocket; reading the DOM instead")
+        # Write-behind: state mutations are coalesced and flushed once per pass.
+        # Idle/sold threads are moved to a cold archive at each flush.
+        # A ``state`` passed in (e.g. shared by tab workers) is used as is.
+        self.state = state
+        if state is None and BuyerStateStore:
+            retention = RetentionPolicy(
+                max_idle_days=retention_days,
+                max_hot_threads=max_hot_threads,
+                sold_item_ids=self._sold_item_ids,
+            )
+            self.state = open_buyer_state(account=account, write_behind=True,
+                                          flush_interval=state_flush_interval, retention=retention)
+
+    def _sold_item_ids(self):
+        return self.inventory.sold_item_ids()
+
+    def flush_state(self):
+        """Persist buyer state changes accumulated during the pass."""
+        if self.state:
+            try:
+                self.state.flush()
+            except Exception as e:
+                print(f"⚠️ Failed to save buyer state: {e}")
 
     def open_messenger(self):
         print("🔗 Opening Facebook Marketplace Inbox...")
@@ -102,14 +148,12 @@ class MessengerAgent:
             if "marketplace/inbox" not in current_url.lower():
                 print("➡️ Navigating to inbox...")
                 self.driver.get("https://www.facebook.com/marketplace/inbox")
-                time.sleep(8)  # Wait longer for dynamic content
             else:
                 print("✅ Already on inbox page")
-                time.sleep(3)
             
             # Wait for page to fully load
             print("⏳ Waiting for inbox to fully load...")
-            time.sleep(3)
+            wait_until(self.driver, any_of(chat_list_rendered, document_ready), timeout=15, site="open_messenger")
             # Ensure we're at the top-level DOM to start
             try:
                 self.driver.switch_to.default_content()
@@ -126,15 +170,12 @@ class MessengerAgent:
             current_url = self.driver.current_url
             if "/messages" not in current_url:
                 self.driver.get("https://www.facebook.com/messages")
-                time.sleep(8)
-            else:
-                time.sleep(3)
             try:
                 self.driver.switch_to.default_content()
             except Exception:
                 pass
             print("⏳ Waiting for messages page to load...")
-            time.sleep(3)
+            wait_until(self.driver, chat_list_rendered, timeout=15, site="open_messages")
         except Exception as e:
             print(f"❌ Error opening messages: {e}")
             raise
@@ -144,36 +185,37 @@ class MessengerAgent:
         Returns a list of visible conversation elements.
         """
         print(f"🔍 Scanning page for conversation elements (mode={mode})...")
-        # Small extra wait to allow dynamic content to populate
-        time.sleep(2)
-
+        self.conversation_rows = []
         # Always start from default content
         try:
             self.driver.switch_to.default_content()
         except Exception:
             pass
+
+        # Give dynamic content a moment to populate (returns as soon as rows exist)
+        if mode == "messages":
+            wait_until(self.driver, chat_list_rendered, timeout=5, site="chat_list")
         
         # Try XPath to find any links or divs that might be conversations
+        # (the selector registry moves selectors that have stopped matching to the end)
+        registry = selector_registry()
+        group = f"chat_list_{mode}"
         if mode == "messages":
-            xpath_selectors = [
-                "//a[@role='link' and contains(@href, '/messages/t/')]",  # Direct thread links first
-                "//div[@aria-label='Chats']//div[@role='row']",  # Chats pane rows
-                "//div[@role='grid']//div[@role='row']",  # Grid rows (broad)
-                "//div[@role='listitem']",  # List items
-            ]
+            xpath_selectors = CHAT_LIST_XPATHS
             # Try to force-load more rows by scrolling any visible grid/list container
             try:
-                for container_sel in ["//div[@aria-label='Chats']", "//div[@role='grid']", "//div[@role='list']"]:
-                    try:
-                        container = self.driver.find_element(By.XPATH, container_sel)
-                        self.driver.execute_script("arguments[0].scrollTop = 0;", container)
-                        time.sleep(0.3)
-                        for _ in range(4):
-                            self.driver.execute_script("arguments[0].scrollTop = arguments[0].scrollTop + arguments[0].clientHeight;", container)
-                            time.sleep(0.3)
-                        break
-                    except Exception:
-                        continue
+                container = registry.find(self.driver, "chat_container",
+                                          ["//div[@aria-label='Chats']", "//div[@role='grid']", "//div[@role='list']"],
+                                          by=By.XPATH)
+                if container is not None:
+                    self.driver.execute_script("arguments[0].scrollTop = 0;", container)
+                    for _ in range(4):
+                        before = chat_list_rendered(self.driver)
+                        self.driver.execute_script("arguments[0].scrollTop = arguments[0].scrollTop + arguments[0].clientHeight;", container)
+                        # Stop once a scroll no longer loads more rows
+                        if not wait_until(self.driver, lambda d: chat_list_rendered(d) > before,
+                                          timeout=1.0, site="chat_list_scroll", record_timeouts=False):
+                            break
             except Exception:
                 pass
         else:
@@ -182,150 +224,58 @@ class MessengerAgent:
                 "//div[@role='row']",  # Any row elements
                 "//div[contains(@aria-label, 'onversation')]",  # Conversation labels
             ]
+        xpath_selectors = registry.order(group, xpath_selectors)
         
-        for xpath in xpath_selectors:
+        if mode == "messages":
+            # One injected script reads every row (link, text, aria, blue dot,
+            # bold title) so the round-trip count doesn't grow with the inbox.
+            t0 = time.perf_counter()
             try:
-                print(f"🔍 Trying XPath: {xpath}")
-                elements = self.driver.find_elements(By.XPATH, xpath)
-                if elements:
-                    print(f"✅ Found {len(elements)} elements")
-                    # For messages mode, prefer unread items and preserve order
-                    if mode == "messages":
-                        ordered = elements
-                        enriched = []
-                        for idx, el in enumerate(ordered):
-                            try:
-                                # Determine click target; prefer nested link with /messages/t/
-                                click_target = el
-                                try:
-                                    link = el.find_element(By.XPATH, ".//a[contains(@href, '/messages/t/')]")
-                                    click_target = link
-                                except Exception:
-                                    try:
-                                        link = el.find_element(By.XPATH, ".//a[@role='link']")
-                                        click_target = link
-                                    except Exception:
-                                        pass
-                                # Skip if el is a direct <a> but doesn't contain /messages/t/ (nav link)
-                                if el.tag_name == 'a':
-                                    href = el.get_attribute('href') or ''
-                                    if '/messages/t/' not in href:
-                                        continue
-                                # Also skip if no href found at all
-                                target_href = click_target.get_attribute('href') if hasattr(click_target, 'get_attribute') else ''
-                                if not target_href or '/messages/t/' not in target_href:
-                                    # If it's a row element, might still be valid if it has text
-                                    if el.tag_name not in ['div']:
-                                        continue
-                                # Heuristic: unread if aria-label mentions unread/new
-                                aria_labels = [
-                                    (el.get_attribute("aria-label") or ""),
-                                    (click_target.get_attribute("aria-label") or ""),
-                                ]
-                                all_aria = " ".join(aria_labels).lower()
-                                unread = any(w in all_aria for w in ["unread", "new message", "new messages", "new"]) 
-                                # Additional heuristics for unread: row text contains 'new message(s)'
-                                text_preview = (el.text or "").strip().replace("\n", " ")
-                                if ("new message" in text_preview.lower()) or ("new messages" in text_preview.lower()):
-                                    unread = True
-                                # Detect marketplace aggregate row like 'Marketplace 2 new messages'
-                                is_marketplace_group = False
-                                tp_low = text_preview.lower()
-                                if tp_low.startswith("marketplace") and ("new message" in tp_low or "new messages" in tp_low):
-                                    is_marketplace_group = True
-                                
-                                # Visual unread indicators: blue dot (background-color) and bold font-weight
-                                has_blue_dot = False
-                                has_bold_text = False
-                                try:
-                                    # Check for blue dot indicator (common in unread rows)
-                                    # Look for small circular elements with blue background
-                                    dots = el.find_elements(By.XPATH, ".//div | .//span")
-                                    for dot in dots[:20]:  # Limit search
-                                        try:
-                                            bg = self.driver.execute_script(
-                                                "return window.getComputedStyle(arguments[0]).backgroundColor;", dot
-                                            )
-                                            # Blue dot typically rgb(0, 132, 255) or similar
-                                            if bg and 'rgb' in bg.lower():
-                                                # Extract RGB values
-                                                import re
-                                                match = re.search(r'rgb\((\d+),\s*(\d+),\s*(\d+)', bg)
-                                                if match:
-                                                    r, g, b = int(match.group(1)), int(match.group(2)), int(match.group(3))
-                                                    # Blue-ish: low red, moderate-high blue
-                                                    if r < 50 and b > 200:
-                                                        has_blue_dot = True
-                                                        break
-                                        except Exception:
-                                            continue
-                                except Exception:
-                                    pass
-                                
-                                # Bold font-weight detection on title spans
-                                try:
-                                    title_spans = el.find_elements(By.CSS_SELECTOR, "span[dir='auto']")
-                                    for title_span in title_spans[:3]:
-                                        fw = self.driver.execute_script(
-                                            "return window.getComputedStyle(arguments[0]).fontWeight;",
-                                            title_span,
-                                        )
-                                        try:
-                                            fw_num = int("" + str(fw))
-                                        except Exception:
-                                            fw_num = 400
-                                        if fw_num >= 600:
-                                            has_bold_text = True
-                                            break
-                                except Exception:
-                                    pass
-                                
-                                # Mark as unread if blue dot or bold text detected
-                                if has_blue_dot or has_bold_text:
-                                    unread = True
-                                enriched.append({
-                                    "element": el,
-                                    "click": click_target,
-                                    "unread": unread,
-                                    "is_marketplace_group": is_marketplace_group,
-                                    "has_blue_dot": has_blue_dot,
-                                    "has_bold_text": has_bold_text,
-                                    "text": text_preview,
-                                    "aria": all_aria[:120],
-                                    "idx": idx,
-                                })
-                            except Exception:
-                                continue
-                        # Debug print the first few with flags
-                        for info in enriched[:8]:
-                            print(f"  [{info['idx']}] unread={info['unread']} agg={info['is_marketplace_group']} dot={info['has_blue_dot']} bold={info['has_bold_text']} text='{(info['text'] or '')[:80]}'")
-                        # Pick unread first; if none, keep original order
-                        unread_items = [x for x in enriched if x["unread"]]
-                        # Prefer non-aggregate unread threads over aggregate
-                        unread_non_agg = [x for x in unread_items if not x["is_marketplace_group"]]
-                        if unread_non_agg:
-                            chosen = unread_non_agg
-                        elif unread_items:
-                            chosen = unread_items
-                        else:
-                            # As a last resort, pick non-aggregate rows
-                            non_agg = [x for x in enriched if not x["is_marketplace_group"]]
-                            chosen = non_agg if non_agg else enriched
-                        if chosen:
-                            # Return the original elements in chosen order
-                            return [x["element"] for x in chosen]
-                    else:
+                snapshot = self.driver.execute_script(CHAT_LIST_JS, xpath_selectors, None, 20)
+            except Exception as e:
+                snapshot = None
+                print(f"⚠️ Chat list snapshot failed: {str(e)[:100]}")
+            # The script stops at the first selector with rows: earlier ones missed
+            winner = (snapshot or {}).get("selector") if (snapshot or {}).get("rows") else None
+            for sel in xpath_selectors:
+                registry.record(group, sel, sel == winner, time.perf_counter() - t0)
+                if sel == winner:
+                    break
+            if snapshot and snapshot.get("rows"):
+                print(f"✅ Found {len(snapshot['rows'])} elements via XPath: {snapshot['selector']}")
+                # Pick unread first (non-aggregate preferred); if none, keep original order
+                ranked = rank_conversations(snapshot["rows"])
+                for info in ranked[:8]:
+                    print(f"  [{info['idx']}] unread={info['unread']} agg={info['is_marketplace_group']} dot={info['has_blue_dot']} bold={info['has_bold_text']} text='{(info['text'] or '')[:80]}'")
+                if ranked:
+                    self.conversation_rows = ranked
+                    return [x["element"] for x in ranked]
+        else:
+            for xpath in xpath_selectors:
+                try:
+                    print(f"🔍 Trying XPath: {xpath}")
+                    t0 = time.perf_counter()
+                    elements = self.driver.find_elements(By.XPATH, xpath)
+                    registry.record(group, xpath, bool(elements), time.perf_counter() - t0)
+                    if elements:
+                        print(f"✅ Found {len(elements)} elements")
                         # Marketplace mode: return elements without aggressive filtering
                         valid = [el for el in elements if el.is_displayed()]
                         if valid:
                             for i, el in enumerate(valid[:3]):
                                 print(f"  [{i}] {el.text[:60].replace(chr(10), ' ')}")
                             return valid
-            except Exception as e:
-                print(f"⚠️ XPath failed: {str(e)[:100]}")
+                except Exception as e:
+                    print(f"⚠️ XPath failed: {str(e)[:100]}")
         
         print("⚠️ Could not find conversations")
 
+        # Conversations were inside an iframe last time: go straight back there
+        if self._conversation_frame_path:
+            found = self._scan_cached_frame_path(xpath_selectors)
+            if found:
+                return found
+
         # DEBUG: Broader scan to understand DOM shape
         try:
             links = self.driver.find_elements(By.XPATH, "//a[@role='link']")
@@ -338,54 +288,53 @@ class MessengerAgent:
             print(f"🧭 Debug: Error listing role=link anchors: {e}")
 
         try:
-            iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
+            iframes = self._list_frames()
             print(f"🧭 Debug: Found {len(iframes)} iframes")
-            for i, fr in enumerate(iframes[:5]):
-                src = fr.get_attribute("src")
-                name = fr.get_attribute("name")
-                title = fr.get_attribute("title")
-                print(f"   · Iframe[{i}] name={name} title={title} src={src}")
+            for i, (_, desc) in enumerate(iframes[:5]):
+                print(f"   · Iframe[{i}] name={desc['name']} title={desc['title']} src={desc['src']}")
         except Exception as e:
             print(f"🧭 Debug: Error enumerating iframes: {e}")
         
-        # Attempt to search inside iframes for conversations (recursive up to depth 2)
-        def scan_iframes(depth=0, max_depth=2):
+        # Attempt to search inside iframes for conversations (recursive up to
+        # max_depth, capped at iframe_scan_budget seconds in total)
+        deadline = time.monotonic() + self.iframe_scan_budget
+
+        def scan_iframes(depth=0, max_depth=2, path=()):
             try:
                 if depth > max_depth:
                     return None
-                frames = self.driver.find_elements(By.TAG_NAME, "iframe")
+                frames = self._list_frames()
                 print(f"🪟 Depth {depth}: scanning {len(frames)} iframes...")
-                for idx, fr in enumerate(frames):
+                for idx, (fr, desc) in enumerate(frames):
+                    if time.monotonic() >= deadline:
+                        print(f"⌛ Iframe scan budget ({self.iframe_scan_budget:.0f}s) used up")
+                        return None
+                    found = None
                     try:
                         print(f"   ↳ Switching into iframe at depth {depth} index {idx}...")
                         self.driver.switch_to.frame(fr)
-                        time.sleep(1)
-                        # Try selectors in this frame
-                        for xpath in xpath_selectors:
-                            print(f"      🔎 In depth {depth} iframe[{idx}] try: {xpath}")
-                            elements = self.driver.find_elements(By.XPATH, xpath)
-                            if elements:
-                                valid = [el for el in elements if el.text.strip() and len(el.text.strip()) > 10]
-                                if valid:
-                                    print(f"      ✅ Found {len(valid)} candidate conversations in depth {depth} iframe[{idx}]")
-                                    for i, el in enumerate(valid[:3]):
-                                        print(f"        · [{i}] {el.text[:60].replace(chr(10), ' ')}")
-                                    return valid
+                        wait_until(self.driver, document_ready, timeout=2, site="iframe")
+                        found = self._find_conversations_in_frame(xpath_selectors, f"depth {depth} iframe[{idx}]")
+                        if found:
+                            # Stay inside the frame so the returned elements stay usable
+                            self._conversation_frame_path = list(path) + [desc]
+                            return found
                         # Recurse into nested iframes
-                        found = scan_iframes(depth + 1, max_depth)
+                        found = scan_iframes(depth + 1, max_depth, tuple(path) + (desc,))
                         if found:
                             return found
                     except Exception as e:
                         print(f"      ⚠️ Error scanning iframe at depth {depth} index {idx}: {str(e)[:120]}")
                     finally:
-                        # Go back up one level after scanning this frame
-                        try:
-                            self.driver.switch_to.parent_frame()
-                        except Exception:
+                        if not found:
+                            # Go back up one level after scanning this frame
                             try:
-                                self.driver.switch_to.default_content()
+                                self.driver.switch_to.parent_frame()
                             except Exception:
-                                pass
+                                try:
+                                    self.driver.switch_to.default_content()
+                                except Exception:
+                                    pass
             except Exception as e:
                 print(f"🧭 Debug: Error during iframe recursive scan at depth {depth}: {e}")
             return None
@@ -407,6 +356,57 @@ class MessengerAgent:
             print(f"⚠️ Failed to save debug artifacts: {e}")
         return []
 
+    def _list_frames(self):
+        """All iframes in the current document as (element, {idx, name, title, src}), in one call."""
+        frames = self.driver.execute_script(
+            "return Array.prototype.map.call(document.querySelectorAll('iframe'), function (f) {"
+            " return [f, f.getAttribute('name') || '', f.getAttribute('title') || '',"
+            " (f.getAttribute('src') || '').slice(0, 160)]; });"
+        ) or []
+        return [(fr, {"idx": i, "name": name, "title": title, "src": src})
+                for i, (fr, name, title, src) in enumerate(frames)]
+
+    def _find_conversations_in_frame(self, xpath_selectors, where):
+        for xpath in xpath_selectors:
+            print(f"      🔎 In {where} try: {xpath}")
+            elements = self.driver.find_elements(By.XPATH, xpath)
+            if elements:
+                valid = [el for el in elements if el.text.strip() and len(el.text.strip()) > 10]
+                if valid:
+                    print(f"      ✅ Found {len(valid)} candidate conversations in {where}")
+                    for i, el in enumerate(valid[:3]):
+                        print(f"        · [{i}] {el.text[:60].replace(chr(10), ' ')}")
+                    return valid
+        return None
+
+    def _scan_cached_frame_path(self, xpath_selectors):
+        """Re-enter the iframe path that held conversations last pass; None if it is gone."""
+        path = self._conversation_frame_path
+        try:
+            self.driver.switch_to.default_content()
+            for depth, want in enumerate(path):
+                frames = self._list_frames()
+                key = (want["name"], want["title"], want["src"])
+                match = next((fr for fr, d in frames if (d["name"], d["title"], d["src"]) == key), None)
+                if match is None:
+                    print(f"🪟 Cached iframe at depth {depth} is gone; falling back to a full scan")
+                    break
+                self.driver.switch_to.frame(match)
+            else:
+                wait_until(self.driver, document_ready, timeout=2, site="iframe")
+                found = self._find_conversations_in_frame(xpath_selectors, f"cached iframe path (depth {len(path) - 1})")
+                if found:
+                    return found
+                print("🪟 Cached iframe no longer has conversations; falling back to a full scan")
+        except Exception as e:
+            print(f"🪟 Cached iframe path failed: {str(e)[:120]}")
+        self._conversation_frame_path = None
+        try:
+            self.driver.switch_to.default_content()
+        except Exception:
+            pass
+        return None
+
     def open_conversation(self, convo_element):
         """
         Click a conversation item to open the message thread.
@@ -421,7 +421,9 @@ class MessengerAgent:
             
             # Scroll into view first
             self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", convo_element)
-            time.sleep(0.5)
+            already_open = self._links_to_open_thread(convo_element)
+            before = thread_key(self.driver, THREAD_HEADER_SELECTORS)
+            self.thread_opened_at = time.monotonic()
             
             # Try regular click first
             try:
@@ -441,8 +443,13 @@ class MessengerAgent:
                     self.driver.execute_script("arguments[0].click();", convo_element)
                 print("✅ Clicked conversation with JS click")
             
-            # Wait for conversation thread to load
-            time.sleep(4)
+            # Wait for the clicked thread to render (the URL alone switches
+            # before the old thread's rows and header are replaced)
+            if already_open:
+                wait_until(self.driver, rows_stable(), timeout=10, site="open_conversation")
+            else:
+                wait_until(self.driver, thread_switched(before, THREAD_HEADER_SELECTORS), timeout=10,
+                           site="open_conversation")
             
             # Verify we're in a conversation thread
             current_url = self.driver.current_url
@@ -460,87 +467,70 @@ class MessengerAgent:
         except Exception as e:
             print("⚠️ Failed to click a conversation:", e)
 
+    def get_transcript(self, root=None) -> Transcript:
+        """Read every message row of the open thread in one script call.
+
+        The result is kept on ``self.transcript`` so later steps in the same
+        pass reuse it instead of querying the DOM again.
+        """
+        try:
+            if root is None and not self._conversation_frame_path:
+                # Plain data in and out, so it can skip chromedriver
+                rows = run_script(self.driver, TRANSCRIPT_JS, None)
+            else:
+                rows = self.driver.execute_script(TRANSCRIPT_JS, root)
+        except Exception as e:
+            print(f"⚠️ Transcript snapshot failed: {str(e)[:100]}")
+            rows = []
+        self.transcript = Transcript.from_rows(rows)
+        print(f"🔍 Transcript: {len(self.transcript)} messages from {len(rows or [])} rows")
+        return self.transcript
+
+    def _captured_transcript(self) -> Transcript:
+        """Transcript of the open thread from captured responses.
+
+        Empty unless a response for the thread arrived after it was opened:
+        new messages come over Messenger's realtime channel, not GraphQL, so
+        older captured data may miss the latest buyer message.
+        """
+        if not self.capture:
+            return Transcript()
+        self.capture.poll(wait=0.5)
+        thread_id = self._current_thread_id()
+        if not self.capture.updated_since(thread_id, self.thread_opened_at):
+            if self.capture.transcript(thread_id):
+                print("📡 Captured thread data predates opening the thread; reading the DOM")
+            return Transcript()
+        return self.capture.transcript(thread_id)
+
     def get_last_message(self):
         """
         Returns the last message text from the BUYER (not seller) in the open conversation.
         """
+        captured = self._captured_transcript()
+        if captured.last_buyer_message():
+            self.transcript = captured
+            print(f"✉️ Last buyer message (network): {captured.last_buyer_message()[:100]}")
+            return captured.last_buyer_message()
         try:
-            # Wait longer for conversation to load
             print("⏳ Waiting for conversation to load...")
-            time.sleep(3)
-            
-            # Try to find message rows and determine which are from buyer vs seller
-            # Buyer messages are typically on the left, seller on the right
-            message_rows = self.driver.find_elements(By.CSS_SELECTOR, 'div[role="row"]')
-            
-            if not message_rows:
-                print("⚠️ No message rows found")
+            wait_until(self.driver, rows_stable(), timeout=10, site="thread_rows")
+
+            transcript = self.get_transcript()
+            if not transcript:
+                print("⚠️ No message text found")
                 return None
-            
-            print(f"🔍 Found {len(message_rows)} message row elements")
-            
-            buyer_messages = []
-            
-            # Check each row to see if it's from buyer (left-aligned)
-            for row in message_rows:
-                try:
-                    # Get text content
-                    text_els = row.find_elements(By.CSS_SELECTOR, 'div[dir="auto"]')
-                    if not text_els:
-                        continue
-                    
-                    text = text_els[0].text.strip()
-                    if not text or len(text) <= 3:
-                        continue
-                    
-                    # Skip timestamps
-                    if text.lower() in ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun', 'you', 'sent', 'delivered', 'seen']:
-                        continue
-                    
-                    # Check position: buyer messages are usually justify-start (left)
-                    # Seller messages are usually justify-end (right)
-                    row_style = self.driver.execute_script(
-                        "return window.getComputedStyle(arguments[0]).justifyContent;", row
-                    )
-                    
-                    # Also check parent/grandparent for alignment
-                    parent = row.find_element(By.XPATH, "..")
-                    parent_style = self.driver.execute_script(
-                        "return window.getComputedStyle(arguments[0]).justifyContent;", parent
-                    )
-                    
-                    # Left-aligned = buyer message
-                    is_buyer = ('start' in str(row_style).lower() or 'flex-start' in str(row_style).lower() or
-                               'start' in str(parent_style).lower() or 'flex-start' in str(parent_style).lower())
-                    
-                    if is_buyer:
-                        buyer_messages.append(text)
-                        
-                except Exception:
-                    continue
-            
-            if buyer_messages:
-                last_buyer_msg = buyer_messages[-1]
+
+            last_buyer_msg = transcript.last_buyer_message()
+            if last_buyer_msg:
                 print(f"✉️ Last buyer message: {last_buyer_msg[:100]}")
                 return last_buyer_msg
-            
+
             # Fallback: if can't determine alignment, get last message
             print("⚠️ Could not determine buyer messages by alignment, using fallback...")
-            message_selectors = [
-                'div[role="row"] div[dir="auto"]',
-            ]
-            
-            for selector in message_selectors:
-                messages = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                if messages:
-                    for msg in reversed(messages):
-                        text = msg.text.strip()
-                        if text and len(text) > 3 and text.lower() not in ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']:
-                            print(f"✉️ Fallback selected message: {text[:100]}")
-                            return text
-            
-            print("⚠️ No message text found")
-            return None
+            last = transcript.last()
+            print(f"✉️ Fallback selected message: {last.text[:100]}")
+            return last.text
         except Exception as e:
             print(f"⚠️ Error getting last message: {e}")
             return None
@@ -558,24 +548,21 @@ class MessengerAgent:
                 "div[contenteditable='true']",
             ]
             
-            input_box = None
-            for selector in input_selectors:
-                try:
-                    input_box = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    if input_box:
-                        print(f"✅ Found input box with: {selector}")
-                        break
-                except:
-                    continue
+            wait_until(self.driver, composer_present, timeout=10, site="composer")
+            input_box = selector_registry().find(self.driver, "composer", input_selectors, by=By.CSS_SELECTOR)
+            if input_box:
+                print("✅ Found input box")
             
             if not input_box:
                 print("⚠️ Could not find message input box")
                 return
             
             input_box.click()
-            input_box.send_keys(text)
+            insert_text(self.driver, input_box, text)
             if send:
                 input_box.send_keys(Keys.ENTER)
+                # The composer clears once Messenger has taken the message
+                wait_until(self.driver, composer_empty, timeout=5, site="send")
                 print(f"📤 Sent: {text}")
             else:
                 print(f"📝 (DEBUG) Would send: {text}")
@@ -583,11 +570,20 @@ class MessengerAgent:
         except Exception as e:
             print("⚠️ Failed to type message:", e)
 
-    def get_thread_info(self):
-        """Extract thread id from URL, buyer name, and item title from header/banner."""
-        tid = None
-        name = None
-        item_title = None
+    def _links_to_open_thread(self, convo_element) -> bool:
+        """True if the chat list element points at the thread that is already open."""
+        try:
+            try:
+                href = convo_element.find_element(By.XPATH, ".//a[@role='link']").get_attribute("href")
+            except Exception:
+                href = convo_element.get_attribute("href")
+        except Exception:
+            return False
+        current = self._current_thread_id()
+        # /messages/t/<id> or /messages/e2ee/t/<id>
+        return bool(current) and on_thread(href, current)
+
+    def _current_thread_id(self):
         try:
             url = self.driver.current_url
             p = urlparse(url)
@@ -596,59 +592,49 @@ class MessengerAgent:
             if 'messages' in parts and 't' in parts:
                 idx = parts.index('t')
                 if idx + 1 < len(parts):
-                    tid = parts[idx + 1]
+                    return parts[idx + 1]
         except Exception:
             pass
-        
+        return None
+
+    def get_thread_info(self):
+        """Extract thread id from URL, buyer name, and item title from header/banner."""
+        tid = self._current_thread_id()
+        name = None
+        item_title = None
+        if self.capture:
+            self.capture.poll()
+            name, item_title = self.capture.thread_info(tid)
+            if name and item_title:
+                return tid, name, item_title
+
         # Buyer name and item title in header/banner region
         try:
             # Look for buyer name and item in header - often formatted as "Name · Item Title"
-            header_selectors = [
-                "div[aria-label='Conversation Information'] h1 span[dir='auto']",
-                "header h2 span[dir='auto']",
-                "div[role='banner'] span[dir='auto']",
-                "h2[class] span[dir='auto']",
-            ]
-            header_text = None
-            for sel in header_selectors:
-                els = self.driver.find_elements(By.CSS_SELECTOR, sel)
-                for el in els:
-                    t = (el.text or '').strip()
-                    if t and len(t) > 1:
-                        header_text = t
-                        break
-                if header_text:
-                    break
+            header_text = selector_registry().find(
+                self.driver, "thread_header", THREAD_HEADER_SELECTORS, by=By.CSS_SELECTOR,
+                validate=lambda els: next((t for t in ((el.text or '').strip() for el in els) if len(t) > 1), None),
+            )
             
             # Parse "Name · Item Title" format
             if header_text and ' · ' in header_text:
                 parts = header_text.split(' · ', 1)
-                name = parts[0].strip()
-                item_title = parts[1].strip() if len(parts) > 1 else None
+                name = name or parts[0].strip()
+                item_title = item_title or (parts[1].strip() if len(parts) > 1 else None)
             elif header_text:
-                name = header_text
+                name = name or header_text
         except Exception:
             pass
         
         # If item title not found yet, look for Marketplace listing banner/link
         if not item_title:
             try:
-                # Common patterns for item title in conversation header
-                item_selectors = [
-                    "a[href*='/marketplace/item/'] span[dir='auto']",  # Marketplace item link
-                    "div[aria-label*='Marketplace'] span[dir='auto']",
-                    "a[role='link'][href*='/marketplace/'] span",
-                ]
-                for sel in item_selectors:
-                    els = self.driver.find_elements(By.CSS_SELECTOR, sel)
-                    for el in els:
-                        txt = (el.text or '').strip()
-                        # Item titles are typically longer than just a name
-                        if txt and len(txt) > 5 and txt != name and txt.lower() != 'marketplace':
-                            item_title = txt
-                            break
-                    if item_title:
-                        break
+                # Item titles are typically longer than just a name
+                item_title = selector_registry().find(
+                    self.driver, "thread_item_title", THREAD_ITEM_SELECTORS, by=By.CSS_SELECTOR,
+                    validate=lambda els: next((t for t in ((el.text or '').strip() for el in els)
+                                               if len(t) > 5 and t != name and t.lower() != 'marketplace'), None),
+                )
                 
                 # Fallback: scan all visible text in header/banner region for longest non-name string
                 if not item_title:
@@ -674,11 +660,7 @@ class MessengerAgent:
         try:
             if not item:
                 return
-            # Support lowercase and Title-case keys
-            if 'status' in item:
-                item['status'] = status
-            else:
-                item['Status'] = status
+            self.inventory.set_status(item, status)
             self.inventory.save()
             print(f"🗂️ Updated item status to {status}")
         except Exception as e:
@@ -691,7 +673,6 @@ class MessengerAgent:
         text = last_message.lower()
 
         # Extract price offer if any
-        import re
         offer = None
         m = re.search(r"\$?\b(\d{2,4})\b", text)
         if m:
@@ -701,11 +682,8 @@ class MessengerAgent:
                 offer = None
 
         # Read item pricing
-        price = None
-        bottom = None
-        if matched_item:
-            price = matched_item.get('price') or matched_item.get('Price')
-            bottom = matched_item.get('bottom') or matched_item.get('Bottom')
+        price = get_price(matched_item)
+        bottom = get_min_price(matched_item)
 
         # Availability checks
         if any(kw in text for kw in ["available", "still available", "is this still"]):
@@ -730,7 +708,7 @@ class MessengerAgent:
             return "Great — I’m free this evening and tomorrow afternoon. What time works for you?"
 
         # Fallback
-        title = matched_item.get('Title') or matched_item.get('title') if matched_item else None
+        title = matched_item.get('Title') if matched_item else None
         if title:
             return f"Hi! Yes, I’m the seller of '{title}'. Do you have any questions or would you like to make an offer?"
         return "Hi! Do you have any questions or would you like to make an offer?"
@@ -747,11 +725,14 @@ class MessengerAgent:
         target = convos[0]
         print("📨 Opening conversation (prioritized)…")
         self.open_conversation(target)
+        return self.reply_in_open_thread()
 
+    def reply_in_open_thread(self):
+        """Read the open thread and answer its last buyer message if it is new. True if a reply was sent."""
         last_message = self.get_last_message()
         print(f"📩 Last message: {last_message}")
         if not last_message:
-            return
+            return False
 
         # Thread info + state (now includes item_title from header)
         thread_id, buyer_name, item_title_from_header = self.get_thread_info()
@@ -759,7 +740,7 @@ class MessengerAgent:
         # Check if this is a NEW buyer (not in buyer_state.json)
         is_new_buyer = False
         if self.state and thread_id:
-            if thread_id not in self.state.state:
+            if not self.state.has_thread(thread_id):
                 is_new_buyer = True
                 print(f"🆕 NEW BUYER DETECTED! Thread: {thread_id} | Buyer: {buyer_name}")
         
@@ -773,26 +754,26 @@ class MessengerAgent:
         if self.state and thread_id:
             if not self.state.needs_reply(thread_id, last_message):
                 print("⛔ Already replied to this message — skipping.")
-                return
+                return False
 
         # Match item: prioritize header title, fallback to message text
         matched_item = None
         if item_title_from_header:
             matched_item = self.inventory.get_item_by_title(item_title_from_header)
             if matched_item:
-                print(f"✅ Matched item from header: {(matched_item.get('Title') or matched_item.get('title'))}")
+                print(f"✅ Matched item from header: {matched_item.get('Title')}")
         
         if not matched_item:
             # Fallback: try matching from message text
             matched_item = self.inventory.get_item_by_title(last_message)
             if matched_item:
-                print(f"✅ Matched item from message: {(matched_item.get('Title') or matched_item.get('title'))}")
+                print(f"✅ Matched item from message: {matched_item.get('Title')}")
         
         if matched_item:
             # Update status to IN_CONVO and persist item association
             self.update_item_status(matched_item, "IN_CONVO")
             if self.state and thread_id:
-                item_id = matched_item.get('id') or matched_item.get('ID')
+                item_id = matched_item.get('ID')
                 if item_id:
                     self.state.set_item_id(thread_id, item_id)
         else:
@@ -802,7 +783,7 @@ class MessengerAgent:
         response = self.infer_intent_and_reply(last_message, matched_item)
         if not response:
             print("⚠️ No response generated")
-            return
+            return False
 
         # Send reply
         self.send_message(response, send=True)
@@ -810,7 +791,7 @@ class MessengerAgent:
         # Mark that we've replied to this message
         if self.state and thread_id:
             self.state.mark_replied_to_message(thread_id, last_message)
-        time.sleep(1)
+        return True
 
     def _open_first_unread_within_main(self):
         """Inside a 'Marketplace' aggregate thread, try to find and open first unread buyer sub-thread."""
@@ -820,110 +801,76 @@ class MessengerAgent:
                 main = self.driver.find_element(By.XPATH, "//div[@role='main']")
             except Exception:
                 pass
-            containers = [main] if main else [self.driver]
-            candidates = []
-            for root in containers:
-                try:
-                    links = root.find_elements(By.XPATH, 
-                        ".//a[@role='link' and contains(@href, '/messages/t/')]"
-                    )
-                    for a in links:
-                        txt = (a.text or '').strip().lower()
-                        aria = (a.get_attribute('aria-label') or '').lower()
-                        
-                        # Enhanced unread detection
-                        unread = False
-                        if any(k in txt for k in ['new message', 'new messages']) or any(k in aria for k in ['unread','new']):
-                            unread = True
-                        else:
-                            # Check for blue dot or bold text
-                            try:
-                                # Blue dot check
-                                dots = a.find_elements(By.XPATH, ".//div | .//span")
-                                for dot in dots[:5]:
-                                    bg = self.driver.execute_script("return window.getComputedStyle(arguments[0]).backgroundColor;", dot)
-                                    if bg and 'rgb' in bg.lower():
-                                        import re
-                                        match = re.search(r'rgb\((\d+),\s*(\d+),\s*(\d+)', bg)
-                                        if match:
-                                            r, g, b = int(match.group(1)), int(match.group(2)), int(match.group(3))
-                                            if r < 50 and b > 200:
-                                                unread = True
-                                                break
-                                
-                                # Bold text check
-                                if not unread:
-                                    spans = a.find_elements(By.CSS_SELECTOR, "span[dir='auto']")
-                                    for sp in spans[:3]:
-                                        fw = self.driver.execute_script("return window.getComputedStyle(arguments[0]).fontWeight;", sp)
-                                        if fw and int(str(fw)) >= 600:
-                                            unread = True
-                                            break
-                            except Exception:
-                                pass
-
-                        # Avoid links that are clearly the aggregate itself
-                        agg = 'marketplace' in txt and ('new message' in txt or 'new messages' in txt)
-                        candidates.append((a, unread, agg, txt[:80]))
-                except Exception:
-                    continue
-            
+            snapshot = self.driver.execute_script(
+                CHAT_LIST_JS, [".//a[@role='link' and contains(@href, '/messages/t/')]"], main, 5
+            )
+            candidates = [r for r in (classify_row(row) for row in (snapshot or {}).get("rows", [])) if r]
             print(f"🔍 Drill-down candidates: {len(candidates)}")
             for i, c in enumerate(candidates):
-                print(f"  [{i}] unread={c[1]} agg={c[2]} text='{c[3]}'")
+                print(f"  [{i}] unread={c['unread']} agg={c['is_marketplace_group']} text='{c['text'][:80]}'")
 
             # Prefer unread and non-aggregate
-            prio = [c for c in candidates if c[1] and not c[2]] or [c for c in candidates if c[1]] or [c for c in candidates if not c[2]]
+            prio = rank_conversations((snapshot or {}).get("rows", []))
+            prio = [c for c in prio if c["unread"] or not c["is_marketplace_group"]]
             if not prio:
                 print("⚠️ No sub-thread links found in main area.")
                 return
-            chosen = prio[0][0]
+            chosen = prio[0]["element"]
             print("➡️ Opening sub-thread from aggregate…")
+            before = thread_key(self.driver, THREAD_HEADER_SELECTORS)
+            self.thread_opened_at = time.monotonic()
             try:
                 chosen.click()
             except Exception:
                 self.driver.execute_script("arguments[0].click();", chosen)
-            time.sleep(3)
+            wait_until(self.driver, thread_switched(before, THREAD_HEADER_SELECTORS), timeout=10,
+                       site="open_sub_thread")
         except Exception as e:
             print(f"⚠️ Drill-down failed: {e}")
 
+    def open_thread_by_id(self, thread_id: str):
+        """Open a thread by ID: click its chat list link (in-app navigation) if it is on the page, else load its URL."""
+        url_before = self.driver.current_url
+        if on_thread(url_before, thread_id):
+            return
+        before = thread_key(self.driver, THREAD_HEADER_SELECTORS)
+        self.thread_opened_at = time.monotonic()
+        clicked = self.driver.execute_script(CLICK_THREAD_LINK_JS, str(thread_id))
+        if not clicked:
+            self.driver.get(f"{self.messages_url}/t/{thread_id}/#")
+        wait_until(self.driver, url_on_thread(thread_id), timeout=10, site="open_thread")
+        wait_until(self.driver, thread_switched(before, THREAD_HEADER_SELECTORS), timeout=10, site="thread_switch")
+
     def open_and_process_thread(self, thread_id: str):
-        """Navigate directly to a thread by ID and process if there's a new buyer message."""
+        """Go straight to a thread by ID and reply if there's a new buyer message."""
         try:
-            url = f"https://www.facebook.com/messages/t/{thread_id}/#"
-            self.driver.get(url)
-            time.sleep(3)
-            last_message = self.get_last_message()
-            if not last_message:
-                return False
-            tid, buyer_name, item_title_from_header = self.get_thread_info()
-            if buyer_name and self.state:
-                self.state.set_buyer_name(tid or thread_id, buyer_name)
-            if self.state and tid:
-                if not self.state.needs_reply(tid, last_message):
-                    return False
-            matched_item = None
-            if item_title_from_header:
-                matched_item = self.inventory.get_item_by_title(item_title_from_header)
-            if not matched_item:
-                matched_item = self.inventory.get_item_by_title(last_message)
-            if matched_item:
-                self.update_item_status(matched_item, "IN_CONVO")
-                if self.state and tid:
-                    item_id = matched_item.get('id') or matched_item.get('ID')
-                    if item_id:
-                        self.state.set_item_id(tid, item_id)
-            response = self.infer_intent_and_reply(last_message, matched_item)
-            if not response:
-                return False
-            self.send_message(response, send=True)
-            if self.state and tid:
-                self.state.mark_replied_to_message(tid, last_message)
-            time.sleep(1)
-            return True
-        except Exception:
+            self.open_thread_by_id(thread_id)
+            return self.reply_in_open_thread()
+        except Exception as e:
+            print(f"⚠️ Failed to process thread {thread_id}: {str(e)[:100]}")
             return False
 
+    def process_thread_queue(self, queue: ThreadQueue, budget: float):
+        """Work through queued threads until the queue is empty or ``budget`` seconds have passed.
+
+        Returns (handled, replied, queue waits in seconds).
+        """
+        start = time.monotonic()
+        handled = replied = 0
+        waits = []
+        while queue and time.monotonic() - start < budget:
+            entry = queue.pop()
+            waits.append(time.monotonic() - entry.enqueued)
+            print(f"📨 [{handled + 1}] Opening thread {entry.thread_id} (queued {waits[-1]:.1f}s)")
+            if self.open_and_process_thread(entry.thread_id):
+                replied += 1
+            handled += 1
+        elapsed = time.monotonic() - start
+        left = f", {len(queue)} left for next pass (budget {budget:.0f}s)" if queue else ""
+        wait_report = f"queue wait p50 {percentile(waits, 50):.1f}s max {max(waits):.1f}s" if waits else "no queue wait"
+        print(f"📊 Pass: {handled} threads handled, {replied} replied in {elapsed:.1f}s; {wait_report}{left}")
+        return handled, replied, waits
+
     def process_first_unread_from_known_threads(self):
         """Fallback: iterate stored thread IDs and respond to the first with a new buyer message."""
         if not self.state or not getattr(self.state, 'state', None):
@@ -942,19 +889,80 @@ class MessengerAgent:
 ###########################################################################
 # MAIN LOOP
 ###########################################################################
+STOP_POLL = 5.0
+
+
+def stop_requested(stop_file) -> bool:
+    return bool(stop_file) and os.path.exists(stop_file)
+
+
+def idle(seconds: float, stop_file=None) -> bool:
+    """Sleep between passes; returns True early if ``stop_file`` appears."""
+    deadline = time.monotonic() + seconds
+    while not stop_requested(stop_file):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(remaining, 1.0))
+    return True
+
+
 def main():
     print("🚀 Starting Marketplace Agent...")
     parser = argparse.ArgumentParser()
     parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--debugger-address", default=DEFAULT_DEBUGGER_ADDRESS,
+                        help="Chrome remote debugging address to attach to")
+    parser.add_argument("--account", default=None,
+                        help="Seller account name; keeps buyer state in buyer_state.<account>.json")
+    parser.add_argument("--state-flush-interval", type=float, default=None,
+                        help="Also flush buyer state mid-pass after this many seconds")
+    parser.add_argument("--retention-days", type=float, default=30,
+                        help="Archive buyer threads idle for this many days")
+    parser.add_argument("--max-hot-threads", type=int, default=2000,
+                        help="Cap on threads kept in the hot buyer state (LRU beyond that)")
+    parser.add_argument("--pass-budget", type=float, default=120,
+                        help="Seconds a pass may spend working through queued unread threads")
+    parser.add_argument("--tabs", type=int, default=1,
+                        help="Handle queued threads in up to this many extra tabs at once (needs websocket-client)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Run a pass when the chat list changes instead of every 60s")
+    parser.add_argument("--heartbeat", type=float, default=600,
+                        help="In --watch mode, run a pass at least this often (seconds)")
+    parser.add_argument("--network-capture", action="store_true",
+                        help="Read thread data from Messenger's GraphQL responses (needs websocket-client)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Drive --tabs pages from one asyncio event loop over CDP (needs websockets)")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between passes")
+    parser.add_argument("--stop-file", default=None,
+                        help="Flush buyer state and exit once this file exists (used by supervisor.py)")
     args = parser.parse_args()
 
+    if args.use_async:
+        # async_agent reads the chat list once per pass and has no GraphQL capture
+        for flag, enabled in (("--watch", args.watch), ("--network-capture", args.network_capture)):
+            if enabled:
+                parser.error(f"{flag} is not supported with --async")
+        import asyncio
+        import async_agent
+        asyncio.run(async_agent.run(args))
+        return
+
     inventory = Inventory(OUTPUT_JSON)
-    driver = get_driver()
-    agent = MessengerAgent(driver, inventory)
+    driver = get_driver(args.debugger_address)
+    agent = MessengerAgent(driver, inventory, state_flush_interval=args.state_flush_interval,
+                           retention_days=args.retention_days, max_hot_threads=args.max_hot_threads,
+                           network_capture=args.network_capture, account=args.account)
 
     agent.open_messenger()
+    scheduler = None
+    if args.tabs > 1:
+        from tab_pool import TabScheduler
+        scheduler = TabScheduler(agent, args.tabs)
 
     def single_pass():
+        # Swap in any output.json changes parsed in the background since last pass
+        inventory.refresh()
         # Skip Marketplace Inbox; go directly to Messages
         print("➡️ Navigating directly to Messages page...")
         agent.open_messages()
@@ -962,32 +970,82 @@ def main():
         if not convos:
             print("⚠️ No conversations found on Messages page.")
             return
+        # Every unread buyer thread from this snapshot, opened by ID within the budget
+        queue = ThreadQueue.from_rows(agent.conversation_rows)
+        if queue:
+            print(f"🗂️ Queued {len(queue)} unread thread(s)")
+            if scheduler:
+                scheduler.run(queue, args.pass_budget)
+            else:
+                agent.process_thread_queue(queue, args.pass_budget)
+            return
         # If only aggregate found, use stored threads fallback to locate unread
         if len(convos) == 1:
-            first_text = (convos[0].text or '').lower()
-            if 'marketplace' in first_text and ('new message' in first_text or 'new messages' in first_text):
+            rows = agent.conversation_rows
+            if rows and rows[0]["is_marketplace_group"]:
                 print("🔓 Aggregate detected; using stored threads fallback to locate unread…")
                 if agent.process_first_unread_from_known_threads():
                     return
         # Process first conversation
         agent.process_conversations(convos)
 
-    if args.once:
-        try:
-            single_pass()
-        except Exception as e:
-            print("❌ Error in single pass:", e)
-        return
+    try:
+        if args.once:
+            try:
+                single_pass()
+            except Exception as e:
+                print("❌ Error in single pass:", e)
+            finally:
+                agent.flush_state()
+            return
 
-    # MAIN LOOP (safe debug interval 60 sec)
-    while True:
-        try:
-            single_pass()
-        except Exception as e:
-            print("❌ Error in main loop:", e)
+        if args.watch:
+            # Passes run when the chat list changes; the heartbeat is the safety net
+            watcher = ChatWatcher(driver)
+            while True:
+                try:
+                    agent.open_messages()
+                    watcher.arm()
+                    single_pass()
+                except Exception as e:
+                    print("❌ Error in main loop:", e)
+                finally:
+                    agent.flush_state()
+
+                if stop_requested(args.stop_file):
+                    print("🛑 Stop requested; buyer state flushed")
+                    return
+                print(f"👀 Watching the chat list (heartbeat {args.heartbeat:.0f}s)...\n")
+                t0 = time.monotonic()
+                changed = False
+                # Short waits so a stop request is noticed; the watcher keeps its baseline across them
+                while not changed and not stop_requested(args.stop_file):
+                    remaining = args.heartbeat - (time.monotonic() - t0)
+                    if remaining <= 0:
+                        break
+                    changed = watcher.wait_for_change(min(remaining, STOP_POLL))
+                if changed:
+                    print(f"🔔 Chat list changed after {time.monotonic() - t0:.1f}s")
+                elif not stop_requested(args.stop_file):
+                    print("💓 Heartbeat pass")
 
-        print("⏳ Sleeping 60s...\n")
-        time.sleep(60)
+        # MAIN LOOP (safe debug interval 60 sec)
+        while True:
+            try:
+                single_pass()
+            except Exception as e:
+                print("❌ Error in main loop:", e)
+            finally:
+                agent.flush_state()
+
+            print(f"⏳ Sleeping {args.interval:.0f}s...\n")
+            if idle(args.interval, args.stop_file):
+                print("🛑 Stop requested; buyer state flushed")
+                return
+    finally:
+        if scheduler:
+            # Extra tabs and their DevTools connections
+            scheduler.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,419 @@
+"""
+asyncio agent core: one event loop drives several Messenger pages over CDP.
+
+The sync agent blocks on every WebDriver call. Here each page is an
+AsyncCDPSession (one websocket per tab, ``websockets`` imported lazily) and
+a pass overlaps everything that waits:
+
+    - pages render, read and answer their threads concurrently
+    - the output.json reload runs in a worker thread while the chat list
+      is read
+    - item matching and status saves run in worker threads while other
+      pages keep going
+    - buyer state is flushed in the background during the idle wait
+
+Reply logic is the sync agent's (MessengerAgent.infer_intent_and_reply), and
+the queue, scripts and adaptive wait stats are shared with it.
+
+    python agent.py --async [--tabs 3] [--once]
+    python async_agent.py [--tabs 3] [--once]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agent import (CHAT_LIST_XPATHS, CLICK_THREAD_LINK_JS, THREAD_HEADER_SELECTORS, THREAD_ITEM_SELECTORS,
+                   MessengerAgent, stop_requested)
+from buyer_state import SynchronizedBuyerState
+from cdp import DEFAULT_DEBUGGER_ADDRESS, COMMAND_TIMEOUT, CDPError, close_tab, open_tab, page_targets
+from dom_snapshot import CHAT_LIST_JS, THREAD_HEADER_JS, TRANSCRIPT_JS, parse_thread_header, rank_conversations
+from inventory import Inventory, OUTPUT_JSON
+from selector_registry import selector_registry
+from tab_pool import FOCUS_COMPOSER_JS
+from thread_queue import ThreadQueue
+from transcript import Transcript
+from waits import (COMPOSER_JS, ROW_SIGNATURE_JS, THREAD_KEY_JS, DEFAULT_POLL, latency_stats, on_thread,
+                   percentile, thread_changed)
+
+_CALL_TEMPLATE = "(function () {{ {body}\n}}).apply(null, {args})"
+# CHAT_LIST_JS rows without their element handles, which don't survive returnByValue
+_CHAT_LIST_VALUES_JS = ("var snap = (function () {\n" + CHAT_LIST_JS + "\n}).apply(null, arguments);\n"
+                        "if (snap) snap.rows.forEach(function (r) { delete r.element; delete r.click; });\n"
+                        "return snap;")
+
+AsyncCondition = Callable[["AsyncCDPSession"], Awaitable[Any]]
+
+
+class AsyncCDPSession:
+    """One tab's DevTools websocket; responses are matched to requests by id."""
+
+    def __init__(self, ws_url: str, target_id: Optional[str] = None):
+        self.ws_url = ws_url
+        self.target_id = target_id
+        self._ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self._ids = itertools.count(1)
+        self._waiting: Dict[int, asyncio.Future] = {}
+
+    async def connect(self):
+        try:
+            import websockets
+        except ImportError as e:
+            raise CDPError("--async needs the websockets package (pip install websockets)") from e
+        self._ws = await websockets.connect(self.ws_url, max_size=None, ping_interval=None)
+        self._reader = asyncio.create_task(self._read())
+        return self
+
+    async def _read(self):
+        error: Optional[Exception] = None
+        try:
+            async for raw in self._ws:
+                msg = json.loads(raw)
+                future = self._waiting.pop(msg.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(msg)
+        except Exception as e:
+            error = e
+        finally:
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(CDPError(f"Connection closed: {error}"))
+            self._waiting.clear()
+
+    async def send(self, method: str, params: Optional[Dict[str, Any]] = None,
+                   timeout: float = COMMAND_TIMEOUT) -> Dict[str, Any]:
+        if self._ws is None:
+            raise CDPError("Not connected")
+        msg_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[msg_id] = future
+        try:
+            await self._ws.send(json.dumps({"id": msg_id, "method": method, "params": params or {}}))
+            msg = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise CDPError(f"{method}: no answer in {timeout:.0f}s")
+        except CDPError:
+            raise
+        except Exception as e:
+            raise CDPError(f"{method}: {e}") from e
+        finally:
+            self._waiting.pop(msg_id, None)
+        if "error" in msg:
+            raise CDPError(f"{method}: {msg['error'].get('message')}")
+        return msg.get("result", {})
+
+    async def evaluate(self, expression: str) -> Any:
+        result = await self.send("Runtime.evaluate", {"expression": expression, "returnByValue": True})
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise CDPError(f"Script error: {(details.get('exception') or {}).get('description') or details.get('text')}")
+        return result.get("result", {}).get("value")
+
+    async def call(self, script: str, *args) -> Any:
+        return await self.evaluate(_CALL_TEMPLATE.format(body=script, args=json.dumps(list(args))))
+
+    async def current_url(self) -> str:
+        return await self.evaluate("location.href")
+
+    async def get(self, url: str, timeout: float = 30.0):
+        await self.send("Page.navigate", {"url": url})
+        await wait_for(self, lambda s: s.evaluate("document.readyState === 'complete'"), timeout=timeout,
+                       site="page_load")
+
+    async def insert_text(self, text: str):
+        await self.send("Input.insertText", {"text": text})
+
+    async def press_enter(self):
+        for kind in ("keyDown", "keyUp"):
+            await self.send("Input.dispatchKeyEvent", {"type": kind, "key": "Enter", "code": "Enter",
+                                                       "windowsVirtualKeyCode": 13, "nativeVirtualKeyCode": 13,
+                                                       **({"text": "\r"} if kind == "keyDown" else {})})
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+        self._ws = None
+
+
+async def wait_for(session: AsyncCDPSession, condition: AsyncCondition, timeout: float = 10.0,
+                   site: Optional[str] = None):
+    """asyncio counterpart of waits.wait_until, sharing its per-site adaptive timeouts."""
+    default = timeout
+    poll = DEFAULT_POLL
+    if site:
+        stats = latency_stats()
+        timeout, poll = stats.timeout_for(site, default), stats.poll_for(site)
+    start = time.monotonic()
+    while True:
+        try:
+            value = await condition(session)
+            if value:
+                if site:
+                    latency_stats().record(site, time.monotonic() - start, default)
+                return value
+        except Exception:
+            pass
+        remaining = start + timeout - time.monotonic()
+        if remaining <= 0:
+            if site:
+                latency_stats().record(site, time.monotonic() - start, default, timed_out=True)
+            print(f"⌛ Wait timed out after {timeout:.1f}s ({site or 'condition'})")
+            return None
+        await asyncio.sleep(min(poll, remaining))
+
+
+def rows_stable(quiet: float = 0.4) -> AsyncCondition:
+    state = {"sig": None, "since": 0.0}
+
+    async def check(session):
+        sig = tuple(await session.call(ROW_SIGNATURE_JS))
+        now = time.monotonic()
+        if sig != state["sig"]:
+            state["sig"], state["since"] = sig, now
+            return False
+        return sig[0] > 0 and now - state["since"] >= quiet
+    return check
+
+
+def thread_switched(before: tuple) -> AsyncCondition:
+    async def check(session):
+        return thread_changed(before, await session.call(THREAD_KEY_JS, THREAD_HEADER_SELECTORS))
+    return check
+
+
+async def composer_present(session) -> bool:
+    return bool((await session.call(COMPOSER_JS))[0])
+
+
+async def composer_empty(session) -> bool:
+    present, length = await session.call(COMPOSER_JS)
+    return bool(present) and length == 0
+
+
+def url_on_thread(thread_id: str) -> AsyncCondition:
+    async def check(session):
+        return on_thread(await session.current_url(), thread_id)
+    return check
+
+
+class AsyncPage:
+    """One tab working through threads; the reply flow of MessengerAgent.reply_in_open_thread."""
+
+    def __init__(self, session: AsyncCDPSession, agent: "AsyncAgent", name: str):
+        self.session = session
+        self.agent = agent
+        self.name = name
+
+    async def open_thread(self, thread_id: str):
+        if on_thread(await self.session.current_url(), thread_id):
+            return
+        before = tuple(await self.session.call(THREAD_KEY_JS, THREAD_HEADER_SELECTORS))
+        if not await self.session.call(CLICK_THREAD_LINK_JS, thread_id):
+            await self.session.get(f"{self.agent.messages_url}/t/{thread_id}/#")
+        await wait_for(self.session, url_on_thread(thread_id), timeout=10, site="open_thread")
+        await wait_for(self.session, thread_switched(before), timeout=10, site="thread_switch")
+
+    async def send(self, text: str) -> bool:
+        if not await wait_for(self.session, composer_present, timeout=10, site="composer"):
+            print(f"⚠️ [{self.name}] Could not find message input box")
+            return False
+        await self.session.call(FOCUS_COMPOSER_JS)
+        await self.session.insert_text(text)
+        await self.session.press_enter()
+        await wait_for(self.session, composer_empty, timeout=5, site="send")
+        print(f"📤 [{self.name}] Sent: {text}")
+        return True
+
+    async def handle(self, thread_id: str) -> bool:
+        """Open a thread and answer its last buyer message if it is new. True if a reply was sent."""
+        agent = self.agent
+        await self.open_thread(thread_id)
+        await wait_for(self.session, rows_stable(), timeout=10, site="thread_rows")
+        rows, info = await asyncio.gather(
+            self.session.call(TRANSCRIPT_JS, None),
+            self.session.call(THREAD_HEADER_JS, THREAD_HEADER_SELECTORS, THREAD_ITEM_SELECTORS),
+        )
+        transcript = Transcript.from_rows(rows)
+        last = transcript.last_buyer_message() or (transcript.last().text if transcript else None)
+        if not last:
+            print(f"⚠️ [{self.name}] No message text found in {thread_id}")
+            return False
+        buyer_name, item_title = parse_thread_header(info or {})
+        print(f"🧵 [{self.name}] Thread {thread_id} buyer={buyer_name} item={item_title} last={last[:80]!r}")
+
+        state = agent.state
+        if state:
+            if buyer_name:
+                state.set_buyer_name(thread_id, buyer_name)
+            if not state.needs_reply(thread_id, last):
+                print(f"⛔ [{self.name}] Already replied to this message — skipping.")
+                return False
+
+        matched = await asyncio.to_thread(agent.match_item, item_title, last)
+        reply = agent.logic.infer_intent_and_reply(last, matched)
+        if matched:
+            # The status save runs in a worker thread while the reply is typed
+            agent.background(asyncio.to_thread(agent.update_item_status, matched, "IN_CONVO"))
+            if state and matched.get("ID"):
+                state.set_item_id(thread_id, matched["ID"])
+        if not reply or not await self.send(reply):
+            return False
+        if state:
+            state.mark_replied_to_message(thread_id, last)
+        return True
+
+
+class AsyncAgent:
+    def __init__(self, inventory: Inventory, debugger_address: str = DEFAULT_DEBUGGER_ADDRESS,
+                 tabs: int = 1, account: Optional[str] = None, **state_options):
+        self.inventory = inventory
+        self.debugger_address = debugger_address
+        self.tabs = max(1, tabs)
+        # Sync agent for its reply rules, status updates and buyer state setup
+        self.logic = MessengerAgent(None, inventory, account=account, **state_options)
+        self.state = SynchronizedBuyerState(self.logic.state) if self.logic.state else None
+        self.messages_url = self.logic.messages_url
+        self.pages: List[AsyncPage] = []
+        self._opened: List[str] = []
+        self._background: set = set()
+        self._inventory_lock = threading.Lock()
+
+    def background(self, awaitable):
+        task = asyncio.ensure_future(awaitable)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def update_item_status(self, item, status: str):
+        with self._inventory_lock:
+            self.logic.update_item_status(item, status)
+
+    def match_item(self, item_title: Optional[str], last_message: str):
+        matched = self.inventory.get_item_by_title(item_title) if item_title else None
+        return matched or self.inventory.get_item_by_title(last_message)
+
+    async def start(self):
+        """Attach to the Messages tab (or the first tab) and open the extra worker tabs."""
+        targets = await asyncio.to_thread(page_targets, self.debugger_address)
+        if not targets:
+            raise CDPError(f"No page targets at {self.debugger_address}")
+        main = next((t for t in targets if "/messages" in t.get("url", "")), targets[0])
+        new = await asyncio.gather(*(asyncio.to_thread(open_tab, self.debugger_address, self.messages_url)
+                                     for _ in range(self.tabs - 1)))
+        self._opened = [t["id"] for t in new]
+        sessions = await asyncio.gather(*(AsyncCDPSession(t["webSocketDebuggerUrl"], t["id"]).connect()
+                                          for t in [main, *new]))
+        self.pages = [AsyncPage(s, self, f"tab{i}") for i, s in enumerate(sessions)]
+        print(f"🔗 Driving {len(self.pages)} page(s) from one event loop")
+
+    async def scan(self) -> ThreadQueue:
+        """Read the chat list on the main page into a queue of unread threads."""
+        session = self.pages[0].session
+        if "/messages" not in await session.current_url():
+            await session.get(self.messages_url)
+        registry = selector_registry()
+        selectors = registry.order("chat_list_messages", CHAT_LIST_XPATHS)
+        # The snapshot that ends the wait is the one used; its own site, as the sync
+        # agent's "chat_list" wait is a cheaper check with a shorter ceiling
+        snapshot = await wait_for(session, lambda s: s.call(_CHAT_LIST_VALUES_JS, selectors, None, 20),
+                                  timeout=15, site="async_chat_list")
+        if snapshot:
+            for sel in selectors[:selectors.index(snapshot["selector"])]:
+                registry.record("chat_list_messages", sel, False)
+            registry.record("chat_list_messages", snapshot["selector"], True)
+        return ThreadQueue.from_rows(rank_conversations((snapshot or {}).get("rows", [])))
+
+    async def _drain(self, page: AsyncPage, queue: ThreadQueue, deadline: float, stats: Dict[str, Any]):
+        while time.monotonic() < deadline:
+            entry = queue.pop()
+            if entry is None:
+                return
+            stats["waits"].append(time.monotonic() - entry.enqueued)
+            try:
+                replied = await page.handle(entry.thread_id)
+            except Exception as e:
+                # One bad thread (DOM shape, state write, ...) must not end the tab's share of the pass
+                print(f"⚠️ [{page.name}] Failed to process thread {entry.thread_id}: {str(e)[:100]}")
+                replied = False
+            stats["handled"] += 1
+            stats["replied"] += int(replied)
+
+    async def run_pass(self, budget: float):
+        start = time.monotonic()
+        # output.json reload overlaps the chat list read
+        refresh = asyncio.to_thread(self.inventory.refresh)
+        queue, _ = await asyncio.gather(self.scan(), refresh)
+        print(f"🗂️ Queued {len(queue)} unread thread(s)")
+        stats = {"handled": 0, "replied": 0, "waits": []}
+        if queue:
+            pages = self.pages[:len(queue)]
+            await asyncio.gather(*(self._drain(p, queue, start + budget, stats) for p in pages))
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        elapsed = time.monotonic() - start
+        waits = stats["waits"]
+        wait_report = f"queue wait p50 {percentile(waits, 50):.1f}s max {max(waits):.1f}s" if waits else "no queue wait"
+        left = f", {len(queue)} left for next pass" if queue else ""
+        print(f"📊 Pass: {stats['handled']} threads handled, {stats['replied']} replied in {elapsed:.1f}s; "
+              f"{wait_report}{left}")
+        # Buyer state is written while the loop waits for the next pass
+        if self.state:
+            self.background(asyncio.to_thread(self.state.flush))
+
+    async def close(self):
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await asyncio.gather(*(p.session.close() for p in self.pages), return_exceptions=True)
+        if self._opened:
+            await asyncio.gather(*(asyncio.to_thread(close_tab, self.debugger_address, tid) for tid in self._opened))
+        if self.state:
+            self.state.flush()
+
+
+async def run(args):
+    agent = AsyncAgent(Inventory(OUTPUT_JSON), args.debugger_address, args.tabs, args.account,
+                       retention_days=args.retention_days, max_hot_threads=args.max_hot_threads,
+                       state_flush_interval=args.state_flush_interval)
+    await agent.start()
+    try:
+        while True:
+            try:
+                await agent.run_pass(args.pass_budget)
+            except Exception as e:
+                print("❌ Error in pass:", e)
+            if args.once:
+                return
+            print(f"⏳ Next pass in {args.interval:.0f}s...\n")
+            deadline = time.monotonic() + args.interval
+            while time.monotonic() < deadline and not stop_requested(args.stop_file):
+                await asyncio.sleep(min(1.0, deadline - time.monotonic()))
+            if stop_requested(args.stop_file):
+                print("🛑 Stop requested; flushing buyer state")
+                return
+    finally:
+        await agent.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="asyncio Marketplace agent")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--debugger-address", default=DEFAULT_DEBUGGER_ADDRESS)
+    parser.add_argument("--account", default=None)
+    parser.add_argument("--tabs", type=int, default=1, help="Pages driven concurrently")
+    parser.add_argument("--retention-days", type=float, default=30)
+    parser.add_argument("--max-hot-threads", type=int, default=2000)
+    parser.add_argument("--state-flush-interval", type=float, default=None)
+    parser.add_argument("--pass-budget", type=float, default=120)
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between passes")
+    parser.add_argument("--stop-file", default=None, help="Exit cleanly once this file exists")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark buyer state backends: startup (load/replay) time, memory held by
+the loaded state, and per-write cost as the number of tracked threads grows.
+
+Usage: python bench_buyer_state.py [--threads 1000 10000 50000] [--writes 200]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from buyer_state import BACKENDS
+from buyer_state_sqlite import SQLiteBuyerStateStore
+
+BACKENDS.setdefault("sqlite", SQLiteBuyerStateStore)
+
+
+def seed(cls, path, n_threads):
+    store = cls(path, write_behind=True)
+    for i in range(n_threads):
+        tid = str(1000000000000000 + i)
+        store.set_buyer_name(tid, f"Buyer{i % 500}")
+        store.set_item_id(tid, i % 70)
+        store.mark_replied_to_message(tid, f"message {i}")
+    store.flush()
+    if hasattr(store, "compact"):
+        store.compact(wait=True)
+
+
+def bench(name, cls, n_threads, n_writes):
+    workdir = tempfile.mkdtemp(prefix="bench_state_")
+    try:
+        path = os.path.join(workdir, "buyer_state.json")
+        seed(cls, path, n_threads)
+
+        t0 = time.perf_counter()
+        store = cls(path)
+        startup = time.perf_counter() - t0
+
+        tracemalloc.start()
+        loaded = cls(path)
+        resident = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del loaded
+
+        t0 = time.perf_counter()
+        for i in range(n_writes):
+            store.mark_seen_message(str(1000000000000000 + (i % n_threads)), f"new message {i}")
+        per_write = (time.perf_counter() - t0) / n_writes
+
+        # Startup again with a journal tail still to replay
+        t0 = time.perf_counter()
+        cls(path)
+        startup_after = time.perf_counter() - t0
+        print(f"{name:8s} threads={n_threads:6d}  startup={startup * 1000:8.1f} ms  "
+              f"mem={resident / 1e6:7.1f} MB  write={per_write * 1000:7.3f} ms  startup+{n_writes} writes={startup_after * 1000:8.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+    for n in args.threads:
+        for name, cls in BACKENDS.items():
+            bench(name, cls, n, args.writes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Round-trip latency of the CDP websocket vs the chromedriver path.
+
+Starts a local headless Chrome/Chromium (or attaches to --debugger-address),
+loads a synthetic thread page and times the same work both ways:
+a trivial script, TRANSCRIPT_JS over the thread, typing a message, and a
+whole-page read (page_source vs DOMSnapshot.captureSnapshot).
+
+Usage: python bench_cdp.py [--chrome /usr/bin/chromium] [--rows 200] [--repeat 50]
+       python bench_cdp.py --debugger-address 127.0.0.1:9222
+"""
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+
+from cdp import CDPSession, snapshot_text
+from dom_snapshot import TRANSCRIPT_JS
+from driver_resolver import CHROME_CANDIDATES, start_driver
+
+
+def thread_page(rows):
+    bubbles = []
+    for i in range(rows):
+        side = "flex-end" if i % 2 else "flex-start"
+        bubbles.append(f'<div role="row" style="display:flex;justify-content:{side}">'
+                       f'<div dir="auto">Message {i}: is this still available?</div></div>')
+    return ("<html><body><div role='main'>" + "".join(bubbles) +
+            "<div contenteditable='true' role='textbox' aria-label='Message'></div></div></body></html>")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def launch_chrome(binary):
+    port = free_port()
+    profile = tempfile.mkdtemp(prefix="bench_cdp_")
+    proc = subprocess.Popen([binary, "--headless=new", f"--remote-debugging-port={port}",
+                             f"--user-data-dir={profile}", "--no-first-run", "--no-sandbox", "about:blank"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    address = f"127.0.0.1:{port}"
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://{address}/json/version", timeout=1).close()
+            return proc, profile, address
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{binary} did not open its debugging port")
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def report(name, selenium_fn, cdp_fn, repeat):
+    s_med, s_max = timed(selenium_fn, repeat)
+    c_med, c_max = timed(cdp_fn, repeat)
+    print(f"{name:22s} selenium {s_med:7.2f} ms (max {s_max:7.2f})   "
+          f"cdp {c_med:7.2f} ms (max {c_max:7.2f})   x{s_med / c_med if c_med else 0:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chrome", default=os.getenv("CHROME_PATH"), help="Chrome/Chromium binary to launch")
+    parser.add_argument("--debugger-address", default=None, help="Attach to a running Chrome instead")
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    proc = profile = None
+    address = args.debugger_address
+    if not address:
+        binary = args.chrome or next(filter(None, map(shutil.which, CHROME_CANDIDATES)), None)
+        if not binary:
+            sys.exit("No Chrome/Chromium found; pass --chrome or --debugger-address")
+        proc, profile, address = launch_chrome(binary)
+
+    options = Options()
+    options.debugger_address = address
+    driver = start_driver(options, address)
+    try:
+        with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False) as f:
+            f.write(thread_page(args.rows))
+            page = f.name
+        driver.get("file://" + page)
+        session = CDPSession(driver, debugger_address=address)
+        if not session.direct:
+            sys.exit("CDP websocket not available (pip install websocket-client)")
+        print(f"{args.rows} rows, {args.repeat} repeats, chrome at {address}\n")
+
+        report("readyState", lambda: driver.execute_script("return document.readyState"),
+               lambda: session.evaluate("document.readyState"), args.repeat)
+        report("TRANSCRIPT_JS", lambda: driver.execute_script(TRANSCRIPT_JS, None),
+               lambda: session.call(TRANSCRIPT_JS, None), args.repeat)
+
+        box = driver.find_element(By.CSS_SELECTOR, "div[role='textbox']")
+        message = "Yes, it's still available. You can pick it up tomorrow after 5pm."
+        clear = "arguments[0].textContent = ''; arguments[0].focus();"
+        report("type message",
+               lambda: (driver.execute_script(clear, box), box.send_keys(message)),
+               lambda: (driver.execute_script(clear, box), session.insert_text(message)),
+               max(5, args.repeat // 5))
+
+        report("whole page", lambda: driver.page_source,
+               lambda: list(snapshot_text(session.capture_snapshot())), max(5, args.repeat // 5))
+        session.close()
+        os.remove(page)
+    finally:
+        driver.quit()
+        if proc:
+            proc.kill()
+            proc.wait()
+            shutil.rmtree(profile, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark the xlsx importer: a full first import of a synthetic feed, then
+a re-sync after editing a handful of rows.
+
+Usage: python bench_import.py [--rows 100000] [--edits 5]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from inventory import compact_items, read_items
+from xlsx_import import sync
+
+HEADER = ["ID", "Title", "Description", "Category", "Price", "Min_Price", "Zip_Code", "Photo_Paths",
+          "Status", "Marketplace_URL", "Notes"]
+WORKBOOK = ('<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>')
+WORKBOOK_RELS = ('<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                 '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                 'relationships/worksheet" Target="worksheets/sheet1.xml"/></Relationships>')
+
+
+def _cell(col, row, value):
+    ref = f"{chr(65 + col)}{row}"
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t>{escape(value)}</t></is></c>'
+
+
+def write_feed(path, rows, edited=()):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("xl/workbook.xml", WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS)
+        with zf.open("xl/worksheets/sheet1.xml", "w") as f:
+            f.write(b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            f.write(("<row r=\"1\">" + "".join(_cell(c, 1, h) for c, h in enumerate(HEADER)) + "</row>").encode())
+            for i in range(1, rows + 1):
+                price = 100 + i % 400 + (7 if i in edited else 0)
+                values = [i, f"Item {i} vintage widget", f"Description of item {i}, good condition.",
+                          "Home Goods ; Misc", price, price // 2, 18614, f"{i}_1.jpg, {i}_2.jpg", "Draft"]
+                cells = "".join(_cell(c, i + 1, v) for c, v in enumerate(values))
+                f.write(f'<row r="{i + 1}">{cells}</row>'.encode())
+            f.write(b"</sheetData></worksheet>")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--edits", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_import_")
+    try:
+        xlsx = os.path.join(workdir, "listDataFeed.xlsx")
+        json_path = os.path.join(workdir, "output.json")
+        write_feed(xlsx, args.rows)
+
+        stats = sync(xlsx, json_path)
+        print(f"first import   rows={args.rows}  added={stats['added']}  "
+              f"parse={stats['parse_seconds'] * 1000:.0f} ms  write={stats['write_seconds'] * 1000:.1f} ms")
+        t0 = time.perf_counter()
+        compact_items(json_path)
+        print(f"compact        {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+        edited = set(range(1, args.rows + 1, max(1, args.rows // max(1, args.edits))))
+        write_feed(xlsx, args.rows, edited)
+        stats = sync(xlsx, json_path)
+        print(f"re-sync        changed={stats['changed']}  "
+              f"parse={stats['parse_seconds'] * 1000:.0f} ms  write={stats['write_seconds'] * 1000:.1f} ms")
+
+        t0 = time.perf_counter()
+        items, _ = read_items(json_path)
+        print(f"load+replay    items={len(items)}  {(time.perf_counter() - t0) * 1000:.0f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
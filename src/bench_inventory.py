@@ -0,0 +1,102 @@
+"""
+Benchmark item matching on a synthetic inventory: the old linear title scan
+versus the TitleIndex and TrigramIndex lookups used by Inventory.
+
+Usage: python bench_inventory.py [--items 50000] [--queries 500]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from item_index import TitleIndex, TrigramIndex
+
+SRC_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output.json")
+
+
+def linear_match(items, message_text):
+    """The original first-substring-hit scan, kept here for comparison."""
+    message_lower = message_text.lower()
+    for item in items:
+        item_title = item.get("Title", "")
+        if not item_title:
+            continue
+        title_words = [w.lower() for w in item_title.split() if len(w) > 3]
+        if any(word in message_lower for word in title_words):
+            return item
+    return None
+
+
+def synthetic_inventory(n, seed=7):
+    rng = random.Random(seed)
+    with open(SRC_JSON, "r", encoding="utf-8") as f:
+        real = json.load(f)
+    vocab = sorted({w for item in real for w in (item.get("Title") or "").split() if len(w) > 3})
+    vocab += [f"model{i}" for i in range(n // 10)]
+    items = []
+    for i in range(n):
+        words = rng.sample(vocab, rng.randint(3, 7))
+        items.append({"ID": i + 1, "Title": " ".join(words), "Status": rng.choice(["Draft", "Posted", "Sold"])})
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    items = synthetic_inventory(args.items)
+    rng = random.Random(11)
+    queries = []
+    for _ in range(args.queries):
+        target = rng.choice(items)
+        words = target["Title"].split()
+        queries.append(f"Hi, is the {' '.join(words[:2])} still available?")
+    # Worst case for the linear scan: nothing matches
+    misses = ["Do you take venmo?"] * (args.queries // 10)
+
+    t0 = time.perf_counter()
+    index = TitleIndex(items)
+    build = time.perf_counter() - t0
+
+    for name, fn in (("linear", lambda q: linear_match(items, q)), ("index", index.best)):
+        t0 = time.perf_counter()
+        for q in queries:
+            fn(q)
+        hit = (time.perf_counter() - t0) / len(queries)
+        t0 = time.perf_counter()
+        for q in misses:
+            fn(q)
+        miss = (time.perf_counter() - t0) / max(1, len(misses))
+        print(f"{name:7s} items={len(items)}  per-lookup hit={hit * 1000:8.3f} ms  miss={miss * 1000:8.3f} ms")
+
+    t0 = time.perf_counter()
+    for item in items[:1000]:
+        item["Status"] = "IN_CONVO"
+        index.update(item)
+    print(f"index   build={build * 1000:.0f} ms  1000 incremental updates={(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    # Fuzzy: clipped header titles with a typo, as Marketplace shows them
+    t0 = time.perf_counter()
+    trigram = TrigramIndex(items)
+    build = time.perf_counter() - t0
+    headers = []
+    for _ in range(args.queries):
+        title = rng.choice(items)["Title"]
+        clipped = title[: max(12, int(len(title) * 0.6))]
+        pos = rng.randrange(len(clipped))
+        headers.append((clipped[:pos] + clipped[pos + 1:]) + "…")
+    t0 = time.perf_counter()
+    for h in headers:
+        trigram.search(h, k=5)
+    per = (time.perf_counter() - t0) / len(headers)
+    print(f"trigram build={build * 1000:.0f} ms  top-5 per lookup={per * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Replies per minute vs tab count, against a local fake Messenger.
+
+Serves fixtures/fake_messenger (every thread renders after --delay ms, like
+a slow network), starts a headless Chrome (or attaches to
+--debugger-address), and runs TabScheduler over the same queue of unread
+threads with each tab count. Inventory and buyer state are temporary copies.
+
+Usage: python bench_tabs.py [--tabs 1 2 4 8] [--threads 24] [--delay 1000] [--chrome /usr/bin/chromium]
+"""
+import argparse
+import functools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agent import MessengerAgent
+from bench_cdp import launch_chrome
+from buyer_state import open_buyer_state
+from driver_resolver import CHROME_CANDIDATES
+from inventory import Inventory
+from tab_pool import TabScheduler
+from thread_queue import ThreadQueue
+
+FAKE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "fake_messenger")
+ITEMS = [("Vintage Oak Dresser", 120, 90), ("Road Bike 54cm", 250, 200), ("KitchenAid Mixer", 150, 120),
+         ("Patio Set (4 chairs)", 180, 140), ("Mid-century Lamp", 60, 45), ("Standing Desk", 220, 170)]
+
+
+class FakeMessengerHandler(SimpleHTTPRequestHandler):
+    """Serves index.html (with the bench's config injected) for every path."""
+    config = {}
+
+    def do_GET(self):
+        with open(os.path.join(FAKE_DIR, "index.html"), "r", encoding="utf-8") as f:
+            page = f.read().replace("<script>", f"<script>window.FAKE_MESSENGER = {json.dumps(self.config)};</script>"
+                                    "\n<script>", 1)
+        body = page.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(config):
+    handler = functools.partial(type("Handler", (FakeMessengerHandler,), {"config": config}), directory=FAKE_DIR)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tabs", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=24, help="Unread threads queued per run")
+    parser.add_argument("--delay", type=int, default=1000, help="Simulated thread load time (ms)")
+    parser.add_argument("--chrome", default=os.getenv("CHROME_PATH"), help="Chrome/Chromium binary to launch")
+    parser.add_argument("--debugger-address", default=None, help="Attach to a running Chrome instead")
+    args = parser.parse_args()
+
+    server = serve({"threads": args.threads, "delay": args.delay, "sendDelay": 300})
+    messages_url = f"http://127.0.0.1:{server.server_address[1]}/messages"
+    proc = profile = None
+    address = args.debugger_address
+    if not address:
+        binary = args.chrome or next(filter(None, map(shutil.which, CHROME_CANDIDATES)), None)
+        if not binary:
+            sys.exit("No Chrome/Chromium found; pass --chrome or --debugger-address")
+        proc, profile, address = launch_chrome(binary)
+
+    workdir = tempfile.mkdtemp(prefix="bench_tabs_")
+    results = []
+    try:
+        inventory_path = os.path.join(workdir, "output.json")
+        with open(inventory_path, "w", encoding="utf-8") as f:
+            json.dump([{"ID": i + 1, "Title": title, "Price": price, "Min_Price": floor, "Status": "Posted"}
+                       for i, (title, price, floor) in enumerate(ITEMS)], f)
+        inventory = Inventory(inventory_path)
+
+        for tabs in args.tabs:
+            state = open_buyer_state(path=os.path.join(workdir, f"buyer_state_{tabs}.json"), write_behind=True)
+            agent = MessengerAgent(None, inventory, state=state)
+            agent.messages_url = messages_url
+            scheduler = TabScheduler(agent, tabs, debugger_address=address)
+            queue = ThreadQueue()
+            for i in range(args.threads):
+                queue.push(str(1000 + i), priority=i)
+            t0 = time.monotonic()
+            _, replied, _ = scheduler.run(queue, budget=600)
+            elapsed = time.monotonic() - t0
+            scheduler.close()
+            state.flush()
+            results.append((tabs, replied, elapsed))
+
+        base = results[0][1] / results[0][2] if results and results[0][2] else 0
+        print(f"\n{'tabs':>4s} {'replied':>8s} {'seconds':>8s} {'replies/min':>12s} {'speedup':>8s}")
+        for tabs, replied, elapsed in results:
+            rate = replied / elapsed if elapsed else 0
+            print(f"{tabs:4d} {replied:8d} {elapsed:8.1f} {rate * 60:12.1f} {rate / base if base else 0:8.2f}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+        if proc:
+            proc.kill()
+            proc.wait()
+            shutil.rmtree(profile, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
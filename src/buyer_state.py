@@ -1,80 +1,697 @@
+import gzip
 import json
 import os
+import time
+import atexit
+import signal
 import hashlib
-from typing import Optional, Dict, Any
+import threading
+import sys
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Set, List, Callable, Iterable
+
+from file_lock import FileLock, file_version, atomic_write_json
 
 DEFAULT_STATE_PATH = os.path.join(os.path.dirname(__file__), "buyer_state.json")
+BACKEND_ENV = "BUYER_STATE_BACKEND"
+# Longest a SIGTERM/SIGINT waits for another thread's write before flushing
+SIGNAL_FLUSH_WAIT = 10.0
 
 
 def _hash_text(text: str) -> str:
     return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
 
 
+def _digest_text(text: str) -> bytes:
+    return hashlib.sha256((text or "").encode("utf-8")).digest()
+
+
+class ThreadRecord:
+    """Compact per-thread state.
+
+    Message hashes are held as raw 32-byte digests and buyer names are
+    interned. Dict-style access (``entry.get("last_message_hash")``,
+    ``entry["buyer_name"] = ...``, ``"item_id" in entry``) still works and
+    presents digests as the hex strings stored on disk. Unknown keys are kept
+    in a side dict so nothing read from an older file is lost.
+    """
+
+    __slots__ = ("buyer_name", "item_id", "last_message_digest", "last_replied_digest",
+                 "last_message_at", "extra")
+
+    _HEX_FIELDS = {"last_message_hash": "last_message_digest", "last_replied_hash": "last_replied_digest"}
+    _PLAIN_FIELDS = ("buyer_name", "item_id", "last_message_at")
+    FIELDS = ("buyer_name", "item_id", "last_message_hash", "last_replied_hash", "last_message_at")
+
+    def __init__(self):
+        self.buyer_name: Optional[str] = None
+        self.item_id: Optional[int] = None
+        self.last_message_digest: Optional[bytes] = None
+        self.last_replied_digest: Optional[bytes] = None
+        self.last_message_at: Optional[float] = None
+        self.extra: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ThreadRecord":
+        rec = cls.__new__(cls)
+        name = data.get("buyer_name")
+        rec.buyer_name = sys.intern(name) if name is not None else None
+        rec.item_id = data.get("item_id")
+        rec.last_message_at = data.get("last_message_at")
+        h = data.get("last_message_hash")
+        rec.last_message_digest = bytes.fromhex(h) if h is not None else None
+        h = data.get("last_replied_hash")
+        rec.last_replied_digest = bytes.fromhex(h) if h is not None else None
+        rec.extra = None
+        if not data.keys() <= _FIELD_SET:
+            rec.extra = {k: v for k, v in data.items() if k not in _FIELD_SET}
+        return rec
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {}
+        if self.buyer_name is not None:
+            d["buyer_name"] = self.buyer_name
+        if self.item_id is not None:
+            d["item_id"] = self.item_id
+        if self.last_message_digest is not None:
+            d["last_message_hash"] = self.last_message_digest.hex()
+        if self.last_replied_digest is not None:
+            d["last_replied_hash"] = self.last_replied_digest.hex()
+        if self.last_message_at is not None:
+            d["last_message_at"] = self.last_message_at
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+    def __getitem__(self, key: str):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default=None):
+        slot = self._HEX_FIELDS.get(key)
+        if slot is not None:
+            digest = getattr(self, slot)
+            return digest.hex() if digest is not None else default
+        if key in self._PLAIN_FIELDS:
+            value = getattr(self, key)
+            return value if value is not None else default
+        return self.extra.get(key, default) if self.extra else default
+
+    def __setitem__(self, key: str, value):
+        if value is None:
+            self.pop(key, None)
+            return
+        slot = self._HEX_FIELDS.get(key)
+        if slot is not None:
+            setattr(self, slot, bytes.fromhex(value) if isinstance(value, str) else bytes(value))
+        elif key == "buyer_name":
+            self.buyer_name = sys.intern(value)
+        elif key in self._PLAIN_FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def pop(self, key: str, default=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        slot = self._HEX_FIELDS.get(key, key)
+        if slot in self.__slots__ and slot != "extra":
+            setattr(self, slot, None)
+        else:
+            del self.extra[key]
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self) -> List[str]:
+        return [key for key, _ in self.items()]
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ThreadRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self) -> str:
+        return f"ThreadRecord({self.to_dict()!r})"
+
+
+_MISSING = object()
+_FIELD_SET = frozenset(ThreadRecord.FIELDS)
+
+
+class RetentionPolicy:
+    """How long threads stay in the hot store.
+
+    Threads idle for ``max_idle_days`` or whose item id is in
+    ``sold_item_ids()`` are moved to the cold archive, and the hot set is
+    capped at ``max_hot_threads`` by evicting the least recently used.
+    """
+
+    def __init__(self, max_idle_days: Optional[float] = 30, max_hot_threads: Optional[int] = 2000,
+                 archive_path: Optional[str] = None,
+                 sold_item_ids: Optional[Callable[[], Set[int]]] = None):
+        self.max_idle_days = max_idle_days
+        self.max_hot_threads = max_hot_threads
+        self.archive_path = archive_path
+        self.sold_item_ids = sold_item_ids
+
+
+class ThreadArchive:
+    """Cold storage for evicted threads: gzip'd JSON lines, one thread per line.
+
+    Evictions are appended as new gzip members; the file is only read, in
+    full, the first time a lookup misses the hot store.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _ensure_loaded(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._index[rec["t"]] = rec["e"]
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError):
+            # Truncated final member after a crash; keep what was readable.
+            pass
+
+    def __contains__(self, thread_id: str) -> bool:
+        self._ensure_loaded()
+        return thread_id in self._index
+
+    def pop(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self._index.pop(thread_id, None)
+
+    def add(self, threads: Dict[str, Dict[str, Any]]):
+        if not threads:
+            return
+        lines = "".join(json.dumps({"t": tid, "e": entry}, ensure_ascii=False, separators=(",", ":")) + "\n"
+                        for tid, entry in threads.items())
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write(lines)
+        if self._index is not None:
+            self._index.update(threads)
+
+
 class BuyerStateStore:
-    def __init__(self, path: Optional[str] = None):
+    """Per-thread buyer state persisted to a JSON file.
+
+    By default every mutation is written straight through. With
+    ``write_behind=True`` mutations only mark the thread dirty; the file is
+    rewritten once by ``flush()`` (call it at the end of each pass), when
+    ``flush_interval`` seconds have elapsed since the last write, and on
+    exit / SIGTERM / SIGINT.
+
+    Writes are safe across processes: the file is rewritten under an advisory
+    lock, and if another process changed it since we loaded it, its threads
+    are merged in and only the fields we changed are applied on top.
+
+    With a ``retention`` policy, ``flush()`` first moves idle, sold and
+    least-recently-used threads out to a cold archive; ``get_thread`` pulls
+    them back transparently on a miss.
+    """
+
+    # Thread currently inside _write, and a SIGTERM/SIGINT that arrived during it
+    _writer: Optional[int] = None
+    _deferred_signal = None
+
+    def __init__(self, path: Optional[str] = None, write_behind: bool = False,
+                 flush_interval: Optional[float] = None, retention: Optional[RetentionPolicy] = None):
         self.path = path or DEFAULT_STATE_PATH
-        self.state: Dict[str, Any] = {}
+        self.state: Dict[str, ThreadRecord] = OrderedDict()
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self._dirty: Set[str] = set()
+        # Field-level changes since the last write; None marks a thread we removed.
+        self._changes: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._version = None
+        self._last_flush = time.monotonic()
+        self.retention = retention
+        self.archive = ThreadArchive(retention.archive_path or self.path + ".archive.gz") if retention else None
         self._load()
+        if write_behind:
+            self._install_exit_hooks()
 
-    def _load(self):
+    def _read_file(self) -> Dict[str, Any]:
         try:
             with open(self.path, "r", encoding="utf-8") as f:
-                self.state = json.load(f)
+                st = os.fstat(f.fileno())
+                self._version = (st.st_mtime_ns, st.st_size, st.st_ino)
+                return json.load(f)
         except FileNotFoundError:
-            self.state = {}
+            self._version = None
+            return {}
         except json.JSONDecodeError:
-            self.state = {}
+            return {}
+
+    def _load(self):
+        data = self._read_file()
+        self.state = OrderedDict((tid, ThreadRecord.from_dict(entry)) for tid, entry in data.items())
+
+    def _merge_from_disk(self):
+        """Adopt another process's writes, keeping our own unsaved field changes."""
+        merged = OrderedDict()
+        for tid, entry in self._read_file().items():
+            merged[tid] = ThreadRecord.from_dict(entry)
+        for tid, fields in self._changes.items():
+            if fields is None:
+                merged.pop(tid, None)
+                continue
+            rec = merged.get(tid)
+            if rec is None:
+                rec = merged[tid] = ThreadRecord()
+            _apply_fields(rec, fields)
+        self.state = merged
+
+    def _serialize(self) -> Dict[str, Dict[str, Any]]:
+        return {tid: rec.to_dict() for tid, rec in self.state.items()}
+
+    def _install_exit_hooks(self):
+        atexit.register(self.flush)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                previous = signal.getsignal(signum)
+            except (ValueError, OSError):
+                continue
+            if previous == signal.SIG_IGN:
+                # Keep ignoring it (e.g. SIGINT under nohup); atexit still flushes
+                continue
+
+            def _handler(sig, frame, _previous=previous):
+                if self._writer == threading.get_ident():
+                    # Interrupted our own write: flushing here would re-enter it
+                    # (and deadlock on its locks). Exit once it has finished.
+                    self._deferred_signal = (sig, frame, _previous)
+                    return
+                deadline = time.monotonic() + SIGNAL_FLUSH_WAIT
+                while self._writer is not None and time.monotonic() < deadline:
+                    time.sleep(0.01)  # another thread's write; let it finish first
+                if self._writer is None:
+                    self.flush()
+                self._exit_on_signal(sig, frame, _previous)
+
+            try:
+                signal.signal(signum, _handler)
+            except ValueError:
+                # Not on the main thread; atexit still covers normal shutdown.
+                pass
+
+    @staticmethod
+    def _exit_on_signal(sig, frame, previous):
+        if callable(previous):
+            previous(sig, frame)
+        else:
+            raise SystemExit(128 + sig)
+
+    def _run_write(self):
+        """``_write()``, marked as running so a signal arriving meanwhile waits for it."""
+        self._writer = threading.get_ident()
+        try:
+            self._write()
+        finally:
+            self._writer = None
+        if self._deferred_signal is not None:
+            deferred, self._deferred_signal = self._deferred_signal, None
+            self._exit_on_signal(*deferred)
+
+    def _write(self):
+        with FileLock(self.path):
+            if file_version(self.path) != self._version:
+                self._merge_from_disk()
+            atomic_write_json(self.path, self._serialize(), ensure_ascii=False, separators=(",", ":"))
+            self._version = file_version(self.path)
+        self._dirty.clear()
+        self._changes.clear()
+        self._last_flush = time.monotonic()
 
     def save(self):
-        tmp_path = self.path + ".tmp"
-        with open(tmp_path, "w", encoding="utf-8") as f:
-            json.dump(self.state, f, indent=2, ensure_ascii=False)
-        os.replace(tmp_path, self.path)
+        """Persist now, or defer to the next flush in write-behind mode."""
+        if not self.write_behind:
+            self._run_write()
+            return
+        if self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
 
-    def get_thread(self, thread_id: str) -> Dict[str, Any]:
-        return self.state.setdefault(thread_id, {})
+    def flush(self) -> bool:
+        """Write pending changes, if any. Returns True when the file was rewritten."""
+        if self.retention:
+            self.enforce_retention()
+        if not self._dirty:
+            return False
+        self._run_write()
+        return True
 
-    def mark_seen_message(self, thread_id: str, message_text: str):
-        entry = self.get_thread(thread_id)
-        entry["last_message_hash"] = _hash_text(message_text)
-        self.state[thread_id] = entry
+    @property
+    def dirty_threads(self) -> Set[str]:
+        return set(self._dirty)
+
+    def _touch(self, thread_id: str, fields: Dict[str, Any]):
+        """Hook called after ``fields`` of a thread changed (None = removed)."""
+        self._dirty.add(thread_id)
+        changes = self._changes.get(thread_id)
+        if changes is None:
+            changes = self._changes[thread_id] = {}
+        changes.update(fields)
         self.save()
 
+    def _update(self, thread_id: str, **fields):
+        entry = self.get_thread(thread_id)
+        changed = {}
+        for key, value in fields.items():
+            if value is None:
+                if key in entry:
+                    entry.pop(key)
+                    changed[key] = None
+            elif entry.get(key) != value:
+                entry[key] = value
+                changed[key] = value
+        if changed:
+            self._touch(thread_id, changed)
+
+    def get_thread(self, thread_id: str) -> ThreadRecord:
+        rec = self.state.get(thread_id)
+        if rec is None:
+            archived = self.archive.pop(thread_id) if self.archive else None
+            if archived is not None:
+                self._restore(thread_id, archived)
+                return self.state[thread_id]
+            rec = self.state[thread_id] = ThreadRecord()
+        elif self.retention:
+            self.state.move_to_end(thread_id)
+        return rec
+
+    def has_thread(self, thread_id: str) -> bool:
+        """True if the thread is known, whether hot or archived."""
+        return thread_id in self.state or (self.archive is not None and thread_id in self.archive)
+
+    def _restore(self, thread_id: str, entry: Dict[str, Any]):
+        self.state[thread_id] = ThreadRecord.from_dict(entry)
+        self._touch(thread_id, dict(entry))
+
+    def _forget(self, thread_id: str):
+        self.state.pop(thread_id, None)
+        self._dirty.add(thread_id)
+        self._changes[thread_id] = None
+
+    def _lru_order(self) -> Iterable[str]:
+        """Thread ids from least to most recently used."""
+        return list(self.state.keys())
+
+    def enforce_retention(self) -> int:
+        """Move idle, sold and over-cap threads to the archive. Returns how many moved."""
+        policy = self.retention
+        if not policy:
+            return 0
+        evict: Dict[str, Dict[str, Any]] = {}
+        cutoff = time.time() - policy.max_idle_days * 86400 if policy.max_idle_days else None
+        sold = policy.sold_item_ids() if policy.sold_item_ids else set()
+        if cutoff is not None or sold:
+            for tid, entry in self.state.items():
+                last = entry.get("last_message_at")
+                if (cutoff is not None and last is not None and last < cutoff) or entry.get("item_id") in sold:
+                    evict[tid] = entry.to_dict() if isinstance(entry, ThreadRecord) else dict(entry)
+        if policy.max_hot_threads is not None:
+            excess = len(self.state) - len(evict) - policy.max_hot_threads
+            for tid in self._lru_order():
+                if excess <= 0:
+                    break
+                if tid not in evict:
+                    entry = self.state[tid]
+                    evict[tid] = entry.to_dict() if isinstance(entry, ThreadRecord) else dict(entry)
+                    excess -= 1
+        if not evict:
+            return 0
+        self.archive.add(evict)
+        for tid in evict:
+            self._forget(tid)
+        return len(evict)
+
+    def mark_seen_message(self, thread_id: str, message_text: str):
+        self._update(thread_id, last_message_hash=_hash_text(message_text), last_message_at=time.time())
+
     def mark_replied_to_message(self, thread_id: str, message_text: str):
         """Mark that we've replied to this specific buyer message."""
-        entry = self.get_thread(thread_id)
-        entry["last_replied_hash"] = _hash_text(message_text)
-        entry["last_message_hash"] = _hash_text(message_text)
-        self.state[thread_id] = entry
-        self.save()
+        digest = _hash_text(message_text)
+        self._update(thread_id, last_replied_hash=digest, last_message_hash=digest,
+                     last_message_at=time.time())
 
     def has_new_message(self, thread_id: str, message_text: str) -> bool:
-        entry = self.get_thread(thread_id)
-        prev = entry.get("last_message_hash")
-        return prev != _hash_text(message_text)
-    
+        return self.get_thread(thread_id).last_message_digest != _digest_text(message_text)
+
     def needs_reply(self, thread_id: str, message_text: str) -> bool:
         """Check if this buyer message needs a reply (hasn't been replied to yet)."""
-        entry = self.get_thread(thread_id)
-        last_replied = entry.get("last_replied_hash")
-        current_hash = _hash_text(message_text)
-        return last_replied != current_hash
+        return self.get_thread(thread_id).last_replied_digest != _digest_text(message_text)
 
     def set_buyer_name(self, thread_id: str, name: str):
-        entry = self.get_thread(thread_id)
-        entry["buyer_name"] = name
-        self.state[thread_id] = entry
-        self.save()
+        self._update(thread_id, buyer_name=name)
 
     def set_item_id(self, thread_id: str, item_id: Optional[int]):
-        entry = self.get_thread(thread_id)
-        if item_id is None:
-            entry.pop("item_id", None)
-        else:
-            entry["item_id"] = item_id
-        self.state[thread_id] = entry
-        self.save()
+        self._update(thread_id, item_id=item_id)
 
     def get_item_id(self, thread_id: str) -> Optional[int]:
         entry = self.get_thread(thread_id)
         return entry.get("item_id")
+
+    # Lookups. These scan the in-memory state; the SQLite backend answers them from indexes.
+    def threads_for_item(self, item_id: int) -> List[str]:
+        return [tid for tid, e in self.state.items() if e.item_id == item_id]
+
+    def threads_for_buyer(self, buyer_name: str) -> List[str]:
+        return [tid for tid, e in self.state.items() if e.buyer_name == buyer_name]
+
+    def threads_active_since(self, since: float) -> List[str]:
+        """Threads whose last message was recorded at or after ``since`` (epoch seconds)."""
+        return [tid for tid, e in self.state.items() if (e.last_message_at or 0) >= since]
+
+    def threads_awaiting_reply(self) -> List[str]:
+        return [tid for tid, e in self.state.items()
+                if e.last_message_digest and e.last_message_digest != e.last_replied_digest]
+
+
+def _apply_fields(entry: Dict[str, Any], fields: Dict[str, Any]):
+    for key, value in fields.items():
+        if value is None:
+            entry.pop(key, None)
+        else:
+            entry[key] = value
+
+
+class JournalBuyerStateStore(BuyerStateStore):
+    """Append-only variant of BuyerStateStore.
+
+    Each mutation appends one JSON line ``{"t": thread_id, "f": {field: value}}``
+    to ``<path>.journal`` instead of rewriting the whole file. At startup the
+    snapshot at ``path`` is loaded and the journal replayed on top of it. Once
+    the journal holds ``compact_threshold`` records it is rotated and a new
+    snapshot is written on a background thread.
+
+    Appends and rotations happen under the cross-process file lock. If another
+    process appended or compacted since our last write, state is reloaded from
+    disk and our pending records re-applied before appending.
+    """
+
+    def __init__(self, path: Optional[str] = None, write_behind: bool = False,
+                 flush_interval: Optional[float] = None, compact_threshold: int = 5000,
+                 retention: Optional[RetentionPolicy] = None):
+        base = path or DEFAULT_STATE_PATH
+        self.journal_path = base + ".journal"
+        self.compacting_path = base + ".journal.compacting"
+        self.compact_threshold = compact_threshold
+        self._pending = []
+        self._journal_records = 0
+        self._lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+        self._journal_version = None
+        super().__init__(path, write_behind=write_behind, flush_interval=flush_interval, retention=retention)
+
+    def _read_all(self):
+        super()._load()
+        self._journal_records = 0
+        for journal in (self.compacting_path, self.journal_path):
+            self._journal_records += self._replay(journal)
+        self._journal_version = file_version(self.journal_path)
+
+    def _load(self):
+        with FileLock(self.path):
+            self._read_all()
+            interrupted = os.path.exists(self.compacting_path)
+        if interrupted:
+            # A compaction died before finishing; redo it now.
+            self.compact(wait=True)
+
+    def _sync_locked(self):
+        """Reload if another process touched the journal. Caller holds the file lock."""
+        if file_version(self.journal_path) == self._journal_version:
+            return
+        self._read_all()
+        for rec in self._pending:
+            if rec.get("d"):
+                self.state.pop(rec["t"], None)
+            else:
+                entry = self.state.get(rec["t"])
+                if entry is None:
+                    entry = self.state[rec["t"]] = ThreadRecord()
+                _apply_fields(entry, rec["f"])
+
+    def _replay(self, journal_path: str) -> int:
+        count = 0
+        try:
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn trailing write from a crash
+                        continue
+                    if rec.get("d"):
+                        self.state.pop(rec["t"], None)
+                    else:
+                        entry = self.state.get(rec["t"])
+                        if entry is None:
+                            entry = self.state[rec["t"]] = ThreadRecord()
+                        _apply_fields(entry, rec["f"])
+                    count += 1
+        except FileNotFoundError:
+            pass
+        return count
+
+    def _touch(self, thread_id: str, fields: Dict[str, Any]):
+        self._pending.append({"t": thread_id, "f": fields})
+        super()._touch(thread_id, fields)
+
+    def _forget(self, thread_id: str):
+        super()._forget(thread_id)
+        self._pending.append({"t": thread_id, "d": 1})
+
+    def _write(self):
+        if self._pending:
+            lines = "".join(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n"
+                            for rec in self._pending)
+            with self._lock, FileLock(self.path):
+                self._sync_locked()
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._journal_version = file_version(self.journal_path)
+                self._journal_records += len(self._pending)
+            self._pending = []
+        self._dirty.clear()
+        self._changes.clear()
+        self._last_flush = time.monotonic()
+        if self._journal_records >= self.compact_threshold:
+            self.compact()
+
+    def compact(self, wait: bool = False):
+        """Fold the journal into a fresh snapshot (in the background unless ``wait``)."""
+        with self._lock:
+            running = self._compactor is not None and self._compactor.is_alive()
+            if not running:
+                with FileLock(self.path):
+                    self._sync_locked()
+                    snapshot = self._serialize()
+                    if os.path.exists(self.journal_path) and not os.path.exists(self.compacting_path):
+                        os.replace(self.journal_path, self.compacting_path)
+                    self._journal_version = file_version(self.journal_path)
+                self._journal_records = 0
+                self._compactor = threading.Thread(target=self._write_snapshot, args=(snapshot,),
+                                                   name="buyer-state-compactor", daemon=True)
+                self._compactor.start()
+        if wait:
+            self._compactor.join()
+
+    def _write_snapshot(self, snapshot: Dict[str, Any]):
+        tmp_path = f"{self.path}.{os.getpid()}.snapshot.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")))
+            f.flush()
+            os.fsync(f.fileno())
+        with FileLock(self.path):
+            os.replace(tmp_path, self.path)
+            try:
+                os.remove(self.compacting_path)
+            except FileNotFoundError:
+                pass
+
+    def flush(self) -> bool:
+        if self.retention:
+            self.enforce_retention()
+        if not self._dirty and not self._pending:
+            return False
+        self._run_write()
+        return True
+
+
+class SynchronizedBuyerState:
+    """Thread-safe view of any buyer state store.
+
+    Every method call runs under one re-entrant lock, so the tab workers of
+    a parallel pass can update their threads at the same time. Attribute
+    reads pass straight through.
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+BACKENDS = {
+    "json": BuyerStateStore,
+    "journal": JournalBuyerStateStore,
+}
+
+
+def open_buyer_state(backend: Optional[str] = None, account: Optional[str] = None, **kwargs) -> BuyerStateStore:
+    """Create the configured store (``backend`` or $BUYER_STATE_BACKEND, default json).
+
+    With ``account`` (and no explicit ``path``) the store is that seller
+    account's own partition, e.g. buyer_state.<account>.json.
+    """
+    name = (backend or os.getenv(BACKEND_ENV) or "json").lower()
+    if account and not kwargs.get("path"):
+        ext = "db" if name == "sqlite" else "json"
+        kwargs["path"] = os.path.join(os.path.dirname(DEFAULT_STATE_PATH), f"buyer_state.{account}.{ext}")
+    if name == "sqlite" and name not in BACKENDS:
+        from buyer_state_sqlite import SQLiteBuyerStateStore
+        BACKENDS[name] = SQLiteBuyerStateStore
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown buyer state backend: {name} (expected json, journal or sqlite)")
+    return cls(**kwargs)
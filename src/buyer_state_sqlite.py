@@ -0,0 +1,277 @@
+"""
+SQLite storage engine for buyer state.
+
+Same interface as buyer_state.BuyerStateStore, but each thread is a row with
+indexed buyer_name / item_id / last_message_at / replied columns, so lookups
+such as "threads for item X" or "threads active in the last 24h" don't scan
+everything. Select it with BUYER_STATE_BACKEND=sqlite.
+
+One-shot migration from the JSON file:
+    python buyer_state_sqlite.py migrate [--json buyer_state.json] [--db buyer_state.db]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+from buyer_state import BuyerStateStore, ThreadRecord, ThreadArchive, RetentionPolicy, DEFAULT_STATE_PATH
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), "buyer_state.db")
+
+COLUMNS = ("buyer_name", "item_id", "last_message_hash", "last_replied_hash", "last_message_at")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id         TEXT PRIMARY KEY,
+    buyer_name        TEXT,
+    item_id           INTEGER,
+    last_message_hash TEXT,
+    last_replied_hash TEXT,
+    last_message_at   REAL,
+    replied           INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_threads_buyer ON threads(buyer_name);
+CREATE INDEX IF NOT EXISTS idx_threads_item ON threads(item_id);
+CREATE INDEX IF NOT EXISTS idx_threads_last_message_at ON threads(last_message_at);
+CREATE INDEX IF NOT EXISTS idx_threads_replied ON threads(replied, last_message_at);
+"""
+
+
+def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+    return {col: row[col] for col in COLUMNS if row[col] is not None}
+
+
+def _merge(entry: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    for key, value in fields.items():
+        if value is None:
+            entry.pop(key, None)
+        else:
+            entry[key] = value
+    return entry
+
+
+def _replied(entry: Dict[str, Any]) -> int:
+    return int(bool(entry.get("last_replied_hash")) and entry.get("last_replied_hash") == entry.get("last_message_hash"))
+
+
+class _ThreadsView:
+    """Read-only dict-like view of the threads table (what ``store.state`` used to be).
+
+    Point lookups see pending write-behind changes; whole-table reads write
+    them out first.
+    """
+
+    def __init__(self, store: "SQLiteBuyerStateStore"):
+        self._store = store
+
+    def __contains__(self, thread_id) -> bool:
+        return self.get(thread_id) is not None
+
+    def __getitem__(self, thread_id) -> Dict[str, Any]:
+        entry = self.get(thread_id)
+        if entry is None:
+            raise KeyError(thread_id)
+        return entry
+
+    def get(self, thread_id, default=None):
+        store = self._store
+        row = store.conn.execute("SELECT * FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        if thread_id not in store._changes:
+            return _row_to_entry(row) if row else default
+        fields = store._changes[thread_id]
+        if fields is None:
+            return default
+        return _merge(_row_to_entry(row) if row else {}, fields)
+
+    def __len__(self) -> int:
+        self._store._write_pending()
+        return self._store.conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def keys(self) -> List[str]:
+        # rowid order == insertion order, matching the JSON file's dict order
+        self._store._write_pending()
+        return [r[0] for r in self._store.conn.execute("SELECT thread_id FROM threads ORDER BY rowid")]
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        self._store._write_pending()
+        rows = self._store.conn.execute("SELECT * FROM threads ORDER BY rowid")
+        return [(r["thread_id"], _row_to_entry(r)) for r in rows]
+
+    def values(self) -> List[Dict[str, Any]]:
+        return [entry for _, entry in self.items()]
+
+
+class SQLiteBuyerStateStore(BuyerStateStore):
+    """BuyerStateStore backed by a SQLite database in WAL mode.
+
+    ``write_behind`` coalesces field changes in memory and writes them on
+    ``flush()`` in one short BEGIN IMMEDIATE transaction, so the database's
+    write lock is only held for the flush itself and other processes can
+    write in between. Without it each mutation is committed straight away.
+    """
+
+    def __init__(self, path: Optional[str] = None, write_behind: bool = False,
+                 flush_interval: Optional[float] = None, retention: Optional[RetentionPolicy] = None):
+        self.path = path or DEFAULT_DB_PATH
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self._dirty = set()
+        self._changes = {}
+        self._last_flush = time.monotonic()
+        self.retention = retention
+        self.archive = ThreadArchive(retention.archive_path or self.path + ".archive.gz") if retention else None
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        if write_behind:
+            self._install_exit_hooks()
+
+    @property
+    def state(self) -> _ThreadsView:
+        return _ThreadsView(self)
+
+    def _load(self):
+        pass
+
+    def _write(self):
+        if self.write_behind and self._changes:
+            self._write_changes()
+        self.conn.commit()
+        self._dirty.clear()
+        self._changes.clear()
+        self._last_flush = time.monotonic()
+
+    def _write_changes(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for thread_id, fields in self._changes.items():
+                if fields is None:
+                    self.conn.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+                    continue
+                # Merge onto the row as it is now, keeping other processes' changes to other fields
+                row = self.conn.execute("SELECT * FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+                entry = _merge(_row_to_entry(row) if row else {}, fields)
+                values = [entry.get(c) for c in COLUMNS]
+                self.conn.execute(
+                    f"INSERT INTO threads (thread_id, {', '.join(COLUMNS)}, replied) "
+                    f"VALUES (?, {', '.join('?' for _ in COLUMNS)}, ?) "
+                    f"ON CONFLICT(thread_id) DO UPDATE SET "
+                    f"{', '.join(f'{c} = excluded.{c}' for c in COLUMNS)}, replied = excluded.replied",
+                    (thread_id, *values, _replied(entry)),
+                )
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def _write_pending(self):
+        """Write out pending write-behind changes before a query that reads the whole table."""
+        if self.write_behind and self._changes:
+            self._run_write()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def get_thread(self, thread_id: str) -> ThreadRecord:
+        entry = self.state.get(thread_id)
+        if entry is None and self.archive is not None:
+            entry = self.archive.pop(thread_id)
+            if entry is not None:
+                self._restore(thread_id, entry)
+        return ThreadRecord.from_dict(entry or {})
+
+    def _restore(self, thread_id: str, entry: Dict[str, Any]):
+        self._update(thread_id, **{k: v for k, v in entry.items() if k in COLUMNS})
+
+    def _forget(self, thread_id: str):
+        if self.write_behind:
+            super()._forget(thread_id)
+            return
+        self.conn.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+        self._dirty.add(thread_id)
+
+    def _touch(self, thread_id: str, fields: Dict[str, Any]):
+        if self.write_behind and thread_id in self._changes and self._changes[thread_id] is None:
+            # Re-created after a pending removal: start from an empty row, not the stored one
+            self._changes[thread_id] = dict.fromkeys(COLUMNS)
+        super()._touch(thread_id, fields)
+
+    def _lru_order(self) -> List[str]:
+        self._write_pending()
+        return self._ids("SELECT thread_id FROM threads ORDER BY last_message_at IS NOT NULL, last_message_at", ())
+
+    def _update(self, thread_id: str, **fields):
+        current = self.get_thread(thread_id)
+        changed = {k: v for k, v in fields.items() if current.get(k) != v}
+        if not changed:
+            return
+        if self.write_behind:
+            self._touch(thread_id, changed)
+            return
+        merged = dict(current)
+        merged.update(changed)
+        replied = _replied(merged)
+        cols = ", ".join(changed)
+        placeholders = ", ".join("?" for _ in changed)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in changed)
+        self.conn.execute(
+            f"INSERT INTO threads (thread_id, {cols}, replied) VALUES (?, {placeholders}, ?) "
+            f"ON CONFLICT(thread_id) DO UPDATE SET {updates}, replied = excluded.replied",
+            (thread_id, *changed.values(), replied),
+        )
+        self._touch(thread_id, changed)
+
+    def _ids(self, sql: str, params: tuple) -> List[str]:
+        self._write_pending()
+        return [r[0] for r in self.conn.execute(sql, params)]
+
+    def threads_for_item(self, item_id: int) -> List[str]:
+        return self._ids("SELECT thread_id FROM threads WHERE item_id = ? ORDER BY last_message_at DESC", (item_id,))
+
+    def threads_for_buyer(self, buyer_name: str) -> List[str]:
+        return self._ids("SELECT thread_id FROM threads WHERE buyer_name = ? ORDER BY last_message_at DESC",
+                         (buyer_name,))
+
+    def threads_active_since(self, since: float) -> List[str]:
+        return self._ids("SELECT thread_id FROM threads WHERE last_message_at >= ? ORDER BY last_message_at DESC",
+                         (since,))
+
+    def threads_awaiting_reply(self) -> List[str]:
+        return self._ids("SELECT thread_id FROM threads WHERE replied = 0 AND last_message_hash IS NOT NULL "
+                         "ORDER BY last_message_at DESC", ())
+
+
+def migrate_json_to_sqlite(json_path: str = DEFAULT_STATE_PATH, db_path: str = DEFAULT_DB_PATH) -> int:
+    """Copy every thread from the JSON state file into the SQLite store. Returns the thread count."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    store = SQLiteBuyerStateStore(db_path, write_behind=True)
+    for thread_id, entry in data.items():
+        store._update(thread_id, **{k: entry.get(k) for k in COLUMNS if entry.get(k) is not None})
+    store.close()
+    return len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Buyer state SQLite tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mig = sub.add_parser("migrate", help="Import buyer_state.json into the SQLite store")
+    mig.add_argument("--json", default=DEFAULT_STATE_PATH)
+    mig.add_argument("--db", default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        count = migrate_json_to_sqlite(args.json, args.db)
+        print(f"✅ Migrated {count} threads from {args.json} to {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Chrome DevTools Protocol fast path next to Selenium.
+
+The bots attach to Chrome over its remote debugging port, but every
+execute_script / send_keys still goes bot -> chromedriver (HTTP) -> Chrome.
+CDPSession talks to the same tab directly over one persistent websocket:
+
+    Runtime.evaluate             batched queries (``call`` runs a Selenium-style
+                                 script body with JSON arguments)
+    DOMSnapshot.captureSnapshot  whole-page extraction in one message
+    Input.insertText             typing a whole string as one input event
+
+The websocket needs the optional ``websocket-client`` package. Without it
+(or when the debugging port isn't reachable) commands go through
+chromedriver's ``execute_cdp_cmd``, and if that fails too the module-level
+helpers fall back to plain Selenium calls, so callers never have to care
+which path ran.
+
+Runtime.evaluate runs in the tab's top document; code that is switched into
+an iframe must keep using driver.execute_script.
+
+    python bench_cdp.py    # round-trip latency, CDP vs chromedriver
+"""
+import collections
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+import weakref
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_DEBUGGER_ADDRESS = os.getenv("DEBUGGER_ADDRESS", "127.0.0.1:9222")
+CONNECT_TIMEOUT = 5.0
+COMMAND_TIMEOUT = 30.0
+# Shortest socket read events() does, so events(0) still drains what has arrived
+MIN_EVENT_READ = 0.02
+MAX_BUFFERED_EVENTS = 5000
+
+# Turns a Selenium script body ("return arguments[0] + 1;") into an expression
+_CALL_TEMPLATE = "(function () {{ {body}\n}}).apply(null, {args})"
+
+
+class CDPError(RuntimeError):
+    """A CDP command failed or no CDP transport is available."""
+
+
+def page_targets(debugger_address: str):
+    with urllib.request.urlopen(f"http://{debugger_address}/json/list", timeout=CONNECT_TIMEOUT) as resp:
+        return [t for t in json.load(resp) if t.get("type") == "page"]
+
+
+def open_tab(debugger_address: str = DEFAULT_DEBUGGER_ADDRESS, url: str = "about:blank") -> Dict[str, Any]:
+    """Open a new tab in the browser; returns its target (id, webSocketDebuggerUrl, ...)."""
+    request = urllib.request.Request(f"http://{debugger_address}/json/new?{urllib.parse.quote(url, safe=':/?=&')}",
+                                     method="PUT")
+    with urllib.request.urlopen(request, timeout=CONNECT_TIMEOUT) as resp:
+        return json.load(resp)
+
+
+def close_tab(debugger_address: str, target_id: str):
+    try:
+        urllib.request.urlopen(f"http://{debugger_address}/json/close/{target_id}", timeout=CONNECT_TIMEOUT).close()
+    except OSError:
+        pass
+
+
+class CDPSession:
+    """One tab's DevTools connection; connects lazily on the first command.
+
+    ``transport`` is "websocket", "chromedriver" or None (not connected /
+    unavailable). Commands are serialised with a lock, so one session can be
+    shared by threads.
+    """
+
+    def __init__(self, driver=None, debugger_address: Optional[str] = None, target_id: Optional[str] = None):
+        self.driver = driver
+        self.debugger_address = debugger_address or self._driver_debugger_address(driver) or DEFAULT_DEBUGGER_ADDRESS
+        self.target_id = target_id
+        self.transport: Optional[str] = None
+        self._ws = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._failed = False
+        self._subscribed = set()
+        # Commands re-sent after a reconnect (domain enables live on the old socket)
+        self._on_connect: Dict[str, Dict[str, Any]] = {}
+        self._replaying = False
+        self._events = collections.deque(maxlen=MAX_BUFFERED_EVENTS)
+
+    @staticmethod
+    def _driver_debugger_address(driver) -> Optional[str]:
+        try:
+            return driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        except Exception:
+            return None
+
+    def _resolve_target(self) -> Dict[str, Any]:
+        targets = page_targets(self.debugger_address)
+        if not targets:
+            raise CDPError(f"No page targets at {self.debugger_address}")
+        wanted = self.target_id
+        if wanted is None and self.driver is not None:
+            # chromedriver window handles are the DevTools target ids
+            # (older versions prefix them with "CDwindow-")
+            try:
+                wanted = self.driver.current_window_handle.replace("CDwindow-", "")
+            except Exception:
+                wanted = None
+        for t in targets:
+            if wanted and t.get("id", "").upper() == wanted.upper():
+                return t
+        if self.driver is not None:
+            try:
+                url = self.driver.current_url
+                for t in targets:
+                    if t.get("url") == url:
+                        return t
+            except Exception:
+                pass
+        return targets[0]
+
+    def connect(self) -> Optional[str]:
+        """Open the websocket (or settle on chromedriver); returns the transport in use."""
+        if self.transport or self._failed:
+            return self.transport
+        try:
+            import websocket  # websocket-client, optional
+            target = self._resolve_target()
+            # Chrome rejects websocket upgrades carrying an Origin header
+            # unless started with --remote-allow-origins
+            self._ws = websocket.create_connection(target["webSocketDebuggerUrl"], timeout=CONNECT_TIMEOUT,
+                                                   suppress_origin=True)
+            self._ws.settimeout(COMMAND_TIMEOUT)
+            self.target_id = target.get("id")
+            self.transport = "websocket"
+        except Exception as e:
+            self._ws = None
+            if self.driver is not None and hasattr(self.driver, "execute_cdp_cmd"):
+                print(f"⚠️ CDP websocket unavailable ({str(e)[:80]}); using chromedriver's CDP bridge")
+                self.transport = "chromedriver"
+            else:
+                print(f"⚠️ CDP unavailable ({str(e)[:80]}); staying on Selenium")
+                self._failed = True
+            return self.transport
+        if self._on_connect and not self._replaying:
+            self._replaying = True
+            try:
+                for method, params in list(self._on_connect.items()):
+                    self.send(method, params)
+            except CDPError as e:
+                print(f"⚠️ Could not restore {method} after reconnecting: {e}")
+            finally:
+                self._replaying = False
+        return self.transport
+
+    @property
+    def direct(self) -> bool:
+        """True when commands skip chromedriver entirely."""
+        return self.connect() == "websocket"
+
+    def send(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        transport = self.connect()
+        if transport == "chromedriver":
+            try:
+                return self.driver.execute_cdp_cmd(method, params or {})
+            except Exception as e:
+                raise CDPError(f"{method}: {e}") from e
+        if transport != "websocket":
+            raise CDPError("No CDP transport")
+        with self._lock:
+            msg_id = next(self._ids)
+            try:
+                self._ws.send(json.dumps({"id": msg_id, "method": method, "params": params or {}}))
+                while True:
+                    msg = json.loads(self._ws.recv())
+                    if msg.get("id") == msg_id:
+                        break
+                    self._buffer(msg)
+            except Exception as e:
+                self._drop()
+                raise CDPError(f"{method}: {e}") from e
+        if "error" in msg:
+            raise CDPError(f"{method}: {msg['error'].get('message')}")
+        return msg.get("result", {})
+
+    def _buffer(self, msg: Dict[str, Any]):
+        if msg.get("method") in self._subscribed:
+            self._events.append(msg)
+
+    def subscribe(self, *methods: str):
+        """Keep events with these method names for ``events()``; others are dropped.
+
+        Events only arrive over the websocket; chromedriver's bridge has none.
+        """
+        self._subscribed.update(methods)
+
+    def keep_enabled(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Send ``method`` now and again after every reconnect (e.g. "Network.enable")."""
+        result = self.send(method, params)
+        self._on_connect[method] = params or {}
+        return result
+
+    def events(self, wait: float = 0.0) -> List[Dict[str, Any]]:
+        """Subscribed events received so far, reading the socket for up to ``wait`` seconds.
+
+        The read is bounded by the deadline (at least MIN_EVENT_READ), so a
+        busy page can't keep it draining events indefinitely.
+        """
+        if self.connect() == "websocket":
+            import websocket
+            with self._lock:
+                deadline = time.monotonic() + max(wait, MIN_EVENT_READ)
+                try:
+                    while True:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._ws.settimeout(remaining)
+                        try:
+                            self._buffer(json.loads(self._ws.recv()))
+                        except websocket.WebSocketTimeoutException:
+                            break
+                    self._ws.settimeout(COMMAND_TIMEOUT)
+                except Exception as e:
+                    self._drop()
+                    raise CDPError(f"Reading events: {e}") from e
+        out = list(self._events)
+        self._events.clear()
+        return out
+
+    def evaluate(self, expression: str, await_promise: bool = False) -> Any:
+        """Runtime.evaluate in the top document; returns the JSON value of the result."""
+        result = self.send("Runtime.evaluate", {
+            "expression": expression,
+            "returnByValue": True,
+            "awaitPromise": await_promise,
+        })
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            text = (details.get("exception") or {}).get("description") or details.get("text")
+            raise CDPError(f"Script error: {text}")
+        return result.get("result", {}).get("value")
+
+    def call(self, script: str, *args) -> Any:
+        """Run a Selenium-style script body (``arguments[i]``, ``return ...``).
+
+        Arguments must be JSON-serialisable and so is the result; scripts
+        that take or return elements need driver.execute_script.
+        """
+        return self.evaluate(_CALL_TEMPLATE.format(body=script, args=json.dumps(list(args))))
+
+    def capture_snapshot(self, computed_styles: Iterable[str] = ()) -> Dict[str, Any]:
+        """DOMSnapshot.captureSnapshot of the whole page (documents, strings, layout)."""
+        return self.send("DOMSnapshot.captureSnapshot", {"computedStyles": list(computed_styles)})
+
+    def insert_text(self, text: str):
+        """Input.insertText into the focused element, as one input event."""
+        self.send("Input.insertText", {"text": text})
+
+    # The few WebDriver calls waits.py conditions and the agent's read paths
+    # use, so a session can stand in for a driver in a tab Selenium isn't on
+    def execute_script(self, script: str, *args) -> Any:
+        return self.call(script, *args)
+
+    @property
+    def current_url(self) -> str:
+        return self.evaluate("location.href")
+
+    def get(self, url: str, timeout: float = 30.0):
+        """Page.navigate and wait for the new document to finish loading."""
+        self.send("Page.navigate", {"url": url})
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if self.evaluate("location.href !== 'about:blank' && document.readyState === 'complete'"):
+                    return
+            except CDPError:
+                pass  # context destroyed mid-navigation
+            time.sleep(0.05)
+
+    def press_enter(self):
+        for kind in ("keyDown", "keyUp"):
+            self.send("Input.dispatchKeyEvent", {"type": kind, "key": "Enter", "code": "Enter",
+                                                 "windowsVirtualKeyCode": 13, "nativeVirtualKeyCode": 13,
+                                                 **({"text": "\r"} if kind == "keyDown" else {})})
+
+    def _drop(self):
+        try:
+            if self._ws is not None:
+                self._ws.close()
+        except Exception:
+            pass
+        self._ws = None
+        self.transport = None
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+
+_sessions: "weakref.WeakKeyDictionary[Any, CDPSession]" = weakref.WeakKeyDictionary()
+
+
+def cdp_session(driver) -> CDPSession:
+    """The shared CDPSession for ``driver``'s current tab."""
+    session = _sessions.get(driver)
+    if session is None:
+        session = _sessions[driver] = CDPSession(driver)
+    return session
+
+
+def run_script(driver, script: str, *args) -> Any:
+    """Run a JSON-in/JSON-out script over the CDP websocket, else driver.execute_script."""
+    session = cdp_session(driver)
+    if session.direct:
+        try:
+            return session.call(script, *args)
+        except CDPError as e:
+            print(f"⚠️ CDP evaluate failed, using Selenium: {str(e)[:100]}")
+    return driver.execute_script(script, *args)
+
+
+def insert_text(driver, element, text: str):
+    """Type ``text`` into ``element`` in one Input.insertText; send_keys as the fallback.
+
+    The element is focused first; React inputs see a normal input event.
+    """
+    try:
+        driver.execute_script("arguments[0].focus();", element)
+        cdp_session(driver).insert_text(text)
+        return
+    except Exception as e:
+        print(f"⚠️ CDP insertText unavailable, typing with send_keys: {str(e)[:100]}")
+    element.send_keys(text)
+
+
+def page_snapshot(driver, computed_styles: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+    """Whole-page DOMSnapshot, or None when CDP isn't available."""
+    try:
+        return cdp_session(driver).capture_snapshot(computed_styles)
+    except CDPError as e:
+        print(f"⚠️ DOM snapshot unavailable: {str(e)[:100]}")
+        return None
+
+
+def snapshot_text(snapshot: Dict[str, Any]) -> Iterable[str]:
+    """Non-blank text node values from a DOMSnapshot, in document order."""
+    strings = snapshot.get("strings", [])
+    for doc in snapshot.get("documents", []):
+        nodes = doc.get("nodes", {})
+        for node_type, value in zip(nodes.get("nodeType", []), nodes.get("nodeValue", [])):
+            if node_type == 3 and value >= 0 and strings[value].strip():
+                yield strings[value]
@@ -0,0 +1,162 @@
+"""
+Push-based wake-ups for the agent's main loop.
+
+Instead of sleeping a fixed 60 s between passes, ``--watch`` installs a
+MutationObserver in the Messages tab and blocks in an execute_async_script
+long-poll until the chat list changes. The observer reduces the page to a
+signature (tab title with its unread count, plus href and text of the top
+rows with relative times like "5m" removed), so re-rendered timestamps and
+hover effects don't wake the agent. Only a real change does: a new
+snippet, a reordered list or a new unread count.
+
+While idle this costs one WebDriver request per LONG_POLL seconds and no
+navigation or sidebar scans. A full page load (e.g. opening a thread by
+URL mid-pass) drops the observer; the watcher notices, re-installs it and
+compares the chat list with the signature taken at ``arm()``, so a change
+in between still counts. A heartbeat still runs a pass every so often in
+case a change was missed.
+"""
+import time
+from typing import Optional, Tuple
+
+LONG_POLL = 25.0
+DEBOUNCE_MS = 300
+TOP_ROWS = 8
+
+# arguments: [debounce ms, top rows]
+# returns: [current version (0 right after install), current signature]
+WATCH_INSTALL_JS = r"""
+var debounce = arguments[0], topRows = arguments[1];
+var w = window.__sellbotWatch;
+if (w) return [w.version, w.sig];
+function signature() {
+    var scope = document.querySelector("div[aria-label='Chats']") || document;
+    var links = scope.querySelectorAll("a[href*='/messages/t/']");
+    var parts = [document.title];
+    for (var i = 0; i < links.length && i < topRows; i++) {
+        var text = (links[i].innerText || '').replace(/\b\d+\s?(s|m|h|d|w|min|mins|hr|hrs)\b/g, '');
+        parts.push(links[i].getAttribute('href') + '|' + text + '|' + (links[i].getAttribute('aria-label') || ''));
+    }
+    return parts.join('\n');
+}
+w = window.__sellbotWatch = {version: 0, sig: signature(), waiters: [], timer: null};
+function check() {
+    w.timer = null;
+    var sig = signature();
+    if (sig === w.sig) return;
+    w.sig = sig;
+    w.version += 1;
+    var waiters = w.waiters;
+    w.waiters = [];
+    for (var i = 0; i < waiters.length; i++) waiters[i](w.version);
+}
+w.observer = new MutationObserver(function () {
+    if (!w.timer) w.timer = setTimeout(check, debounce);
+});
+w.observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+return [w.version, w.sig];
+"""
+
+# arguments: [version seen by the caller, timeout ms, callback]
+# returns: {installed, version}; resolves as soon as version moves past the caller's
+WATCH_WAIT_JS = r"""
+var since = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var w = window.__sellbotWatch;
+if (!w) { done({installed: false, version: -1}); return; }
+if (w.version !== since) { done({installed: true, version: w.version}); return; }
+var finished = false;
+function finish() {
+    if (finished) return;
+    finished = true;
+    done({installed: true, version: w.version});
+}
+w.waiters.push(finish);
+setTimeout(finish, timeoutMs);
+"""
+
+
+class ChatWatcher:
+    """Blocks until the Messages tab's chat list changes.
+
+    Call ``arm()`` at the start of a pass; ``wait_for_change`` then returns
+    as soon as anything changed since then, including during the pass
+    itself, so a message that lands mid-pass isn't slept through.
+    """
+
+    def __init__(self, driver, long_poll: float = LONG_POLL):
+        self.driver = driver
+        self.long_poll = long_poll
+        self.version: Optional[int] = None
+        # Chat list signature at arm(); survives the observer being dropped by a page load
+        self.signature: Optional[str] = None
+
+    def install(self) -> Tuple[int, str]:
+        version, signature = self.driver.execute_script(WATCH_INSTALL_JS, DEBOUNCE_MS, TOP_ROWS)
+        return version, signature
+
+    def arm(self):
+        """Take the current chat list as the baseline (installs the observer if needed)."""
+        try:
+            self.version, self.signature = self.install()
+        except Exception as e:
+            print(f"⚠️ Could not install chat watcher: {str(e)[:100]}")
+            self.version = self.signature = None
+
+    def _reinstall(self) -> bool:
+        """Re-install a dropped observer. True if the chat list differs from the armed baseline."""
+        try:
+            self.version, signature = self.install()
+        except Exception as e:
+            print(f"⚠️ Could not install chat watcher: {str(e)[:100]}")
+            self.version = None
+            return False
+        if self.signature is None:
+            self.signature = signature
+            return False
+        return signature != self.signature
+
+    def _script_timeout(self) -> Optional[float]:
+        try:
+            return self.driver.timeouts.script
+        except Exception:
+            return None
+
+    def wait_for_change(self, timeout: float) -> bool:
+        """True once the chat list changed since ``arm()``; False after ``timeout`` seconds."""
+        previous_timeout = self._script_timeout()
+        try:
+            return self._wait(timeout)
+        finally:
+            # The driver is shared with the rest of the agent
+            if previous_timeout is not None:
+                try:
+                    self.driver.set_script_timeout(previous_timeout)
+                except Exception:
+                    pass
+
+    def _wait(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self.version is None:
+                # Observer dropped (page load) or never installed
+                if self._reinstall():
+                    return True
+                if self.version is None:
+                    time.sleep(min(remaining, 5.0))
+                    continue
+            poll = min(self.long_poll, remaining)
+            try:
+                self.driver.set_script_timeout(poll + 10)
+                result = self.driver.execute_async_script(WATCH_WAIT_JS, self.version, int(poll * 1000))
+            except Exception as e:
+                print(f"⚠️ Chat watcher long-poll failed: {str(e)[:100]}")
+                self.version = None
+                continue
+            if not result or not result.get("installed"):
+                self.version = None
+                continue
+            if result["version"] != self.version:
+                return True
@@ -1,54 +1,60 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
 import os
 import time
-import json
 import argparse
 
+from cdp import insert_text
+from driver_resolver import start_driver
+from inventory import Inventory, get_price, get_photo_paths
+from selector_registry import selector_registry
+from waits import (wait_until, document_ready, element_absent, element_enabled, element_present,
+                   url_changed)
+
 
 DEFAULT_DEBUGGER_ADDRESS = os.getenv("DEBUGGER_ADDRESS", "127.0.0.1:9222")
 DEFAULT_ITEM_ID = 29  # Fallback item ID if none provided
+UPLOAD_INDICATOR_XPATH = "//*[contains(@aria-label, 'Uploading') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'), 'uploading') or contains(@class, 'uploading') or contains(@class, 'progress')]"
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Automate FB Marketplace listing form fill")
     parser.add_argument("--id", type=int, help="Item ID from output.json to post", default=None)
+    parser.add_argument("--debugger-address", default=DEFAULT_DEBUGGER_ADDRESS,
+                        help="Chrome remote debugging address to attach to (empty to start a new Chrome)")
     return parser.parse_args()
 
 
+_inventories = {}
+
+
+def _inventory(json_path: str) -> Inventory:
+    """One Inventory per path for this process, synced with the file instead of re-parsed per call."""
+    inventory = _inventories.get(json_path)
+    if inventory is None:
+        inventory = _inventories[json_path] = Inventory(json_path)
+    else:
+        inventory.sync()
+    return inventory
+
+
 def update_item_status(item_id: int, status: str, json_path: str = "output.json"):
     """Update the Status field for a specific item ID in the JSON file."""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    full_path = os.path.join(script_dir, json_path)
-    
+    return update_item_statuses({item_id: status}, json_path)
+
+
+def update_item_statuses(statuses: dict, json_path: str = "output.json"):
+    """Update several item statuses ({ID: status}) with a single locked write."""
     try:
-        # Read the entire JSON file
-        with open(full_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Find and update the item
-        item_found = False
-        for item in data:
-            if item.get('ID') == item_id:
-                item['Status'] = status
-                item_found = True
-                break
-        
-        if not item_found:
+        missing = _inventory(json_path).update_statuses(statuses)
+        for item_id in missing:
             print(f"[WARNING] Item ID {item_id} not found in {json_path}")
-            return False
-        
-        # Write back to file
-        with open(full_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
-        print(f"[INFO] Updated item ID {item_id} status to: {status}")
-        return True
+        for item_id, status in statuses.items():
+            if item_id not in missing:
+                print(f"[INFO] Updated item ID {item_id} status to: {status}")
+        return not missing
     except Exception as e:
         print(f"[ERROR] Failed to update status: {e}")
         return False
@@ -56,27 +62,14 @@ def update_item_status(item_id: int, status: str, json_path: str = "output.json"
 
 def load_item_data(item_id: int, json_path: str = "output.json"):
     """Load item data from JSON file by ID. Returns item dict or None if not found."""
-    # Get the directory where this script is located
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    full_path = os.path.join(script_dir, json_path)
-    
     try:
-        with open(full_path, 'r', encoding='utf-8') as f:
-            items = json.load(f)
-        
-        for item in items:
-            if item.get('ID') == item_id:
-                print(f"[INFO] Found item ID {item_id}: {item.get('Title', 'No title')}")
-                return item
-        
-        print(f"[ERROR] Item ID {item_id} not found in {full_path}")
-        return None
-    except FileNotFoundError:
-        print(f"[ERROR] File {full_path} not found")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"[ERROR] Failed to parse JSON: {e}")
-        return None
+        inventory = _inventory(json_path)
+        item = inventory.get(item_id)
+        if item is None:
+            print(f"[ERROR] Item ID {item_id} not found in {inventory.path}")
+            return None
+        print(f"[INFO] Found item ID {item_id}: {item.get('Title', 'No title')}")
+        return item
     except Exception as e:
         print(f"[ERROR] Error loading item data: {e}")
         return None
@@ -108,7 +101,7 @@ def fill_title_field(driver, title: str, wait_seconds: int = 20):
             title_input.send_keys(Keys.DELETE)
             time.sleep(0.2)
             # Type the title
-            title_input.send_keys(title)
+            insert_text(driver, title_input, title)
             print(f"[INFO] Title filled: {title}")
             return True
         except Exception as e:
@@ -155,7 +148,7 @@ def fill_price_field(driver, price, wait_seconds: int = 20):
             price_input.send_keys(Keys.DELETE)
             time.sleep(0.2)
             # Type the price
-            price_input.send_keys(price_str)
+            insert_text(driver, price_input, price_str)
             print(f"[INFO] Price filled: {price_str}")
             return True
         except Exception as e:
@@ -193,7 +186,7 @@ def fill_description_field(driver, description: str, wait_seconds: int = 20):
             description_input.send_keys(Keys.DELETE)
             time.sleep(0.2)
             # Type the description
-            description_input.send_keys(description)
+            insert_text(driver, description_input, description)
             print(f"[INFO] Description filled: {description[:50]}...")
             return True
         except Exception as e:
@@ -321,18 +314,15 @@ def upload_photos(driver, photo_paths: list, wait_seconds: int = 20):
             
             # Wait for files to be processed and uploaded
             print("[INFO] Waiting for photos to upload and process (this may take a minute)...")
-            time.sleep(3)  # Initial wait for upload to start
+            # Give the upload a moment to start (returns as soon as an indicator shows)
+            wait_until(driver, element_present(By.XPATH, UPLOAD_INDICATOR_XPATH), timeout=3,
+                       site="click.upload_start", record_timeouts=False)
             
-            # Wait for upload indicators to disappear (up to 60 seconds)
-            try:
-                WebDriverWait(driver, 60).until(lambda d: (
-                    len(d.find_elements(By.XPATH, "//*[contains(@aria-label, 'Uploading') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'), 'uploading') or contains(@class, 'uploading') or contains(@class, 'progress')]")) == 0
-                ))
+            # Wait for upload indicators to disappear (worst case 60 seconds)
+            if wait_until(driver, element_absent(By.XPATH, UPLOAD_INDICATOR_XPATH), timeout=60, site="click.upload"):
                 print("[INFO] All photos uploaded successfully")
-            except Exception:
-                # If we can't detect upload completion, just wait longer
-                print("[DEBUG] Could not detect upload completion status, waiting 8 more seconds...")
-                time.sleep(8)
+            else:
+                print("[DEBUG] Could not detect upload completion status, continuing...")
             
             print(f"[INFO] Successfully uploaded {len(valid_paths)} photo(s)")
             return True
@@ -435,7 +425,7 @@ def click_publish_button(driver, wait_seconds: int = 10):
         
         print("[DEBUG] Publish button is enabled, scrolling into view...")
         driver.execute_script("arguments[0].scrollIntoView({block:'center'});", publish_btn)
-        time.sleep(0.8)
+        url_before = driver.current_url
         
         # Re-fetch after scroll to avoid stale element
         publish_btn = driver.find_element(By.XPATH, used_selector)
@@ -450,10 +440,10 @@ def click_publish_button(driver, wait_seconds: int = 10):
             print("[INFO] Publish button clicked successfully via JavaScript")
         
         print("[INFO] Waiting for listing to be published...")
-        time.sleep(3)
+        wait_until(driver, url_changed(url_before), timeout=3, site="click.publish", record_timeouts=False)
         
         # Wait for page to stabilize
-        WebDriverWait(driver, 10).until(lambda d: d.execute_script("return document.readyState") == 'complete')
+        wait_until(driver, document_ready, timeout=10, site="click.page_ready")
         print("[INFO] Listing published successfully!")
         return True
     except Exception as e:
@@ -467,9 +457,7 @@ def click_next_button(driver, wait_seconds: int = 10):
     """Click the Next button if enabled, advancing to the next form page."""
     wait = WebDriverWait(driver, wait_seconds)
     try:
-        # Add a longer wait after photos to ensure page is ready
         print("[INFO] Waiting for form to be fully ready...")
-        time.sleep(5)  # Increased wait time for form validation
         
         # Get current URL before clicking
         current_url_before = driver.current_url
@@ -500,6 +488,9 @@ def click_next_button(driver, wait_seconds: int = 10):
             print("[WARNING] Next button not found with any selector")
             return False
         
+        # Form validation enables the button once the page is ready (worst case 5s)
+        wait_until(driver, element_enabled(By.XPATH, used_selector), timeout=5, site="click.form_ready")
+        
         # Re-fetch the button to avoid stale element
         next_btn = driver.find_element(By.XPATH, used_selector)
         
@@ -513,8 +504,8 @@ def click_next_button(driver, wait_seconds: int = 10):
         
         if aria_disabled == 'true' or html_disabled is not None or opacity == '0.5' or pointer_events == 'none':
             print("[WARNING] Next button appears disabled (aria-disabled, disabled attr, opacity, or pointer-events)")
-            print("[INFO] Waiting 5 more seconds for button to become enabled...")
-            time.sleep(5)
+            print("[INFO] Waiting up to 5 more seconds for button to become enabled...")
+            wait_until(driver, element_enabled(By.XPATH, used_selector), timeout=5, site="click.next_enabled")
             
             # Re-check after wait
             next_btn = driver.find_element(By.XPATH, used_selector)
@@ -529,7 +520,6 @@ def click_next_button(driver, wait_seconds: int = 10):
         
         print("[DEBUG] Next button is enabled, scrolling into view...")
         driver.execute_script("arguments[0].scrollIntoView({block:'center'});", next_btn)
-        time.sleep(0.8)
         
         # Re-fetch after scroll to avoid stale element
         next_btn = driver.find_element(By.XPATH, used_selector)
@@ -596,24 +586,16 @@ def click_next_button(driver, wait_seconds: int = 10):
             pass
         
         print("[INFO] Waiting for next page to load...")
-        time.sleep(5)
-        
-        # Verify page actually changed
+        # Verify page actually changed (worst case 7s)
+        wait_until(driver, url_changed(current_url_before), timeout=7, site="click.next_page")
         current_url_after = driver.current_url
         print(f"[DEBUG] Current URL after Next click: {current_url_after}")
         
         if current_url_before == current_url_after:
-            print("[WARNING] URL did not change after Next click - page may not have advanced")
-            # Try waiting a bit more
-            time.sleep(2)
-            current_url_after = driver.current_url
-            print(f"[DEBUG] Current URL after additional wait: {current_url_after}")
-            
-            if current_url_before == current_url_after:
-                print("[ERROR] URL still unchanged - Next button click likely failed")
-                return False
+            print("[ERROR] URL still unchanged - Next button click likely failed")
+            return False
         
-        WebDriverWait(driver, 10).until(lambda d: d.execute_script("return document.readyState") == 'complete')
+        wait_until(driver, document_ready, timeout=10, site="click.page_ready")
         print("[INFO] Next page loaded successfully")
         return True
     except Exception as e:
@@ -637,7 +619,7 @@ def create_driver(debugger_address: str = DEFAULT_DEBUGGER_ADDRESS):
         options.add_experimental_option('useAutomationExtension', False)
 
     try:
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+        driver = start_driver(options, debugger_address, log=lambda msg: print(f"[INFO] {msg}"))
         print("[INFO] Successfully connected to Chrome")
         return driver
     except Exception as e:
@@ -647,7 +629,8 @@ def create_driver(debugger_address: str = DEFAULT_DEBUGGER_ADDRESS):
         raise
 
 
-def find_and_click(driver, selectors, wait_seconds: int = 20, verify_after_click=None, button_name="button"):
+def find_and_click(driver, selectors, wait_seconds: int = 20, verify_after_click=None, button_name="button",
+                   group: str = None, fallback_wait_seconds: int = 3):
     """Attempt to find and click one of the selectors. Returns True if clicked.
     
     Args:
@@ -656,9 +639,16 @@ def find_and_click(driver, selectors, wait_seconds: int = 20, verify_after_click
         wait_seconds: Maximum time to wait for element to be clickable
         verify_after_click: Optional function that takes driver and returns True when click succeeded
         button_name: Name of button for error messages
+        group: Selector registry group; when given, selectors that have stopped
+            matching are tried last and later fallbacks only get fallback_wait_seconds
     """
-    wait = WebDriverWait(driver, wait_seconds)
-    for by, sel in selectors:
+    registry = selector_registry() if group else None
+    if registry:
+        selectors = registry.order(group, selectors)
+    for n, (by, sel) in enumerate(selectors):
+        # The page has had the full wait on the first selector already
+        wait = WebDriverWait(driver, wait_seconds if not registry or n == 0 else min(wait_seconds, fallback_wait_seconds))
+        t0 = time.perf_counter()
         try:
             print(f"[DEBUG] Trying to find {button_name} with selector: {by}={sel[:100]}...")
             elem = wait.until(EC.element_to_be_clickable((by, sel)))
@@ -681,17 +671,21 @@ def find_and_click(driver, selectors, wait_seconds: int = 20, verify_after_click
                 short_wait.until(verify_after_click)
                 print(f"[DEBUG] Verification passed for {button_name}")
             
+            if registry:
+                registry.record(group, (by, sel), True, time.perf_counter() - t0)
             return True
         except Exception as e:
             print(f"[DEBUG] Selector failed: {type(e).__name__}: {str(e)[:200]}")
+            if registry:
+                registry.record(group, (by, sel), False, time.perf_counter() - t0)
             continue
     return False
 
 
 def main():
     args = parse_args()
-    using_debugger = bool(DEFAULT_DEBUGGER_ADDRESS)
-    driver = create_driver()
+    using_debugger = bool(args.debugger_address)
+    driver = create_driver(args.debugger_address)
     try:
         # Verify connection is alive
         try:
@@ -707,7 +701,7 @@ def main():
             print("[INFO] Navigating to Facebook Marketplace...")
             try:
                 driver.get("https://www.facebook.com/marketplace")
-                WebDriverWait(driver, 10).until(lambda d: d.execute_script("return document.readyState") == 'complete')
+                wait_until(driver, document_ready, timeout=10, site="click.navigate")
                 print(f"[INFO] Page loaded. Current URL: {driver.current_url}")
             except Exception as e:
                 print(f"[ERROR] Failed to navigate: {e}")
@@ -715,7 +709,7 @@ def main():
         else:
             print(f"[INFO] Already on Marketplace page: {current_url}")
             # Wait for page to be ready
-            WebDriverWait(driver, 10).until(lambda d: d.execute_script("return document.readyState") == 'complete')
+            wait_until(driver, document_ready, timeout=10, site="click.page_ready")
         
         # Wait a bit for dynamic content to load
         time.sleep(2)
@@ -748,7 +742,8 @@ def main():
             or d.find_elements(By.XPATH, "//input[contains(@placeholder, 'Title') or contains(@aria-label, 'Title')]")
         )
 
-        clicked = find_and_click(driver, selectors, verify_after_click=verify_create_ui, button_name="Create new listing")
+        clicked = find_and_click(driver, selectors, verify_after_click=verify_create_ui, button_name="Create new listing",
+                                 group="create_listing")
         if not clicked:
             print("[ERROR] Could not find or click the Create new listing button")
             print("[DEBUG] Trying to find any buttons with 'create' or 'listing' in text...")
@@ -782,7 +777,8 @@ def main():
             or d.find_elements(By.XPATH, "//input[contains(@placeholder, 'Title') or contains(@aria-label, 'Title')]")
         )
 
-        if not find_and_click(driver, item_for_sale_selectors, verify_after_click=verify_item_form, button_name="Item for sale"):
+        if not find_and_click(driver, item_for_sale_selectors, verify_after_click=verify_item_form, button_name="Item for sale",
+                              group="item_for_sale"):
             print("[ERROR] Could not find or click the Item for sale button")
             return
         
@@ -818,7 +814,7 @@ def main():
             return
         
         # Get price from item data
-        price = item_data.get('Price')
+        price = get_price(item_data)
         if price is None:
             print(f"[WARNING] No price found for item ID {chosen_id}, skipping price field")
         else:
@@ -863,7 +859,7 @@ def main():
             print("[WARNING] Failed to set condition, continuing...")
 
         # Get photo paths from item data
-        photo_paths = item_data.get('Photo_Paths', [])
+        photo_paths = get_photo_paths(item_data)
         if photo_paths and len(photo_paths) > 0:
             # Wait a bit between operations
             time.sleep(1)
@@ -2,17 +2,15 @@
 Click the Marketplace aggregate and see what's inside
 """
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
+
+from driver_resolver import start_driver
 
 # Connect to existing Chrome
 chrome_options = Options()
 chrome_options.debugger_address = "127.0.0.1:9222"
-service = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=service, options=chrome_options)
+driver = start_driver(chrome_options, chrome_options.debugger_address)
 
 print("Connected to Chrome")
 
@@ -0,0 +1,181 @@
+"""
+Injected page scripts that read a whole DOM region in one WebDriver round trip,
+plus the pure-Python side that interprets their results.
+
+Reading a chat list with find_element / get_attribute / getComputedStyle per
+row costs one HTTP call each, so a 30-row inbox took hundreds of calls per
+pass. CHAT_LIST_JS collects every row's link, text, aria labels and unread
+cues (blue dot, bold title) in the page and returns them as one JSON array;
+element references come back as WebElements, so callers can still click.
+TRANSCRIPT_JS does the same for the message rows of an open thread.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+THREAD_HREF = "/messages/t/"
+_THREAD_ID_RE = re.compile(r"/messages/t/(\d+)")
+UNREAD_WORDS = ("unread", "new message", "new messages", "new")
+
+# arguments: [xpath selectors tried in order, root element or null, max dot candidates per row]
+# returns: {selector, rows: [{element, click, idx, tag, href, click_href, text, aria, dot, bold}]} or null
+CHAT_LIST_JS = r"""
+var selectors = arguments[0], root = arguments[1] || document, maxDots = arguments[2] == null ? 20 : arguments[2];
+function isBlue(el) {
+    var m = /rgba?\((\d+),\s*(\d+),\s*(\d+)/.exec(window.getComputedStyle(el).backgroundColor || '');
+    return !!m && +m[1] < 50 && +m[3] > 200;
+}
+for (var s = 0; s < selectors.length; s++) {
+    var snap;
+    try {
+        snap = document.evaluate(selectors[s], root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    } catch (e) { continue; }
+    if (!snap.snapshotLength) continue;
+    var rows = [];
+    for (var i = 0; i < snap.snapshotLength; i++) {
+        var el = snap.snapshotItem(i);
+        var click = el.querySelector("a[href*='/messages/t/']") || el.querySelector("a[role='link']") || el;
+        var dot = false, bold = false;
+        var dots = el.querySelectorAll('div, span');
+        for (var d = 0; d < dots.length && d < maxDots; d++) {
+            if (isBlue(dots[d])) { dot = true; break; }
+        }
+        var spans = el.querySelectorAll("span[dir='auto']");
+        for (var b = 0; b < spans.length && b < 3; b++) {
+            if ((parseInt(window.getComputedStyle(spans[b]).fontWeight, 10) || 400) >= 600) { bold = true; break; }
+        }
+        rows.push({
+            element: el,
+            click: click,
+            idx: i,
+            tag: el.tagName.toLowerCase(),
+            href: el.tagName === 'A' ? (el.href || '') : '',
+            click_href: click.href || click.getAttribute('href') || '',
+            text: (el.innerText || '').trim(),
+            aria: (el.getAttribute('aria-label') || '') + ' ' + (click.getAttribute('aria-label') || ''),
+            dot: dot,
+            bold: bold
+        });
+    }
+    return {selector: selectors[s], rows: rows};
+}
+return null;
+"""
+
+
+def parse_thread_id(href: Optional[str]) -> Optional[str]:
+    m = _THREAD_ID_RE.search(href or "")
+    return m.group(1) if m else None
+
+
+def classify_row(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Add unread / aggregate flags to a CHAT_LIST_JS row; None for rows that aren't threads."""
+    if row.get("tag") == "a" and THREAD_HREF not in (row.get("href") or ""):
+        return None  # nav link
+    click_href = row.get("click_href") or ""
+    if THREAD_HREF not in click_href and row.get("tag") != "div":
+        return None
+    text = (row.get("text") or "").replace("\n", " ")
+    text_low = text.lower()
+    aria = (row.get("aria") or "").lower()
+    new_message = "new message" in text_low
+    unread = any(w in aria for w in UNREAD_WORDS) or new_message or bool(row.get("dot")) or bool(row.get("bold"))
+    return dict(
+        row,
+        text=text,
+        aria=aria[:120],
+        thread_id=parse_thread_id(click_href),
+        unread=unread,
+        is_marketplace_group=text_low.startswith("marketplace") and new_message,
+        has_blue_dot=bool(row.get("dot")),
+        has_bold_text=bool(row.get("bold")),
+    )
+
+
+def rank_conversations(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Unread buyer threads first, then unread aggregates; otherwise non-aggregate rows in page order."""
+    enriched = [r for r in (classify_row(row) for row in rows) if r is not None]
+    unread = [r for r in enriched if r["unread"]]
+    unread_threads = [r for r in unread if not r["is_marketplace_group"]]
+    if unread_threads:
+        return unread_threads
+    if unread:
+        return unread
+    return [r for r in enriched if not r["is_marketplace_group"]] or enriched
+
+
+# arguments: [root element or null]
+# returns: one entry per div[role="row"] in page order:
+#   {order, text (first dir=auto bubble), row_text, justify, parent_justify, left, right, ts}
+TRANSCRIPT_JS = r"""
+var root = arguments[0] || document;
+var rows = root.querySelectorAll('div[role="row"]');
+function justify(el) { return el && el.nodeType === 1 ? (window.getComputedStyle(el).justifyContent || '') : ''; }
+var out = [];
+for (var i = 0; i < rows.length; i++) {
+    var row = rows[i];
+    var bubble = row.querySelector('div[dir="auto"]');
+    var t = row.querySelector('time[datetime], abbr[aria-label], [data-utime]');
+    var entry = {
+        order: i,
+        text: bubble ? (bubble.innerText || '').trim() : '',
+        row_text: (row.innerText || '').trim().slice(0, 200),
+        justify: justify(row),
+        parent_justify: justify(row.parentElement),
+        left: null,
+        right: null,
+        ts: t ? (t.getAttribute('datetime') || t.getAttribute('data-utime') || t.getAttribute('aria-label')) : null
+    };
+    if (bubble) {
+        var rb = row.getBoundingClientRect(), bb = bubble.getBoundingClientRect();
+        entry.left = bb.left - rb.left;
+        entry.right = rb.right - bb.right;
+    }
+    out.push(entry);
+}
+return out;
+"""
+
+
+# arguments: [header CSS selectors, item title CSS selectors]
+# returns: {header: first header text longer than 1 char or null,
+#           items: texts matched by the item selectors, banner: longer texts in the banner/header}
+THREAD_HEADER_JS = r"""
+var headerSels = arguments[0], itemSels = arguments[1];
+function texts(sel, scope) {
+    var out = [], els;
+    try { els = (scope || document).querySelectorAll(sel); } catch (e) { return out; }
+    for (var i = 0; i < els.length; i++) {
+        var t = (els[i].innerText || '').trim();
+        if (t) out.push(t);
+    }
+    return out;
+}
+var header = null;
+for (var h = 0; h < headerSels.length && header === null; h++) {
+    var found = texts(headerSels[h]).filter(function (t) { return t.length > 1; });
+    if (found.length) header = found[0];
+}
+var items = [];
+for (var s = 0; s < itemSels.length; s++) items = items.concat(texts(itemSels[s]));
+var bannerEl = document.querySelector("div[role='banner'], header");
+var banner = bannerEl ? texts("span[dir='auto']", bannerEl).filter(function (t) { return t.length > 10; }) : [];
+return {header: header, items: items, banner: banner};
+"""
+
+
+def parse_thread_header(info: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """(buyer name, item title) from a THREAD_HEADER_JS result."""
+    name = item_title = None
+    header_text = info.get("header")
+    if header_text and ' · ' in header_text:
+        name, item_title = (part.strip() for part in header_text.split(' · ', 1))
+    elif header_text:
+        name = header_text
+    if not item_title:
+        item_title = next((t for t in info.get("items", [])
+                           if len(t) > 5 and t != name and t.lower() != 'marketplace'), None)
+    if not item_title:
+        # Longest non-name text in the banner is likely the item title
+        candidates = [t for t in info.get("banner", []) if t != name and t.lower() != 'marketplace']
+        item_title = max(candidates, key=len) if candidates else None
+    return name, item_title
@@ -0,0 +1,214 @@
+"""
+chromedriver resolution without a network round trip on every start.
+
+``ChromeDriverManager().install()`` asks the network which driver matches
+the installed Chrome on every launch, which adds seconds and fails offline.
+Here the driver path is cached in chromedriver_cache.json under the Chrome
+major version (chromedriver is compatible across a major), detected locally
+from, in order:
+
+    - the debugger address's /json/version (the browser we attach to)
+    - ``chrome --version`` for $CHROME_PATH and the usual binaries
+    - the Windows registry (HKCU/HKLM Google\\Chrome\\BLBeacon)
+
+webdriver_manager is only imported when the cache has no usable driver for
+that version. When the version can't be detected, the downloaded driver is
+cached under "unknown" for UNKNOWN_TTL seconds, so an undetectable Chrome
+costs one download per TTL instead of one per start. $CHROMEDRIVER_PATH
+skips resolution entirely.
+
+start_driver() reports how long the process took to reach its first
+WebDriver command, split into resolve / session / first command.
+
+    python driver_resolver.py report   # detected version, cache, resolve time
+    python driver_resolver.py clear
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Callable, Dict, Optional
+
+from file_lock import FileLock, atomic_write_json
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chromedriver_cache.json")
+CHROME_CANDIDATES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+MAC_CHROME_PATH = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
+# Cache key for a driver resolved without a detected Chrome version, and how long to trust it
+UNKNOWN_KEY = "unknown"
+UNKNOWN_TTL = 24 * 3600.0
+_VERSION_RE = re.compile(r"(\d+)\.\d+\.\d+\.\d+")
+# Fallback launch reference when the process start time isn't available
+_IMPORTED_AT = time.time()
+
+# Timings of the last start_driver() call
+last_startup: Dict[str, Any] = {}
+
+
+def _version_from(text: Optional[str]) -> Optional[str]:
+    m = _VERSION_RE.search(text or "")
+    return m.group(0) if m else None
+
+
+def version_from_debugger(debugger_address: str, timeout: float = 2.0) -> Optional[str]:
+    """Version of the browser listening on ``debugger_address`` ("Browser": "Chrome/120.0.6099.109")."""
+    try:
+        with urllib.request.urlopen(f"http://{debugger_address}/json/version", timeout=timeout) as resp:
+            return _version_from(json.load(resp).get("Browser"))
+    except (OSError, ValueError):
+        return None
+
+
+def version_from_binary(binary: str) -> Optional[str]:
+    try:
+        out = subprocess.run([binary, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return _version_from(out)
+
+
+def version_from_registry() -> Optional[str]:
+    try:
+        import winreg
+    except ImportError:
+        return None
+    for hive in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+        try:
+            with winreg.OpenKey(hive, r"Software\Google\Chrome\BLBeacon") as key:
+                return _version_from(winreg.QueryValueEx(key, "version")[0])
+        except OSError:
+            continue
+    return None
+
+
+def chrome_version(debugger_address: Optional[str] = None) -> Optional[str]:
+    """Installed Chrome version (e.g. "120.0.6099.109"), found without network I/O; None if unknown."""
+    if debugger_address:
+        version = version_from_debugger(debugger_address)
+        if version:
+            return version
+    binaries = [os.getenv("CHROME_PATH"), MAC_CHROME_PATH, *map(shutil.which, CHROME_CANDIDATES)]
+    # chrome.exe --version prints nothing on Windows; the registry covers that case
+    if sys.platform != "win32":
+        for binary in filter(None, binaries):
+            if os.path.exists(binary):
+                version = version_from_binary(binary)
+                if version:
+                    return version
+    return version_from_registry()
+
+
+def load_cache(path: str = CACHE_PATH) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remember(major: str, version: Optional[str], driver_path: str, path: str = CACHE_PATH):
+    with FileLock(path):
+        cache = load_cache(path)
+        cache[major] = {"path": driver_path, "chrome_version": version, "resolved_at": time.time()}
+        atomic_write_json(path, cache, indent=2)
+
+
+def _download() -> str:
+    # Only this path talks to the network
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+
+def resolve_driver_path(debugger_address: Optional[str] = None, cache_path: str = CACHE_PATH) -> str:
+    """chromedriver path for the installed Chrome: cached if possible, downloaded (and cached) if not."""
+    override = os.getenv("CHROMEDRIVER_PATH")
+    if override:
+        return override
+    version = chrome_version(debugger_address)
+    cache = load_cache(cache_path)
+    major = version.split(".")[0] if version else UNKNOWN_KEY
+    entry = cache.get(major)
+    if entry and os.path.exists(entry.get("path", "")):
+        if version or time.time() - entry.get("resolved_at", 0) < UNKNOWN_TTL:
+            return entry["path"]
+    try:
+        driver_path = _download()
+    except Exception:
+        # Offline with an unknown Chrome version: the newest cached driver is the best guess
+        fallback = [e for e in cache.values() if os.path.exists(e.get("path", ""))]
+        if version or not fallback:
+            raise
+        return max(fallback, key=lambda e: e.get("resolved_at", 0))["path"]
+    _remember(major, version, driver_path, cache_path)
+    return driver_path
+
+
+def _process_started() -> float:
+    """Wall-clock start of this process (psutil if installed, else when this module was imported)."""
+    try:
+        import psutil
+        return psutil.Process().create_time()
+    except Exception:
+        return _IMPORTED_AT
+
+
+def start_driver(options, debugger_address: Optional[str] = None, log: Callable[[str], None] = print):
+    """webdriver.Chrome with a resolved chromedriver; logs launch-to-first-command timings."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    t0 = time.monotonic()
+    driver_path = resolve_driver_path(debugger_address)
+    t1 = time.monotonic()
+    driver = webdriver.Chrome(service=Service(driver_path), options=options)
+    t2 = time.monotonic()
+    driver.current_url
+    t3 = time.monotonic()
+    last_startup.update(resolve=t1 - t0, session=t2 - t1, first_command=t3 - t2,
+                        since_launch=time.time() - _process_started(), driver_path=driver_path)
+    log(f"Driver ready {last_startup['since_launch']:.2f}s after launch (resolve {t1 - t0:.2f}s, "
+        f"session {t2 - t1:.2f}s, first command {t3 - t2:.2f}s)")
+    return driver
+
+
+def report(debugger_address: Optional[str] = None):
+    t0 = time.monotonic()
+    version = chrome_version(debugger_address)
+    detect = time.monotonic() - t0
+    print(f"Chrome version: {version or 'unknown'} (detected in {detect:.2f}s)")
+    cache = load_cache()
+    if not cache:
+        print(f"No cached drivers ({CACHE_PATH})")
+    for major, entry in sorted(cache.items()):
+        present = "ok" if os.path.exists(entry.get("path", "")) else "missing"
+        print(f"   · Chrome {major:4s} {entry.get('chrome_version') or '':16s} {present:8s} {entry.get('path')}")
+    t0 = time.monotonic()
+    path = resolve_driver_path(debugger_address)
+    print(f"Resolved {path} in {time.monotonic() - t0:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cached chromedriver resolution")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="Show the detected Chrome version, cached drivers and resolve time")
+    rep.add_argument("--debugger-address", default=None)
+    sub.add_parser("clear", help="Forget cached driver paths")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(args.debugger_address)
+    elif args.command == "clear":
+        try:
+            os.remove(CACHE_PATH)
+        except FileNotFoundError:
+            pass
+        print(f"🧹 Cleared {CACHE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
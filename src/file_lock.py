@@ -0,0 +1,98 @@
+"""
+Advisory cross-process locking for the JSON files shared by agent.py and click.py.
+
+Usage:
+    with FileLock(path):
+        ...read-modify-write path...
+
+The lock lives in a sidecar ``<path>.lock`` file so the data file itself can
+still be replaced atomically. Hold it only around the read-merge-write, not a
+whole pass; callers pair it with ``file_version`` to detect writes made by
+other processes since they last loaded the file.
+"""
+import json
+import os
+import time
+from typing import Any, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class FileLock:
+    def __init__(self, path: str, timeout: float = 10.0, poll: float = 0.01):
+        self.lock_path = path + ".lock"
+        self.timeout = timeout
+        self.poll = poll
+        self._fd: Optional[int] = None
+        self._depth = 0
+
+    def acquire(self):
+        if self._depth:
+            self._depth += 1
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise LockTimeout(f"Timed out waiting for {self.lock_path}")
+                time.sleep(self.poll)
+        self._fd = fd
+        self._depth = 1
+
+    def release(self):
+        if not self._depth:
+            return
+        self._depth -= 1
+        if self._depth:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def file_version(path: str) -> Optional[Tuple[int, int, int]]:
+    """Cheap change stamp for optimistic checks: (mtime_ns, size, inode), None if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def atomic_write_json(path: str, data: Any, **dumps_kwargs):
+    """Write JSON to a temp file, fsync, then rename over ``path``."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(data, **dumps_kwargs))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
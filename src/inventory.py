@@ -0,0 +1,372 @@
+"""
+Shared inventory repository for output.json, used by agent.py and click.py.
+
+Field names are normalized once at load to the spreadsheet's column names
+(ID, Title, Description, Category, Price, Min_Price, Zip_Code, Photo_Paths,
+Status, Marketplace_URL, Notes), items are indexed by ID, and writes go
+through the cross-process lock so both bots can update statuses at once.
+
+Small edits from the xlsx importer are appended to ``output.json.journal``
+(one JSON line per changed or deleted item) instead of rewriting the whole
+file; loads replay it, and the next full save folds it back in.
+"""
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from file_lock import FileLock, file_version, atomic_write_json
+from item_index import TitleIndex, TrigramIndex, trigrams
+
+OUTPUT_JSON = "output.json"
+# Fuzzy title matches scoring below this are treated as "no match" rather
+# than risk moving the wrong item to IN_CONVO.
+MATCH_CONFIDENCE = 0.5
+# The overlap half of the score divides by the shorter side, so a one-word
+# query ("Books", "Used") covers itself inside many titles. Fuzzy matches
+# need a query of at least this many trigrams (about six letters)...
+MIN_MATCH_TRIGRAMS = 8
+# ...and a lead over the runner-up, so near-ties don't pick an arbitrary listing.
+MATCH_MARGIN = 0.05
+
+FIELDS = ("ID", "Title", "Description", "Category", "Price", "Min_Price", "Zip_Code",
+          "Photo_Paths", "Status", "Marketplace_URL", "Notes")
+_ALIASES = {f.lower(): f for f in FIELDS}
+_ALIASES.update({"id": "ID", "bottom": "Min_Price", "minprice": "Min_Price", "min": "Min_Price",
+                 "photos": "Photo_Paths", "photo_path": "Photo_Paths", "url": "Marketplace_URL",
+                 "zip": "Zip_Code", "zipcode": "Zip_Code"})
+
+Number = Union[int, float]
+
+
+def canonical_field(name: str) -> str:
+    """Canonical column name for a header/key, or the stripped name if unknown."""
+    name = str(name).strip()
+    return _ALIASES.get(name.lower().replace(" ", "_"), name)
+
+
+def normalize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Rename known keys in place to their canonical casing (status -> Status, id -> ID)."""
+    for key in list(item):
+        canon = canonical_field(key)
+        if canon != key:
+            value = item.pop(key)
+            item.setdefault(canon, value)
+    return item
+
+
+def _number(value) -> Optional[Number]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if float(value).is_integer() else value
+    m = re.search(r"-?\d+(?:\.\d+)?", str(value).replace(",", ""))
+    if not m:
+        return None
+    num = float(m.group(0))
+    return int(num) if num.is_integer() else num
+
+
+def get_price(item: Optional[Dict[str, Any]]) -> Optional[Number]:
+    return _number(item.get("Price")) if item else None
+
+
+def get_min_price(item: Optional[Dict[str, Any]]) -> Optional[Number]:
+    return _number(item.get("Min_Price")) if item else None
+
+
+def get_photo_paths(item: Optional[Dict[str, Any]]) -> List[str]:
+    value = item.get("Photo_Paths") if item else None
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = re.split(r"[;,\n|]", value)
+    return [str(p).strip() for p in value if str(p).strip()]
+
+
+def get_status(item: Optional[Dict[str, Any]]) -> str:
+    return str(item.get("Status") or "") if item else ""
+
+
+def journal_path(path: str) -> str:
+    return path + ".journal"
+
+
+def _replay_journal(items: List[Dict[str, Any]], lines: List[str]) -> List[Dict[str, Any]]:
+    """Apply journal records: {"id", "f": fields} merges fields into the item
+    (creating it if needed), {"id", "d": 1} deletes it. A record may carry
+    "s", a Status used only when the item has none yet."""
+    by_id = {item.get("ID"): item for item in items}
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue  # torn tail from a crashed writer
+        item_id = rec.get("id")
+        if rec.get("d"):
+            by_id.pop(item_id, None)
+            continue
+        item = by_id.get(item_id)
+        if item is None:
+            item = by_id[item_id] = {"ID": item_id}
+        item.update(normalize_item(rec.get("f") or {}))
+        if rec.get("s") and not item.get("Status"):
+            item["Status"] = rec["s"]
+    return list(by_id.values())
+
+
+def read_items(path: str):
+    """Parse output.json plus its journal; returns (items, version stamp).
+
+    Raises FileNotFoundError only when neither file exists.
+    """
+    items, base = [], None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            st = os.fstat(f.fileno())
+            items = [normalize_item(item) for item in json.load(f)]
+        base = (st.st_mtime_ns, st.st_size, st.st_ino)
+    except FileNotFoundError:
+        if not os.path.exists(journal_path(path)):
+            raise
+    journal = None
+    try:
+        with open(journal_path(path), "r", encoding="utf-8") as f:
+            st = os.fstat(f.fileno())
+            lines = f.read().splitlines()
+        journal = (st.st_mtime_ns, st.st_size, st.st_ino)
+        items = _replay_journal(items, lines)
+    except FileNotFoundError:
+        pass
+    return items, (base, journal)
+
+
+def inventory_version(path: str):
+    return (file_version(path), file_version(journal_path(path)))
+
+
+def append_item_changes(path: str, records: List[Dict[str, Any]]):
+    """Append journal records under the shared lock; cost is O(changed rows)."""
+    if not records:
+        return
+    data = "".join(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n" for rec in records)
+    with FileLock(path):
+        with open(journal_path(path), "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def compact_items(path: str) -> int:
+    """Fold the journal into output.json with one full rewrite. Returns the item count."""
+    with FileLock(path):
+        items, _ = read_items(path)
+        atomic_write_json(path, items, indent=4, ensure_ascii=False)
+        try:
+            os.remove(journal_path(path))
+        except FileNotFoundError:
+            pass
+    return len(items)
+
+
+class Inventory:
+    def __init__(self, output_path=OUTPUT_JSON):
+        # Relative paths are resolved next to this script
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.path = os.path.join(script_dir, output_path)
+        self._version = None
+        self._pending_status = {}  # item ID -> status not yet written
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self._reload_result = None
+        self.items = self.load()
+        self.by_id = {item.get("ID"): item for item in self.items}
+        # Built on the first title match; status reads/writes (click.py) never need them
+        self._index: Optional[TitleIndex] = None
+        self._fuzzy: Optional[TrigramIndex] = None
+
+    @property
+    def index(self) -> TitleIndex:
+        if self._index is None:
+            self._index = TitleIndex(self.items)
+        return self._index
+
+    @property
+    def fuzzy(self) -> TrigramIndex:
+        if self._fuzzy is None:
+            self._fuzzy = TrigramIndex(self.items)
+        return self._fuzzy
+
+    def _read(self):
+        """Parse output.json and its journal; returns (normalized items, version stamp)."""
+        try:
+            return read_items(self.path)
+        except FileNotFoundError:
+            print(f"⚠️ Warning: {self.path} not found. Starting with empty inventory.")
+            return [], None
+        except json.JSONDecodeError as e:
+            print(f"⚠️ Error parsing {self.path}: {e}")
+            return [], None
+
+    def load(self):
+        items, self._version = self._read()
+        return items
+
+    def get(self, item_id) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(item_id)
+
+    def sold_item_ids(self):
+        return {item_id for item_id, item in self.by_id.items() if get_status(item).lower() == "sold"}
+
+    def _diff(self, fresh):
+        """Compare a freshly parsed item list with ours.
+
+        Returns (merged, changed, removed_ids): ``merged`` keeps our existing
+        dict objects for unchanged rows so references held elsewhere stay live.
+        """
+        current = dict(self.by_id)
+        merged, changed = [], []
+        for item in fresh:
+            old = current.pop(item.get("ID"), None)
+            if old is not None and old == item:
+                merged.append(old)
+            else:
+                merged.append(item)
+                changed.append(item)
+        return merged, changed, list(current)
+
+    def _apply(self, merged, changed, removed, version):
+        indexes = [ix for ix in (self._index, self._fuzzy) if ix is not None]
+        for item_id in removed:
+            for ix in indexes:
+                ix.remove(item_id)
+            self.by_id.pop(item_id, None)
+        for item in changed:
+            for ix in indexes:
+                ix.update(item)
+            self.by_id[item.get("ID")] = item
+        self.items = merged
+        self._version = version
+
+    def refresh(self):
+        """Pick up output.json changes made by click.py or the importer without blocking.
+
+        A stat() decides whether the file changed; if so, parsing and diffing
+        run on a background thread and the result is swapped in on a later
+        call (between passes), re-indexing only the rows that changed.
+        Returns True when a reload was applied.
+        """
+        with self._reload_lock:
+            result, self._reload_result = self._reload_result, None
+        if result is not None:
+            base_version, version, merged, changed, removed = result
+            if base_version == self._version and not self._pending_status:
+                self._apply(merged, changed, removed, version)
+                print(f"🔄 Inventory reloaded: {len(changed)} changed, {len(removed)} removed")
+                return True
+            # We saved in the meantime; the diff is stale, so redo it.
+        if self._reload_thread is not None and self._reload_thread.is_alive():
+            return False
+        if inventory_version(self.path) == self._version:
+            return False
+        self._reload_thread = threading.Thread(target=self._reload_worker, args=(self._version,),
+                                               name="inventory-reload", daemon=True)
+        self._reload_thread.start()
+        return False
+
+    def sync(self) -> bool:
+        """Re-read output.json now if another process changed it (the blocking form of refresh).
+
+        For short-lived callers such as click.py that need current data on
+        the next line. Only changed rows are re-indexed. Returns True when a
+        reload was applied.
+        """
+        if self._pending_status or inventory_version(self.path) == self._version:
+            return False
+        fresh, version = self._read()
+        if version is None:
+            return False
+        self._apply(*self._diff(fresh), version)
+        return True
+
+    def _reload_worker(self, base_version):
+        try:
+            fresh, version = self._read()
+            if version is None:
+                return
+            merged, changed, removed = self._diff(fresh)
+            with self._reload_lock:
+                self._reload_result = (base_version, version, merged, changed, removed)
+        except Exception as e:
+            print(f"⚠️ Background inventory reload failed: {e}")
+
+    def set_status(self, item, status):
+        """Change an item's status in memory; written by the next save()."""
+        item["Status"] = status
+        item_id = item.get("ID")
+        if item_id is not None:
+            self._pending_status[item_id] = status
+        if self._index is not None:
+            self._index.update(item)
+
+    def update_statuses(self, statuses: Dict[Any, str]) -> List[Any]:
+        """Set several item statuses and write them in one save. Returns IDs not found."""
+        missing = []
+        for item_id, status in statuses.items():
+            item = self.by_id.get(item_id)
+            if item is None:
+                missing.append(item_id)
+                continue
+            self.set_status(item, status)
+        if len(missing) < len(statuses):
+            self.save()
+        return missing
+
+    def save(self):
+        # The other bot may have rewritten the file since we loaded it; merge
+        # our status changes into the current contents instead of clobbering them.
+        with FileLock(self.path):
+            if inventory_version(self.path) != self._version:
+                fresh, version = self._read()
+                for item in fresh:
+                    status = self._pending_status.get(item.get("ID"))
+                    if status is not None:
+                        item["Status"] = status
+                self._apply(*self._diff(fresh), version)
+            atomic_write_json(self.path, self.items, indent=4, ensure_ascii=False)
+            try:
+                os.remove(journal_path(self.path))
+            except FileNotFoundError:
+                pass
+            self._version = inventory_version(self.path)
+        self._pending_status.clear()
+
+    def match_items(self, text, k=5):
+        """Top-k (item, similarity 0..1) candidates by fuzzy title match."""
+        if not text:
+            return []
+        return self.fuzzy.search(text, k)
+
+    def get_item_by_title(self, message_text, min_confidence=MATCH_CONFIDENCE):
+        """Best matching item for a header title or buyer message, or None if unsure.
+
+        Fuzzy trigram similarity handles clipped/misspelled titles, if the text
+        is long enough and the best item clearly beats the runner-up; failing
+        that, a title word in the message counts only if it singles out one item.
+        """
+        if not message_text:
+            return None
+        fuzzy = self.match_items(message_text, k=2)
+        if (fuzzy and fuzzy[0][1] >= min_confidence and len(trigrams(message_text)) >= MIN_MATCH_TRIGRAMS
+                and (len(fuzzy) == 1 or fuzzy[0][1] - fuzzy[1][1] >= MATCH_MARGIN)):
+            return fuzzy[0][0]
+        hits = self.index.search(message_text, k=2)
+        if hits and (len(hits) == 1 or hits[0][1] > hits[1][1]):
+            return hits[0][0]
+        if fuzzy or hits:
+            best = fuzzy[0] if fuzzy else hits[0]
+            print(f"🤷 Low-confidence match ignored: '{(best[0].get('Title') or '')[:60]}' ({best[1]:.2f})")
+        return None
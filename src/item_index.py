@@ -0,0 +1,204 @@
+"""
+In-memory indexes for matching buyer text to inventory items.
+
+TitleIndex maps normalized title tokens to item IDs so a lookup costs
+O(tokens in the message) instead of a scan over every item's title.
+
+TrigramIndex does fuzzy matching on character trigrams, for the truncated
+("Hudsons Bay 6-Point Wool…") or misspelled titles Marketplace shows in
+conversation headers, and returns scored candidates so callers can reject
+low-confidence matches.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+MIN_TOKEN_LEN = 4  # same cut-off as the old "len(w) > 3" rule
+
+
+def _item_id(item: Dict[str, Any]):
+    item_id = item.get("ID")
+    return item_id if item_id is not None else item.get("id")
+
+
+def _item_status(item: Dict[str, Any]) -> str:
+    return (item.get("Status") or item.get("status") or "").lower()
+
+
+def normalize_token(token: str) -> str:
+    # Fold simple plurals so "blankets" finds "Blanket"
+    if len(token) > MIN_TOKEN_LEN and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [normalize_token(t) for t in _TOKEN_RE.findall((text or "").lower()) if len(t) >= MIN_TOKEN_LEN]
+
+
+class TitleIndex:
+    """Inverted index from title tokens to item IDs, scored by IDF."""
+
+    def __init__(self, items: Iterable[Dict[str, Any]] = ()):
+        self.postings: Dict[str, Set[Any]] = defaultdict(set)
+        self.tokens_by_id: Dict[Any, Set[str]] = {}
+        self.items_by_id: Dict[Any, Dict[str, Any]] = {}
+        self.order: Dict[Any, int] = {}
+        for item in items:
+            self.add(item)
+
+    def __len__(self) -> int:
+        return len(self.items_by_id)
+
+    def add(self, item: Dict[str, Any]):
+        item_id = _item_id(item)
+        if item_id is None:
+            return
+        if item_id in self.items_by_id:
+            self.remove(item_id)
+        tokens = set(tokenize(item.get("Title") or item.get("title") or ""))
+        self.items_by_id[item_id] = item
+        self.tokens_by_id[item_id] = tokens
+        self.order.setdefault(item_id, len(self.order))
+        for tok in tokens:
+            self.postings[tok].add(item_id)
+
+    def remove(self, item_id):
+        for tok in self.tokens_by_id.pop(item_id, ()):
+            ids = self.postings.get(tok)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self.postings[tok]
+        self.items_by_id.pop(item_id, None)
+
+    def update(self, item: Dict[str, Any]):
+        """Re-index one item after its title or status changed."""
+        self.add(item)
+
+    def _idf(self, token: str) -> float:
+        return math.log(1 + len(self.items_by_id) / len(self.postings[token]))
+
+    def search(self, text: str, k: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+        """Top ``k`` items by summed IDF of title tokens found in ``text``."""
+        scores: Dict[Any, float] = defaultdict(float)
+        for tok in set(tokenize(text)):
+            ids = self.postings.get(tok)
+            if not ids:
+                continue
+            weight = self._idf(tok)
+            for item_id in ids:
+                scores[item_id] += weight
+        if not scores:
+            return []
+        # Coverage of the title breaks ties between items sharing a common word;
+        # prefer items that aren't sold, then inventory order.
+        ranked = heapq.nsmallest(
+            k,
+            scores.items(),
+            key=lambda kv: (
+                -kv[1],
+                -(kv[1] / max(1, len(self.tokens_by_id[kv[0]]))),
+                _item_status(self.items_by_id[kv[0]]) == "sold",
+                self.order[kv[0]],
+            ),
+        )
+        return [(self.items_by_id[item_id], score) for item_id, score in ranked]
+
+    def best(self, text: str) -> Optional[Dict[str, Any]]:
+        hits = self.search(text, k=1)
+        return hits[0][0] if hits else None
+
+
+def trigrams(text: str) -> Set[str]:
+    norm = _NON_ALNUM_RE.sub(" ", (text or "").lower()).strip()
+    if not norm:
+        return set()
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Character-trigram index over item titles.
+
+    Candidates come from the query's rarer trigrams only, then each candidate
+    is scored exactly. The score mixes the overlap coefficient (how much of
+    the shorter string is covered, so a clipped header still scores high)
+    with the Dice coefficient (penalizes length mismatch), in [0, 1].
+    Because of the overlap term a very short query scores high against any
+    title containing it, so callers deciding on a single item should also
+    check query length and the margin over the runner-up.
+    """
+
+    def __init__(self, items: Iterable[Dict[str, Any]] = (), max_candidates: int = 64,
+                 max_postings: int = 2500):
+        self.postings: Dict[str, Set[Any]] = defaultdict(set)
+        self.grams_by_id: Dict[Any, Set[str]] = {}
+        self.items_by_id: Dict[Any, Dict[str, Any]] = {}
+        self.max_candidates = max_candidates
+        self.max_postings = max_postings
+        for item in items:
+            self.add(item)
+
+    def __len__(self) -> int:
+        return len(self.items_by_id)
+
+    def add(self, item: Dict[str, Any]):
+        item_id = _item_id(item)
+        if item_id is None:
+            return
+        if item_id in self.items_by_id:
+            self.remove(item_id)
+        grams = trigrams(item.get("Title") or item.get("title") or "")
+        self.items_by_id[item_id] = item
+        self.grams_by_id[item_id] = grams
+        for g in grams:
+            self.postings[g].add(item_id)
+
+    def remove(self, item_id):
+        for g in self.grams_by_id.pop(item_id, ()):
+            ids = self.postings.get(g)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self.postings[g]
+        self.items_by_id.pop(item_id, None)
+
+    def update(self, item: Dict[str, Any]):
+        self.add(item)
+
+    def search(self, text: str, k: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+        query = trigrams(text)
+        if not query or not self.items_by_id:
+            return []
+        present = sorted((g for g in query if g in self.postings), key=lambda g: len(self.postings[g]))
+        if not present:
+            return []
+        # Count hits over the rarest trigrams only, stopping once enough
+        # postings have been read; trigrams like " th" that hit half the
+        # inventory cost the most and add the least signal.
+        counts: Counter = Counter()
+        read = 0
+        for n, g in enumerate(present):
+            ids = self.postings[g]
+            if n >= 3 and read + len(ids) > self.max_postings:
+                break
+            read += len(ids)
+            counts.update(ids)  # counted in C
+        # A C sort of the counts beats heapq's Python loop at these sizes
+        shortlist = sorted(counts, key=counts.__getitem__, reverse=True)[:self.max_candidates]
+        scored = []
+        for item_id in shortlist:
+            grams = self.grams_by_id[item_id]
+            shared = len(query & grams)
+            if not shared:
+                continue
+            overlap = shared / min(len(query), len(grams))
+            dice = 2 * shared / (len(query) + len(grams))
+            scored.append((0.7 * overlap + 0.3 * dice, item_id))
+        best = heapq.nlargest(k, scored)
+        return [(self.items_by_id[item_id], round(score, 4)) for score, item_id in best]
@@ -0,0 +1,323 @@
+"""
+Read thread data from Messenger's own network responses instead of the DOM.
+
+The web app loads threads and messages through GraphQL XHRs. With capture
+on, the CDP session subscribes to Network.responseReceived /
+Network.loadingFinished, pulls matching bodies with Network.getResponseBody
+and parses them into thread records: thread id, participants, listing title
+and messages with their sender. ``transcript(thread_id)`` returns the same
+Transcript the DOM path builds, with authorship taken from sender ids
+rather than bubble alignment.
+
+Capture needs the CDP websocket (see cdp.py); when it isn't available the
+agent keeps reading the DOM. Parsing is plain Python and checked offline
+against the payloads in fixtures/network:
+
+    python network_capture.py check
+    python network_capture.py parse fixtures/network/thread_messages.txt
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from cdp import CDPError
+from transcript import BUYER, SELLER, UNKNOWN, Message, Transcript
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "network")
+URL_MARKERS = ("/api/graphql", "/graphqlbatch")
+LISTING_TITLE_KEYS = ("marketplace_listing_title", "listing_title")
+_JSON_PREFIX = "for (;;);"
+
+
+def iter_documents(body: str) -> Iterator[Any]:
+    """JSON documents in a response body.
+
+    Bodies may carry the ``for (;;);`` guard and batched/deferred queries
+    come back as one JSON document per line.
+    """
+    body = body.strip()
+    if body.startswith(_JSON_PREFIX):
+        body = body[len(_JSON_PREFIX):]
+    try:
+        yield json.loads(body)
+        return
+    except json.JSONDecodeError:
+        pass
+    for line in body.splitlines():
+        line = line.strip()
+        if line.startswith(_JSON_PREFIX):
+            line = line[len(_JSON_PREFIX):]
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+def _walk(obj: Any, skip: Tuple[str, ...] = ()) -> Iterator[Dict[str, Any]]:
+    if isinstance(obj, dict):
+        yield obj
+        for key, value in obj.items():
+            if key not in skip:
+                yield from _walk(value, skip)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from _walk(value, skip)
+
+
+def _nodes(connection: Any) -> List[Dict[str, Any]]:
+    """Items of a GraphQL connection ({nodes: [...]} or {edges: [{node}]}), or of a plain list."""
+    if isinstance(connection, list):
+        return [n for n in connection if isinstance(n, dict)]
+    if not isinstance(connection, dict):
+        return []
+    if isinstance(connection.get("nodes"), list):
+        return [n for n in connection["nodes"] if isinstance(n, dict)]
+    return [e["node"] for e in connection.get("edges") or [] if isinstance(e, dict) and isinstance(e.get("node"), dict)]
+
+
+def _actor(node: Any) -> Dict[str, Any]:
+    if not isinstance(node, dict):
+        return {}
+    return node.get("messaging_actor") or node
+
+
+def _thread_id(thread: Dict[str, Any]) -> Optional[str]:
+    key = thread.get("thread_key")
+    if isinstance(key, dict):
+        tid = key.get("thread_fbid") or key.get("other_user_id")
+        return str(tid) if tid else None
+    return None
+
+
+def _timestamp(value: Any) -> Tuple[int, Optional[str]]:
+    try:
+        ms = int(value)
+    except (TypeError, ValueError):
+        return 0, None
+    return ms, datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat()
+
+
+def _message(node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if "Admin" in (node.get("__typename") or ""):
+        return None  # "X marked the listing as pending" and similar
+    body = node.get("message")
+    text = body.get("text") if isinstance(body, dict) else None
+    text = (text or node.get("snippet") or "").strip()
+    sender = _actor(node.get("message_sender")).get("id")
+    if not text or not sender:
+        return None
+    ms, iso = _timestamp(node.get("timestamp_precise") or node.get("timestamp"))
+    return {"id": node.get("message_id") or f"{sender}:{ms}", "sender": str(sender), "text": text,
+            "ms": ms, "timestamp": iso}
+
+
+def parse_payload(body: str) -> Dict[str, Any]:
+    """Threads found in one response body.
+
+    Returns {"viewer_id": str or None, "threads": {thread_id: {"participants":
+    {id: name}, "listing_title": str or None, "messages": [message dicts]}}}.
+    """
+    viewer_id = None
+    threads: Dict[str, Dict[str, Any]] = {}
+    for doc in iter_documents(body):
+        for obj in _walk(doc):
+            viewer = obj.get("viewer")
+            if viewer_id is None and isinstance(viewer, dict):
+                actor_id = (viewer.get("actor") or {}).get("id")
+                viewer_id = str(actor_id) if actor_id else None
+            tid = _thread_id(obj)
+            if tid is None:
+                continue
+            thread = threads.setdefault(tid, {"participants": {}, "listing_title": None, "messages": []})
+            for node in _nodes(obj.get("all_participants")):
+                actor = _actor(node)
+                if actor.get("id"):
+                    thread["participants"][str(actor["id"])] = actor.get("name")
+            if thread["listing_title"] is None:
+                for sub in _walk(obj, skip=("messages", "last_message")):
+                    title = next((sub[k] for k in LISTING_TITLE_KEYS if isinstance(sub.get(k), str)), None)
+                    if title:
+                        thread["listing_title"] = title.strip()
+                        break
+            for key in ("messages", "last_message"):
+                for node in _nodes(obj.get(key)):
+                    msg = _message(node)
+                    if msg:
+                        thread["messages"].append(msg)
+    return {"viewer_id": viewer_id, "threads": threads}
+
+
+class NetworkCapture:
+    """Thread records built from captured responses, merged across passes.
+
+    ``session`` is a CDPSession (None to only ``ingest`` bodies offline).
+    ``self_id`` is our own Facebook user id; it decides which messages are
+    the seller's. If not given it's taken from the ``c_user`` cookie or the
+    viewer id of a captured payload.
+    """
+
+    def __init__(self, session=None, self_id: Optional[str] = None):
+        self.session = session
+        self.self_id = self_id
+        self.threads: Dict[str, Dict[str, Any]] = {}
+        self.updated: Dict[str, float] = {}  # thread id -> monotonic time of the last ingested response
+        self._pending: Dict[str, str] = {}  # requestId -> url, waiting for loadingFinished
+        self.started = False
+
+    def start(self) -> bool:
+        """Enable Network events; False when capture isn't possible (no CDP websocket)."""
+        if self.session is None or not self.session.direct:
+            return False
+        try:
+            self.session.subscribe("Network.responseReceived", "Network.loadingFinished")
+            self.session.keep_enabled("Network.enable")
+        except CDPError as e:
+            print(f"⚠️ Network capture unavailable: {e}")
+            return False
+        if self.self_id is None and self.session.driver is not None:
+            try:
+                cookie = self.session.driver.get_cookie("c_user")
+                self.self_id = cookie["value"] if cookie else None
+            except Exception:
+                pass
+        self.started = True
+        return True
+
+    def poll(self, wait: float = 0.0) -> int:
+        """Fetch and parse bodies of GraphQL responses finished since the last poll; returns how many."""
+        if not self.started:
+            return 0
+        try:
+            events = self.session.events(wait)
+        except CDPError as e:
+            print(f"⚠️ Network capture stopped: {e}")
+            self.started = False
+            return 0
+        if not self.session.direct:
+            # Reconnected through chromedriver, which delivers no events
+            print("⚠️ Network capture stopped: CDP websocket lost")
+            self.started = False
+            return 0
+        parsed = 0
+        for event in events:
+            params = event.get("params", {})
+            request_id = params.get("requestId")
+            if event["method"] == "Network.responseReceived":
+                url = (params.get("response") or {}).get("url", "")
+                if any(marker in url for marker in URL_MARKERS):
+                    self._pending[request_id] = url
+            elif event["method"] == "Network.loadingFinished" and request_id in self._pending:
+                del self._pending[request_id]
+                try:
+                    result = self.session.send("Network.getResponseBody", {"requestId": request_id})
+                except CDPError:
+                    continue  # evicted from Chrome's buffer, or a redirect
+                body = result.get("body", "")
+                if result.get("base64Encoded"):
+                    body = base64.b64decode(body).decode("utf-8", "replace")
+                parsed += bool(self.ingest(body))
+        return parsed
+
+    def ingest(self, body: str) -> int:
+        """Merge one response body; returns the number of threads it touched."""
+        payload = parse_payload(body)
+        if self.self_id is None:
+            self.self_id = payload["viewer_id"]
+        for tid, data in payload["threads"].items():
+            thread = self.threads.setdefault(tid, {"participants": {}, "listing_title": None, "messages": {}})
+            thread["participants"].update({k: v for k, v in data["participants"].items() if v})
+            thread["listing_title"] = data["listing_title"] or thread["listing_title"]
+            for msg in data["messages"]:
+                thread["messages"][msg["id"]] = msg
+            self.updated[tid] = time.monotonic()
+        return len(payload["threads"])
+
+    def updated_since(self, thread_id: Optional[str], since: float) -> bool:
+        """True if a response for the thread was ingested at or after monotonic time ``since``."""
+        return bool(thread_id) and self.updated.get(str(thread_id), -1.0) >= since
+
+    def _side(self, sender: str) -> str:
+        if not self.self_id:
+            return UNKNOWN
+        return SELLER if sender == self.self_id else BUYER
+
+    def transcript(self, thread_id: Optional[str]) -> Transcript:
+        """Captured messages of a thread, oldest first (empty if nothing was captured)."""
+        thread = self.threads.get(str(thread_id)) if thread_id else None
+        if not thread:
+            return Transcript()
+        ordered = sorted(thread["messages"].values(), key=lambda m: m["ms"])
+        return Transcript(Message(self._side(m["sender"]), m["text"], i, m["timestamp"])
+                          for i, m in enumerate(ordered))
+
+    def thread_info(self, thread_id: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """(buyer name, listing title) for a thread, None where unknown."""
+        thread = self.threads.get(str(thread_id)) if thread_id else None
+        if not thread:
+            return None, None
+        buyer = next((name for pid, name in thread["participants"].items() if pid != self.self_id and name), None)
+        return buyer, thread["listing_title"]
+
+
+def _load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def check() -> bool:
+    """Parse the recorded fixtures and compare with the expected threads."""
+    capture = NetworkCapture()
+    failures = []
+
+    def expect(label, actual, wanted):
+        if actual != wanted:
+            failures.append(f"{label}: expected {wanted!r}, got {actual!r}")
+
+    expect("unrelated payload threads", capture.ingest(_load_fixture("unrelated.txt")), 0)
+    expect("thread list threads", capture.ingest(_load_fixture("thread_list.txt")), 2)
+    expect("viewer id", capture.self_id, "100001111")
+    expect("listing thread info", capture.thread_info("6123456789012345"), ("Antonio Ruiz", "Vintage Oak Dresser"))
+    expect("1:1 thread info", capture.thread_info("100008888"), ("Dana K", None))
+    expect("1:1 last message side", capture.transcript("100008888").last().side, SELLER)
+
+    expect("thread query threads", capture.ingest(_load_fixture("thread_messages.txt")), 1)
+    transcript = capture.transcript("6123456789012345")
+    expect("messages (snippet merged, admin text skipped)", [(m.side, m.text) for m in transcript], [
+        (BUYER, "Is this still available?"),
+        (SELLER, "Yes it is! Do you want to come see it?"),
+        (BUYER, "Would you take $80?"),
+    ])
+    expect("last buyer message", transcript.last_buyer_message(), "Would you take $80?")
+    expect("timestamp", transcript.last().timestamp, "2025-10-09T12:02:00+00:00")
+    expect("unknown thread", len(capture.transcript("42")), 0)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Network payload parsing matches the fixtures")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Messenger network payload tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("check", help="Verify parsing against fixtures/network")
+    dump = sub.add_parser("parse", help="Print the threads parsed from a saved response body")
+    dump.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        sys.exit(0 if check() else 1)
+    with open(args.path, "r", encoding="utf-8") as f:
+        print(json.dumps(parse_payload(f.read()), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
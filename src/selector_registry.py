@@ -0,0 +1,170 @@
+"""
+Self-ordering selector lists.
+
+Hot paths try a list of fallback selectors until one matches, most
+precise first. The registry records each selector's hits, tries and lookup
+time per group. The declared order is kept: callers take the first match,
+and a broad fallback that matched once (say during a slow render) must not
+shadow the precise selector from then on. What the stats change is that
+selectors which have stopped matching altogether (a DOM change) move to the
+end, so the usual case doesn't pay for their lookup. Every REPROBE_EVERY-th
+lookup per group tries them in their place again, so one that comes back
+is picked up.
+
+Counts decay (DECAY per try) so a layout change is picked up within a few
+passes. Stats persist in selector_stats.json and are shared by agent.py and
+click.py.
+
+    python selector_registry.py report
+"""
+import argparse
+import atexit
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from file_lock import FileLock, atomic_write_json
+
+STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "selector_stats.json")
+DECAY = 0.97
+FLUSH_INTERVAL = 30.0
+# A selector is dead after DEAD_TRIES tries with a smoothed hit rate below DEAD_SCORE
+DEAD_TRIES = 8
+DEAD_SCORE = 0.1
+REPROBE_EVERY = 20
+
+Selector = Union[str, Tuple[str, str]]
+
+
+def _key(selector: Selector) -> str:
+    return selector if isinstance(selector, str) else selector[1]
+
+
+def _score(entry: Optional[Dict[str, float]]) -> float:
+    # Laplace-smoothed hit rate: unseen selectors sit at 0.5, between
+    # proven winners and proven misses
+    if not entry:
+        return 0.5
+    return (entry["hits"] + 1) / (entry["tries"] + 2)
+
+
+def _dead(entry: Optional[Dict[str, float]]) -> bool:
+    return bool(entry) and entry["tries"] >= DEAD_TRIES and _score(entry) < DEAD_SCORE
+
+
+class SelectorRegistry:
+    def __init__(self, path: str = STATS_PATH):
+        self.path = path
+        self.groups: Dict[str, Dict[str, Dict[str, float]]] = self._read()
+        self._pending: Dict[Tuple[str, str], List[Tuple[bool, float]]] = {}
+        self._last_flush = time.monotonic()
+        self._lookups: Dict[str, int] = {}
+        atexit.register(self.flush)
+
+    def _read(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def _apply(entry: Dict[str, float], hit: bool, seconds: float):
+        entry["hits"] = entry["hits"] * DECAY + hit
+        entry["tries"] = entry["tries"] * DECAY + 1
+        entry["ms"] = round(entry["ms"] * 0.8 + seconds * 1000 * 0.2, 2) if entry["tries"] > 1 else round(seconds * 1000, 2)
+
+    def order(self, group: str, selectors: Sequence[Selector]) -> List[Selector]:
+        """``selectors`` in the given order, with dead ones moved to the end (except on re-probes)."""
+        self._lookups[group] = self._lookups.get(group, 0) + 1
+        if self._lookups[group] % REPROBE_EVERY == 0:
+            return list(selectors)
+        stats = self.groups.get(group, {})
+        live = [sel for sel in selectors if not _dead(stats.get(_key(sel)))]
+        return live + [sel for sel in selectors if _dead(stats.get(_key(sel)))]
+
+    def record(self, group: str, selector: Selector, hit: bool, seconds: float = 0.0):
+        key = _key(selector)
+        entry = self.groups.setdefault(group, {}).setdefault(key, {"hits": 0.0, "tries": 0.0, "ms": 0.0})
+        self._apply(entry, bool(hit), seconds)
+        self._pending.setdefault((group, key), []).append((bool(hit), seconds))
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def find(self, driver, group: str, selectors: Sequence[Selector], by: Optional[str] = None,
+             validate: Optional[Callable[[List[Any]], Any]] = None, root=None):
+        """Try selectors in order (dead ones last) with find_elements; return the first non-empty result.
+
+        ``selectors`` are strings (with ``by``) or (by, selector) tuples.
+        ``validate`` maps the found elements to the result (None/empty = miss);
+        by default the first element is returned. ``root`` scopes the lookup.
+        """
+        scope = root if root is not None else driver
+        for sel in self.order(group, selectors):
+            sel_by, sel_str = (by, sel) if isinstance(sel, str) else sel
+            t0 = time.perf_counter()
+            try:
+                elements = scope.find_elements(sel_by, sel_str)
+                result = validate(elements) if validate else (elements[0] if elements else None)
+            except Exception:
+                result = None
+            self.record(group, sel, bool(result), time.perf_counter() - t0)
+            if result:
+                return result
+        return None
+
+    def flush(self):
+        """Merge pending outcomes into the stats file under its lock."""
+        if not self._pending:
+            return
+        try:
+            with FileLock(self.path):
+                merged = self._read()
+                for (group, key), outcomes in self._pending.items():
+                    entry = merged.setdefault(group, {}).setdefault(key, {"hits": 0.0, "tries": 0.0, "ms": 0.0})
+                    for hit, seconds in outcomes:
+                        self._apply(entry, hit, seconds)
+                atomic_write_json(self.path, merged, indent=1)
+            self.groups = merged
+            self._pending = {}
+        except Exception as e:
+            print(f"⚠️ Failed to save selector stats: {e}")
+        self._last_flush = time.monotonic()
+
+
+_registry: Optional[SelectorRegistry] = None
+
+
+def selector_registry() -> SelectorRegistry:
+    global _registry
+    if _registry is None:
+        _registry = SelectorRegistry()
+    return _registry
+
+
+def report(path: str = STATS_PATH):
+    reg = SelectorRegistry(path)
+    if not reg.groups:
+        print(f"No selector stats recorded yet ({path})")
+        return
+    for group in sorted(reg.groups):
+        stats = reg.groups[group]
+        print(f"\n{group}")
+        for sel in sorted(stats, key=lambda k: -_score(stats[k])):
+            e = stats[sel]
+            print(f"  {'dead' if _dead(e) else '    '} {_score(e):5.2f}  hits={e['hits']:6.1f}/{e['tries']:6.1f}  {e['ms']:7.1f} ms  {sel[:90]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Selector registry tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="Show selectors per group by hit rate")
+    rep.add_argument("--path", default=STATS_PATH)
+    args = parser.parse_args()
+    if args.command == "report":
+        report(args.path)
+
+
+if __name__ == "__main__":
+    main()
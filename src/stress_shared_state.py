@@ -0,0 +1,129 @@
+"""
+Multi-process stress check for the shared JSON files.
+
+Several processes update buyer_state and output.json at the same time, the
+way agent.py and click.py do in production, then the final files are checked
+for lost updates. Runs against copies in a temp directory.
+
+Usage: python stress_shared_state.py [--procs 6] [--updates 40]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from buyer_state import open_buyer_state
+
+
+def state_worker(backend, path, worker, updates, write_behind=False):
+    store = open_buyer_state(backend, path=path, write_behind=write_behind)
+    for i in range(updates):
+        tid = f"w{worker}-{i}"
+        store.set_buyer_name(tid, f"Buyer {worker}")
+        store.set_item_id(tid, i)
+        # Write-behind stores flush in batches, like agent.py passes, while
+        # the other workers keep writing
+        if write_behind and i % 10 == 9:
+            store.flush()
+    # Workers also touch one shared thread: even ones its buyer name, odd ones
+    # its item id. Field-level merging must keep both.
+    if worker % 2:
+        store.set_item_id("shared", 1000 + worker)
+    else:
+        store.set_buyer_name("shared", f"Shared {worker}")
+    store.flush()
+
+
+def inventory_worker(json_path, worker, item_ids):
+    from inventory import Inventory
+    from click import update_item_status
+
+    inventory = Inventory(json_path)
+    for n, item_id in enumerate(item_ids):
+        status = f"W{worker}-{n}"
+        if n % 2:
+            update_item_status(item_id, status, json_path=json_path)
+        else:
+            inventory.set_status(inventory.get(item_id), status)
+            inventory.save()
+
+
+def run(target, args_list):
+    procs = [multiprocessing.Process(target=target, args=args) for args in args_list]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    return all(p.exitcode == 0 for p in procs)
+
+
+def check_state(backend, workdir, procs, updates, write_behind=False):
+    mode = "wb" if write_behind else "wt"
+    path = os.path.join(workdir, f"state_{backend}_{mode}.{'db' if backend == 'sqlite' else 'json'}")
+    holder = None
+    if write_behind:
+        # A write-behind store with unflushed changes (an agent mid-pass) must
+        # not block the workers
+        holder = open_buyer_state(backend, path=path, write_behind=True)
+        holder.set_buyer_name("holder", "Holder")
+    ok = run(state_worker, [(backend, path, w, updates, write_behind) for w in range(procs)])
+    if holder is not None:
+        holder.flush()
+    store = open_buyer_state(backend, path=path)
+    missing = [f"w{w}-{i}" for w in range(procs) for i in range(updates)
+               if store.get_item_id(f"w{w}-{i}") != i]
+    shared = store.state.get("shared") or {}
+    if procs > 1 and (shared.get("buyer_name") is None or shared.get("item_id") is None):
+        missing.append("shared")
+    if holder is not None and store.state.get("holder") is None:
+        missing.append("holder")
+    print(f"{backend + '/' + mode:11s} workers_ok={ok}  expected={procs * updates + procs + (holder is not None)}  lost={len(missing)}")
+    return ok and not missing
+
+
+def check_inventory(workdir, procs, updates):
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output.json")
+    json_path = os.path.join(workdir, "output.json")
+    shutil.copy(src, json_path)
+    with open(json_path, "r", encoding="utf-8") as f:
+        ids = [item["ID"] for item in json.load(f)]
+    # Each worker owns a disjoint slice of item IDs and walks its statuses
+    slices = [ids[w::procs][:updates] for w in range(procs)]
+    ok = run(inventory_worker, [(json_path, w, slices[w]) for w in range(procs)])
+    with open(json_path, "r", encoding="utf-8") as f:
+        final = {item["ID"]: item.get("Status") for item in json.load(f)}
+    lost = [item_id for w, ids_w in enumerate(slices) for n, item_id in enumerate(ids_w)
+            if final.get(item_id) != f"W{w}-{n}"]
+    print(f"{'output':11s} workers_ok={ok}  items={sum(map(len, slices))}  lost={len(lost)}")
+    return ok and not lost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--procs", type=int, default=6)
+    parser.add_argument("--updates", type=int, default=40)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="stress_state_")
+    try:
+        results = [check_state(b, workdir, args.procs, args.updates, wb)
+                   for wb in (False, True) for b in ("json", "journal", "sqlite")]
+        try:
+            import agent, click  # noqa: F401  (need selenium installed)
+        except ImportError as e:
+            print(f"output      skipped ({e})")
+        else:
+            results.append(check_inventory(workdir, args.procs, args.updates))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print("✅ No lost updates" if all(results) else "❌ Lost updates detected")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
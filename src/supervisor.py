@@ -0,0 +1,272 @@
+"""
+Run one agent per seller account from a single command.
+
+Each account is a Chrome instance with its own profile and remote debugging
+port. The supervisor starts Chrome for each account when it has a
+``profile`` and isn't running yet, then starts a worker process for it:
+
+    python agent.py --debugger-address <address> --account <name> [args]
+
+Workers keep their buyer state in their own partition
+(buyer_state.<name>.json) and share output.json, whose writes are already
+merged under a file lock. A worker is stopped by creating its stop file
+(agent.py --stop-file): the agent flushes buyer state and exits after its
+current pass. Only if it doesn't exit in time is it terminated, which on
+Windows runs no handlers, so workers also flush every
+--state-flush-interval seconds (DEFAULT_FLUSH_INTERVAL unless given). Every --check-interval seconds the supervisor
+checks each worker. It restarts the worker, with backoff, if the process
+exited, its browser stopped answering on /json/version (the browser is
+relaunched when we own its profile), or it printed nothing for
+--stall-timeout seconds.
+
+    python supervisor.py --config accounts.json -- --watch --tabs 2
+
+accounts.json is a list of {"name", "debugger_address", "profile"
+(optional), "args" (optional extra agent arguments)}; see
+accounts.example.json.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+AGENT = os.path.join(SCRIPT_DIR, "agent.py")
+DEFAULT_CONFIG = os.path.join(SCRIPT_DIR, "accounts.json")
+DEFAULT_CHROME = os.getenv("CHROME_PATH", r"C:\Program Files\Google\Chrome\Application\chrome.exe")
+BROWSER_START_TIMEOUT = 30.0
+MAX_BACKOFF = 300.0
+# A worker that stayed up this long counts as healthy again for backoff purposes
+STABLE_AFTER = 600.0
+# How long a worker gets to finish its pass and exit after its stop file appears
+GRACEFUL_STOP_TIMEOUT = 60.0
+DEFAULT_FLUSH_INTERVAL = "30"
+
+
+def browser_alive(debugger_address: str, timeout: float = 3.0) -> bool:
+    try:
+        with urllib.request.urlopen(f"http://{debugger_address}/json/version", timeout=timeout) as resp:
+            return resp.status == 200
+    except OSError:
+        return False
+
+
+class Worker:
+    """One seller account: its browser (if we manage it) and its agent process."""
+
+    def __init__(self, account: Dict[str, Any], chrome_path: str, agent_args: List[str], stall_timeout: float):
+        self.name = account["name"]
+        self.debugger_address = account["debugger_address"]
+        self.profile = account.get("profile")
+        self.args = list(account.get("args", [])) + list(agent_args)
+        if "--state-flush-interval" not in self.args:
+            self.args += ["--state-flush-interval", DEFAULT_FLUSH_INTERVAL]
+        self.stop_file = os.path.join(tempfile.gettempdir(), f"marketplace-agent-{self.name}.stop")
+        self.chrome_path = chrome_path
+        self.stall_timeout = stall_timeout
+        self.proc: Optional[subprocess.Popen] = None
+        self.browser: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.last_output = 0.0
+        self.failures = 0
+        self.browser_misses = 0
+        self.next_start = 0.0
+
+    def start_browser(self) -> bool:
+        if browser_alive(self.debugger_address):
+            return True
+        if self.browser is not None and self.browser.poll() is None:
+            # Ours but not answering: it still holds the profile, so kill it before relaunching
+            print(f"🔪 [{self.name}] Killing unresponsive Chrome")
+            self.browser.kill()
+            self.browser.wait()
+        self.browser = None
+        if not self.profile:
+            print(f"⚠️ [{self.name}] No browser at {self.debugger_address} and no profile to start one")
+            return False
+        port = self.debugger_address.rsplit(":", 1)[-1]
+        print(f"🌐 [{self.name}] Starting Chrome on port {port} (profile {self.profile})")
+        try:
+            self.browser = subprocess.Popen([self.chrome_path, f"--remote-debugging-port={port}",
+                                             f"--user-data-dir={self.profile}", "--no-first-run"],
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            print(f"❌ [{self.name}] Could not start Chrome: {e}")
+            return False
+        deadline = time.monotonic() + BROWSER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if browser_alive(self.debugger_address, timeout=1.0):
+                return True
+            time.sleep(0.5)
+        print(f"❌ [{self.name}] Chrome did not open {self.debugger_address}")
+        return False
+
+    def start(self):
+        cmd = [sys.executable, "-u", AGENT, "--debugger-address", self.debugger_address,
+               "--account", self.name, "--stop-file", self.stop_file, *self.args]
+        self._clear_stop_file()
+        print(f"🚀 [{self.name}] Starting worker: {' '.join(cmd[2:])}")
+        self.proc = subprocess.Popen(cmd, cwd=SCRIPT_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     text=True, encoding="utf-8", errors="replace", bufsize=1)
+        self.started_at = self.last_output = time.monotonic()
+        self.browser_misses = 0
+        threading.Thread(target=self._pump, args=(self.proc,), name=f"{self.name}-output", daemon=True).start()
+
+    def _pump(self, proc: subprocess.Popen):
+        for line in proc.stdout:
+            self.last_output = time.monotonic()
+            print(f"[{self.name}] {line.rstrip()}", flush=True)
+
+    def _clear_stop_file(self):
+        try:
+            os.remove(self.stop_file)
+        except FileNotFoundError:
+            pass
+
+    def request_stop(self):
+        """Ask the agent to flush buyer state and exit after its current pass."""
+        if self.proc and self.proc.poll() is None:
+            with open(self.stop_file, "w"):
+                pass
+
+    def stop(self, timeout: float = GRACEFUL_STOP_TIMEOUT):
+        """Stop the worker through its stop file, terminating it if it doesn't exit within ``timeout``."""
+        if self.proc and self.proc.poll() is None:
+            self.request_stop()
+            try:
+                self.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                print(f"⚠️ [{self.name}] Did not stop within {timeout:.0f}s; terminating")
+                self.proc.terminate()
+                try:
+                    self.proc.wait(10)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+                    self.proc.wait()
+        self.proc = None
+        self._clear_stop_file()
+
+    def problem(self) -> Optional[str]:
+        """Why the worker needs a restart, or None if it looks healthy."""
+        if self.proc is None:
+            return "not running"
+        code = self.proc.poll()
+        if code is not None:
+            return f"exited with code {code}"
+        if not browser_alive(self.debugger_address):
+            # One slow answer isn't a dead browser
+            self.browser_misses += 1
+            if self.browser_misses >= 2:
+                return "browser not responding"
+        else:
+            self.browser_misses = 0
+        if self.stall_timeout and time.monotonic() - self.last_output > self.stall_timeout:
+            return f"no output for {self.stall_timeout:.0f}s"
+        return None
+
+    def restart(self, reason: str):
+        if self.proc is not None and time.monotonic() - self.started_at >= STABLE_AFTER:
+            self.failures = 0
+        self.stop()
+        self.failures += 1
+        delay = min(MAX_BACKOFF, 5.0 * 2 ** (self.failures - 1))
+        self.next_start = time.monotonic() + delay
+        print(f"🔁 [{self.name}] {reason}; restarting in {delay:.0f}s")
+
+
+class Supervisor:
+    def __init__(self, workers: List[Worker], check_interval: float = 15.0, once: bool = False):
+        self.workers = workers
+        self.check_interval = check_interval
+        self.once = once
+        self._stopping = False
+
+    def _start(self, worker: Worker):
+        if worker.start_browser():
+            worker.start()
+        else:
+            worker.restart("browser unavailable")
+
+    def run(self):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.stop())
+        for worker in self.workers:
+            self._start(worker)
+        while not self._stopping:
+            time.sleep(self.check_interval)
+            if self._stopping:
+                break
+            for worker in self.workers:
+                if worker.proc is None:
+                    if time.monotonic() >= worker.next_start:
+                        self._start(worker)
+                    continue
+                if self.once and worker.proc.poll() == 0:
+                    continue
+                reason = worker.problem()
+                if reason:
+                    worker.restart(reason)
+            if self.once and all(w.proc is not None and w.proc.poll() == 0 for w in self.workers):
+                print("✅ All workers finished")
+                break
+        self.shutdown()
+
+    def stop(self):
+        if not self._stopping:
+            print("🛑 Stopping workers...")
+        self._stopping = True
+
+    def shutdown(self):
+        # All workers wind down at once; stop() then waits for each
+        for worker in self.workers:
+            worker.request_stop()
+        for worker in self.workers:
+            worker.stop()
+
+    def status(self):
+        for w in self.workers:
+            state = "running" if w.proc and w.proc.poll() is None else "stopped"
+            print(f"   · {w.name:16s} {w.debugger_address:22s} {state:8s} restarts={w.failures}")
+
+
+def load_accounts(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        accounts = json.load(f)
+    names = [a["name"] for a in accounts]
+    addresses = [a["debugger_address"] for a in accounts]
+    if len(set(names)) != len(names) or len(set(addresses)) != len(addresses):
+        raise ValueError(f"{path}: account names and debugger addresses must be unique")
+    return accounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one agent worker per seller account",
+                                     epilog="Arguments after -- are passed to every agent.py worker.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="Accounts JSON (see accounts.example.json)")
+    parser.add_argument("--chrome", default=DEFAULT_CHROME, help="Chrome binary for accounts with a profile")
+    parser.add_argument("--check-interval", type=float, default=15.0, help="Seconds between health checks")
+    parser.add_argument("--stall-timeout", type=float, default=900.0,
+                        help="Restart a worker that printed nothing for this long (0 = never)")
+    parser.add_argument("agent_args", nargs=argparse.REMAINDER, help="Extra agent.py arguments after --")
+    args = parser.parse_args()
+
+    agent_args = args.agent_args[1:] if args.agent_args[:1] == ["--"] else args.agent_args
+    accounts = load_accounts(args.config)
+    workers = [Worker(a, args.chrome, agent_args, args.stall_timeout) for a in accounts]
+    print(f"🧑‍🤝‍🧑 Supervising {len(workers)} account(s)")
+    supervisor = Supervisor(workers, args.check_interval, once="--once" in agent_args)
+    try:
+        supervisor.run()
+    finally:
+        supervisor.status()
+
+
+if __name__ == "__main__":
+    main()
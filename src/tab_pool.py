@@ -0,0 +1,164 @@
+"""
+Parallel thread processing across tabs of the same Chrome.
+
+Handling a thread is almost all waiting on the browser: the thread loads,
+renders, and the sent message clears the composer. Selenium drives one
+window at a time, so ``--tabs N`` opens N extra tabs in the browser the
+agent is attached to and drives each one over its own CDP websocket (see
+cdp.py). TabScheduler hands queued threads (thread_queue.ThreadQueue) to
+the tabs as they come free. Each tab runs the agent's normal
+reply_in_open_thread flow through a TabAgent, whose browser calls go to
+its CDPSession.
+
+Buyer state is shared through SynchronizedBuyerState, and inventory status
+updates go through one lock. The queue hands each thread to exactly one
+tab, so per-thread read-check-reply sequences never interleave.
+
+Without the CDP websocket the pass falls back to the sequential queue.
+
+    python bench_tabs.py --tabs 1 2 4   # replies/min against a local fake Messenger
+"""
+import threading
+import time
+from typing import List, Optional
+
+from agent import MessengerAgent, THREAD_HEADER_SELECTORS, THREAD_ITEM_SELECTORS
+from buyer_state import SynchronizedBuyerState
+from cdp import DEFAULT_DEBUGGER_ADDRESS, CDPError, CDPSession, close_tab, open_tab
+from dom_snapshot import THREAD_HEADER_JS, TRANSCRIPT_JS, parse_thread_header
+from thread_queue import ThreadQueue
+from transcript import Transcript
+from waits import composer_empty, composer_present, percentile, wait_until
+
+FOCUS_COMPOSER_JS = """
+var box = document.querySelector("div[aria-label='Message'][contenteditable='true'], div[contenteditable='true'][role='textbox']");
+if (!box) return false;
+box.focus();
+return true;
+"""
+
+
+class TabAgent(MessengerAgent):
+    """MessengerAgent working one extra tab through its CDPSession.
+
+    The session stands in for the driver (it answers execute_script,
+    current_url and get), so the inherited read/reply flow runs unchanged;
+    the methods that need elements are redone as single scripts.
+    """
+
+    def __init__(self, session: CDPSession, parent: MessengerAgent, state, inventory_lock: threading.Lock):
+        super().__init__(session, parent.inventory, state=state)
+        self.cdp = session
+        self.messages_url = parent.messages_url
+        self.inventory_lock = inventory_lock
+
+    def get_transcript(self, root=None) -> Transcript:
+        try:
+            rows = self.cdp.call(TRANSCRIPT_JS, None)
+        except CDPError as e:
+            print(f"⚠️ Transcript snapshot failed: {str(e)[:100]}")
+            rows = []
+        self.transcript = Transcript.from_rows(rows)
+        return self.transcript
+
+    def get_thread_info(self):
+        try:
+            info = self.cdp.call(THREAD_HEADER_JS, THREAD_HEADER_SELECTORS, THREAD_ITEM_SELECTORS) or {}
+        except CDPError:
+            info = {}
+        return (self._current_thread_id(), *parse_thread_header(info))
+
+    def send_message(self, text, send=True):
+        try:
+            if not wait_until(self.cdp, composer_present, timeout=10, site="composer"):
+                print("⚠️ Could not find message input box")
+                return
+            self.cdp.call(FOCUS_COMPOSER_JS)
+            self.cdp.insert_text(text)
+            if send:
+                self.cdp.press_enter()
+                wait_until(self.cdp, composer_empty, timeout=5, site="send")
+                print(f"📤 Sent: {text}")
+            else:
+                print(f"📝 (DEBUG) Would send: {text}")
+        except CDPError as e:
+            print("⚠️ Failed to type message:", e)
+
+    def update_item_status(self, item, status: str):
+        with self.inventory_lock:
+            super().update_item_status(item, status)
+
+
+class TabScheduler:
+    """Runs a pass's thread queue on up to ``max_tabs`` tabs at once."""
+
+    def __init__(self, agent: MessengerAgent, max_tabs: int, debugger_address: Optional[str] = None):
+        self.agent = agent
+        self.max_tabs = max(1, max_tabs)
+        self.debugger_address = (debugger_address or CDPSession._driver_debugger_address(agent.driver)
+                                 or DEFAULT_DEBUGGER_ADDRESS)
+        self.state = SynchronizedBuyerState(agent.state) if agent.state else None
+        self.inventory_lock = threading.Lock()
+        self.workers: List[TabAgent] = []
+
+    def _ensure_tabs(self, count: int):
+        while len(self.workers) < count:
+            try:
+                target = open_tab(self.debugger_address, self.agent.messages_url)
+            except OSError as e:
+                print(f"⚠️ Could not open a tab: {e}")
+                return
+            session = CDPSession(debugger_address=self.debugger_address, target_id=target["id"])
+            if not session.direct:
+                close_tab(self.debugger_address, target["id"])
+                return
+            self.workers.append(TabAgent(session, self.agent, self.state, self.inventory_lock))
+            print(f"🗂️ Opened tab {len(self.workers)}/{self.max_tabs}")
+
+    def run(self, queue: ThreadQueue, budget: float):
+        """Drain ``queue`` across the tabs within ``budget`` seconds. Returns (handled, replied, waits)."""
+        self._ensure_tabs(min(self.max_tabs, len(queue)))
+        if not self.workers:
+            print("⚠️ No CDP tabs available; processing the queue in this tab")
+            return self.agent.process_thread_queue(queue, budget)
+
+        start = time.monotonic()
+        deadline = start + budget
+        lock = threading.Lock()
+        totals = {"handled": 0, "replied": 0}
+        waits: List[float] = []
+
+        def work(tab: TabAgent):
+            while time.monotonic() < deadline:
+                entry = queue.pop()
+                if entry is None:
+                    return
+                wait = time.monotonic() - entry.enqueued
+                replied = tab.open_and_process_thread(entry.thread_id)
+                with lock:
+                    waits.append(wait)
+                    totals["handled"] += 1
+                    totals["replied"] += int(bool(replied))
+
+        active = self.workers[:max(1, min(len(self.workers), len(queue)))]
+        threads = [threading.Thread(target=work, args=(tab,), name=f"tab-{i}", daemon=True)
+                   for i, tab in enumerate(active)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        elapsed = time.monotonic() - start
+        handled, replied = totals["handled"], totals["replied"]
+        rate = replied / elapsed * 60 if elapsed > 0 else 0.0
+        left = f", {len(queue)} left for next pass (budget {budget:.0f}s)" if queue else ""
+        wait_report = f"queue wait p50 {percentile(waits, 50):.1f}s max {max(waits):.1f}s" if waits else "no queue wait"
+        print(f"📊 Pass on {len(active)} tab(s): {handled} threads handled, {replied} replied in {elapsed:.1f}s "
+              f"({rate:.1f} replies/min); {wait_report}{left}")
+        return handled, replied, waits
+
+    def close(self):
+        for tab in self.workers:
+            tab.cdp.close()
+            close_tab(self.debugger_address, tab.cdp.target_id)
+        self.workers = []
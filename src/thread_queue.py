@@ -0,0 +1,62 @@
+"""
+Per-pass work queue of buyer threads.
+
+A pass snapshots the chat list once, queues every unread buyer thread by
+ID (aggregate "Marketplace" rows are left out), and the agent works through
+the queue within a time budget. Each thread is opened by its ID, so the
+sidebar isn't scanned again between threads. Threads left over when the
+budget runs out are picked up by the next pass's snapshot.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+
+class QueuedThread(NamedTuple):
+    priority: int
+    seq: int
+    thread_id: str
+    enqueued: float
+
+
+class ThreadQueue:
+    """Lowest ``priority`` first, FIFO among equals; a thread is queued once."""
+
+    def __init__(self):
+        self._heap: List[QueuedThread] = []
+        self._queued = set()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "ThreadQueue":
+        """Queue unread, non-aggregate rows (classify_row output) in chat list order."""
+        queue = cls()
+        for order, row in enumerate(rows):
+            if row.get("unread") and not row.get("is_marketplace_group") and row.get("thread_id"):
+                queue.push(row["thread_id"], priority=order)
+        return queue
+
+    def push(self, thread_id: str, priority: int = 0) -> bool:
+        with self._lock:
+            if thread_id in self._queued:
+                return False
+            self._queued.add(thread_id)
+            heapq.heappush(self._heap, QueuedThread(priority, next(self._seq), thread_id, time.monotonic()))
+            return True
+
+    def pop(self) -> Optional[QueuedThread]:
+        with self._lock:
+            if not self._heap:
+                return None
+            entry = heapq.heappop(self._heap)
+            self._queued.discard(entry.thread_id)
+            return entry
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
@@ -0,0 +1,94 @@
+"""
+Structured view of an open Messenger thread.
+
+A Transcript is the ordered list of messages with who sent each one, built
+from a single TRANSCRIPT_JS snapshot (or another source producing the same
+row shape). Callers read the last buyer message, the full history, or the
+latest timestamp from it instead of querying the DOM again.
+"""
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+BUYER = "buyer"
+SELLER = "seller"
+UNKNOWN = "unknown"
+
+# Row labels that are UI chrome rather than message text
+SKIP_TEXT = {"mon", "tue", "wed", "thu", "fri", "sat", "sun", "you", "sent", "delivered", "seen"}
+# Separator rows such as "Mon 3:15 PM", "Yesterday", "Oct 12, 2025, 9:04 AM". Only
+# matched against rows without a message bubble: "Saturday at 10:00" from a buyer is a message.
+_TIMESTAMP_RE = re.compile(
+    r"^(?:today|yesterday|(?:mon|tues?|wed(?:nes)?|thu(?:rs)?|fri|sat(?:ur)?|sun)(?:day)?\.?|"
+    r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.? \d{1,2}(?:, \d{4})?)?"
+    r",?\s*(?:(?:at )?\d{1,2}:\d{2}\s*(?:am|pm)?)?$",
+    re.IGNORECASE,
+)
+
+
+class Message(NamedTuple):
+    side: str  # BUYER, SELLER or UNKNOWN
+    text: str
+    order: int
+    timestamp: Optional[str] = None
+
+
+def _is_timestamp(text: str) -> bool:
+    text = text.strip()
+    return bool(text) and len(text) <= 40 and bool(_TIMESTAMP_RE.match(text))
+
+
+def _side(row: Dict[str, Any]) -> str:
+    styles = f"{row.get('justify') or ''} {row.get('parent_justify') or ''}".lower()
+    # Buyer bubbles sit left (justify-content: flex-start), ours right
+    if "start" in styles:
+        return BUYER
+    if "end" in styles:
+        return SELLER
+    left, right = row.get("left"), row.get("right")
+    if left is not None and right is not None and left != right:
+        return BUYER if left < right else SELLER
+    return UNKNOWN
+
+
+class Transcript:
+    def __init__(self, messages: Iterable[Message] = ()):
+        self.messages: List[Message] = list(messages)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "Transcript":
+        """Build from TRANSCRIPT_JS rows: drop chrome, carry separator (bubble-less row) timestamps forward."""
+        messages = []
+        current_ts = None
+        for row in rows or ():
+            text = (row.get("text") or "").strip()
+            if not text:
+                row_text = (row.get("row_text") or "").strip()
+                if _is_timestamp(row_text):
+                    current_ts = row_text
+                continue
+            if len(text) <= 3 or text.lower() in SKIP_TEXT:
+                continue
+            messages.append(Message(_side(row), text, len(messages), row.get("ts") or current_ts))
+        return cls(messages)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def by_side(self, side: str) -> List[Message]:
+        return [m for m in self.messages if m.side == side]
+
+    def last(self, side: Optional[str] = None) -> Optional[Message]:
+        for m in reversed(self.messages):
+            if side is None or m.side == side:
+                return m
+        return None
+
+    def last_buyer_message(self) -> Optional[str]:
+        m = self.last(BUYER)
+        return m.text if m else None
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [m._asdict() for m in self.messages]
@@ -0,0 +1,380 @@
+"""
+Readiness waits for Messenger and Marketplace pages.
+
+``wait_until(driver, condition, timeout)`` polls a condition and returns as
+soon as it is truthy, so a pass only waits as long as the page needs; the
+timeout is a ceiling, not a fixed cost. Conditions are plain callables
+taking the driver. Most are a single execute_script round trip.
+
+    wait_until(driver, chat_list_rendered, timeout=15, site="open_messages")
+
+Waits that name a ``site`` are timed. The last WINDOW durations per site
+are kept in wait_latency.json (shared by agent.py and click.py). Once a site
+has MIN_SAMPLES of them, its timeout becomes p95 x MARGIN, capped by the
+hard-coded worst case, and its poll interval scales with the median.
+Latency report:
+
+    python waits.py report
+"""
+import argparse
+import atexit
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from file_lock import FileLock, atomic_write_json
+
+Condition = Callable[[Any], Any]
+
+DEFAULT_POLL = 0.1
+LATENCY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wait_latency.json")
+WINDOW = 200
+MIN_SAMPLES = 10
+MARGIN = 2.0
+MIN_TIMEOUT = 0.5
+MIN_POLL, MAX_POLL = 0.02, 0.5
+FLUSH_INTERVAL = 30.0
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of a non-empty sample list."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyStats:
+    """Rolling per-site wait durations, persisted with write-behind.
+
+    ``record`` only touches memory; new samples are merged into the file
+    (under its lock, so several bots can share it) every FLUSH_INTERVAL
+    seconds and at exit.
+    """
+
+    def __init__(self, path: str = LATENCY_PATH, window: int = WINDOW):
+        self.path = path
+        self.window = window
+        self.sites: Dict[str, Dict[str, Any]] = self._read()
+        self._new: Dict[str, Dict[str, Any]] = {}
+        self._last_flush = time.monotonic()
+        # Tab workers (tab_pool.py) record from several threads
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def record(self, site: str, seconds: float, default: float, timed_out: bool = False):
+        with self._lock:
+            for table in (self.sites, self._new):
+                entry = table.setdefault(site, {"samples": [], "timeouts": 0, "default": default})
+                entry["samples"].append(round(seconds, 4))
+                del entry["samples"][:-self.window]
+                entry["timeouts"] += int(timed_out)
+                entry["default"] = default
+            if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._new:
+            return
+        try:
+            with FileLock(self.path):
+                merged = self._read()
+                for site, new in self._new.items():
+                    entry = merged.setdefault(site, {"samples": [], "timeouts": 0, "default": new["default"]})
+                    entry["samples"] = (entry["samples"] + new["samples"])[-self.window:]
+                    entry["timeouts"] += new["timeouts"]
+                    entry["default"] = new["default"]
+                atomic_write_json(self.path, merged, separators=(",", ":"))
+            self.sites = merged
+            self._new = {}
+        except Exception as e:
+            print(f"⚠️ Failed to save wait latencies: {e}")
+        self._last_flush = time.monotonic()
+
+    def samples(self, site: str) -> List[float]:
+        return self.sites.get(site, {}).get("samples", [])
+
+    def timeout_for(self, site: str, default: float) -> float:
+        samples = self.samples(site)
+        if len(samples) < MIN_SAMPLES:
+            return default
+        return min(default, max(MIN_TIMEOUT, percentile(samples, 95) * MARGIN))
+
+    def poll_for(self, site: str, default: float = DEFAULT_POLL) -> float:
+        samples = self.samples(site)
+        if len(samples) < MIN_SAMPLES:
+            return default
+        return min(MAX_POLL, max(MIN_POLL, percentile(samples, 50) / 10))
+
+
+_stats: Optional[LatencyStats] = None
+
+
+def latency_stats() -> LatencyStats:
+    global _stats
+    if _stats is None:
+        _stats = LatencyStats()
+    return _stats
+
+_CHAT_LIST_JS = """
+return document.querySelectorAll("a[href*='/messages/t/'], div[aria-label='Chats'] div[role='row']").length;
+"""
+
+# Message rows of the open thread only; the chat list's rows are div[role="row"] too
+ROW_SIGNATURE_JS = """
+var scope = document.querySelector('div[role="main"]') || document;
+var rows = scope.querySelectorAll('div[role="row"]');
+var last = rows.length ? rows[rows.length - 1] : null;
+return [rows.length, last ? (last.innerText || '').length : 0];
+"""
+
+# arguments: [thread header CSS selectors]
+# returns: [header text longer than 1 char or null, thread row count, last thread row text]
+THREAD_KEY_JS = """
+var sels = arguments[0] || [], header = null;
+for (var i = 0; i < sels.length && header === null; i++) {
+    var els = document.querySelectorAll(sels[i]);
+    for (var j = 0; j < els.length; j++) {
+        var t = (els[j].innerText || '').trim();
+        if (t.length > 1) { header = t; break; }
+    }
+}
+var scope = document.querySelector('div[role="main"]') || document;
+var rows = scope.querySelectorAll('div[role="row"]');
+var last = rows.length ? (rows[rows.length - 1].innerText || '').slice(0, 200) : '';
+return [header, rows.length, last];
+"""
+
+COMPOSER_JS = """
+var box = document.querySelector("div[contenteditable='true'][role='textbox'], div[aria-label='Message'][contenteditable='true']");
+return box ? [true, (box.innerText || '').trim().length] : [false, 0];
+"""
+
+
+def wait_until(driver, condition: Condition, timeout: float = 10.0, poll: Optional[float] = None,
+               site: Optional[str] = None, record_timeouts: bool = True):
+    """Poll ``condition(driver)`` until it returns something truthy.
+
+    Returns that value, or None once the timeout passes. Exceptions from the
+    condition (stale elements, a page mid-navigation) count as "not ready
+    yet". With a ``site``, ``timeout`` is the worst-case ceiling and the
+    actual timeout/poll come from that site's observed latencies. Set
+    ``record_timeouts=False`` for waits where running out is the normal
+    outcome (e.g. "did scrolling load more rows?").
+    """
+    default = timeout
+    if site:
+        stats = latency_stats()
+        timeout = stats.timeout_for(site, default)
+        if poll is None:
+            poll = stats.poll_for(site)
+    if poll is None:
+        poll = DEFAULT_POLL
+    start = time.monotonic()
+    deadline = start + timeout
+    while True:
+        try:
+            value = condition(driver)
+            if value:
+                if site:
+                    latency_stats().record(site, time.monotonic() - start, default)
+                return value
+        except Exception:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            if site and record_timeouts:
+                latency_stats().record(site, time.monotonic() - start, default, timed_out=True)
+            print(f"⌛ Wait timed out after {timeout:.1f}s ({site or getattr(condition, '__name__', 'condition')})")
+            return None
+        time.sleep(min(poll, remaining))
+
+
+def document_ready(driver) -> bool:
+    return driver.execute_script("return document.readyState") == "complete"
+
+
+def chat_list_rendered(driver) -> int:
+    """Number of thread links / chat rows on the page (0 until the list renders)."""
+    return driver.execute_script(_CHAT_LIST_JS)
+
+
+def composer_present(driver) -> bool:
+    return bool(driver.execute_script(COMPOSER_JS)[0])
+
+
+def composer_empty(driver) -> bool:
+    """True once the composer has been cleared, i.e. the typed message went out."""
+    present, length = driver.execute_script(COMPOSER_JS)
+    return bool(present) and length == 0
+
+
+def url_changed(old_url: str) -> Condition:
+    def check(driver):
+        return driver.current_url != old_url
+    check.__name__ = "url_changed"
+    return check
+
+
+def url_contains(fragment: str) -> Condition:
+    def check(driver):
+        return fragment in driver.current_url
+    check.__name__ = f"url_contains({fragment})"
+    return check
+
+
+def on_thread(url: Optional[str], thread_id) -> bool:
+    """``url`` is thread ``thread_id`` (/t/123 doesn't match /t/1234)."""
+    return bool(url) and re.search(rf"/t/{re.escape(str(thread_id))}(?:[/?#]|$)", url) is not None
+
+
+def url_on_thread(thread_id) -> Condition:
+    def check(driver):
+        return on_thread(driver.current_url, thread_id)
+    check.__name__ = f"url_on_thread({thread_id})"
+    return check
+
+
+def rows_stable(quiet: float = 0.4) -> Condition:
+    """Thread rows exist and their count / last row haven't changed for ``quiet`` seconds."""
+    state = {"sig": None, "since": 0.0}
+
+    def check(driver):
+        sig = tuple(driver.execute_script(ROW_SIGNATURE_JS))
+        now = time.monotonic()
+        if sig != state["sig"]:
+            state["sig"], state["since"] = sig, now
+            return False
+        return sig[0] > 0 and now - state["since"] >= quiet
+    check.__name__ = "rows_stable"
+    return check
+
+
+def thread_key(driver, header_selectors: List[str]) -> tuple:
+    """What identifies the rendered thread: (header, row count, last row text)."""
+    try:
+        return tuple(driver.execute_script(THREAD_KEY_JS, header_selectors))
+    except Exception:
+        return (None, 0, "")
+
+
+def thread_changed(before: tuple, key) -> bool:
+    """Whether thread_key ``key`` shows a rendered thread other than ``before``."""
+    header, count, last = key
+    if not count:
+        return False
+    if header and before[0]:
+        return header != before[0]
+    # No header on one side (selectors missed, nothing was open, or mid-render): compare the rows
+    return (count, last) != tuple(before[1:])
+
+
+def thread_switched(before: tuple, header_selectors: List[str]) -> Condition:
+    """The thread pane has rows and no longer shows the thread ``before`` (a thread_key).
+
+    Unlike url_changed, this stays false while the old thread is still
+    rendered under the new URL.
+    """
+    def check(driver):
+        return thread_changed(before, driver.execute_script(THREAD_KEY_JS, header_selectors))
+    check.__name__ = "thread_switched"
+    return check
+
+
+def any_of(*conditions: Condition) -> Condition:
+    def check(driver):
+        for cond in conditions:
+            try:
+                value = cond(driver)
+            except Exception:
+                continue
+            if value:
+                return value
+        return False
+    check.__name__ = "any_of(" + ", ".join(getattr(c, "__name__", "?") for c in conditions) + ")"
+    return check
+
+
+_ENABLED_JS = """
+var el = arguments[0], style = window.getComputedStyle(el);
+return el.getAttribute('aria-disabled') !== 'true' && !el.hasAttribute('disabled')
+    && style.opacity !== '0.5' && style.pointerEvents !== 'none';
+"""
+
+
+def element_present(by: str, selector: str) -> Condition:
+    def check(driver):
+        return driver.find_element(by, selector)
+    check.__name__ = f"element_present({selector[:40]})"
+    return check
+
+
+def element_absent(by: str, selector: str) -> Condition:
+    def check(driver):
+        return not driver.find_elements(by, selector)
+    check.__name__ = f"element_absent({selector[:40]})"
+    return check
+
+
+def element_enabled(by: str, selector: str) -> Condition:
+    """The element exists and isn't disabled (aria-disabled, disabled, dimmed or pointer-events: none)."""
+    def check(driver):
+        el = driver.find_element(by, selector)
+        return el if driver.execute_script(_ENABLED_JS, el) else None
+    check.__name__ = f"element_enabled({selector[:40]})"
+    return check
+
+
+def report(path: str = LATENCY_PATH):
+    stats = LatencyStats(path)
+    if not stats.sites:
+        print(f"No wait latencies recorded yet ({path})")
+        return
+    print(f"{'site':28s} {'n':>5s} {'t/o':>4s} {'p50':>7s} {'p90':>7s} {'p95':>7s} {'max':>7s} "
+          f"{'default':>8s} {'timeout':>8s} {'poll':>6s}")
+    for site in sorted(stats.sites):
+        entry = stats.sites[site]
+        samples = entry.get("samples") or []
+        if not samples:
+            continue
+        default = entry.get("default", 10.0)
+        print(f"{site:28s} {len(samples):5d} {entry.get('timeouts', 0):4d} "
+              f"{percentile(samples, 50):7.2f} {percentile(samples, 90):7.2f} {percentile(samples, 95):7.2f} "
+              f"{max(samples):7.2f} {default:8.1f} {stats.timeout_for(site, default):8.2f} "
+              f"{stats.poll_for(site):6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wait-site latency tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="Show the latency distribution and derived timeout per wait site")
+    rep.add_argument("--path", default=LATENCY_PATH)
+    sub.add_parser("reset", help="Forget all recorded latencies")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(args.path)
+    elif args.command == "reset":
+        try:
+            os.remove(LATENCY_PATH)
+        except FileNotFoundError:
+            pass
+        print(f"🧹 Cleared {LATENCY_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Sync data/list.xlsx (or listDataFeed.xlsx) into output.json.
+
+The sheet is streamed row by row straight from the xlsx zip (sharedStrings
+plus the worksheet XML via iterparse), so memory stays flat regardless of
+row count and no spreadsheet library is needed. Each row is hashed; hashes
+from the previous run live in ``output.json.rowhash.json``, and only added,
+changed or deleted rows are appended to the inventory journal. Status values
+the bots set (IN_CONVO, Posted, ...) are kept unless the Status cell itself
+was edited in the sheet since the last sync.
+
+Usage:
+    python xlsx_import.py [../data/list.xlsx ...] [--json output.json] [--images-dir C:\\sell\\images]
+"""
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterator, List, Optional
+
+from file_lock import atomic_write_json
+from inventory import (OUTPUT_JSON, append_item_changes, canonical_field, compact_items, get_photo_paths,
+                       journal_path)
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_XLSX = os.path.join(SCRIPT_DIR, "..", "data", "list.xlsx")
+DEFAULT_IMAGES_DIR = os.getenv("IMAGES_DIR", r"C:\sell\images")
+NUMERIC_FIELDS = ("ID", "Price", "Min_Price", "Zip_Code")
+# Fold the journal back into output.json once it holds this many records
+COMPACT_THRESHOLD = 5000
+
+
+_column_cache: Dict[str, int] = {}
+
+
+def _column_index(ref: str) -> int:
+    letters = ref.rstrip("0123456789")
+    idx = _column_cache.get(letters)
+    if idx is None:
+        idx = 0
+        for ch in letters:
+            idx = idx * 26 + ord(ch) - 64
+        idx = _column_cache[letters] = idx - 1
+    return idx
+
+
+def _text(elem) -> str:
+    # Plain <t>, or rich-text runs <r><t>; phonetic hints (<rPh>) are skipped
+    t = elem.find(_NS + "t")
+    if t is not None:
+        return t.text or ""
+    return "".join(r.findtext(_NS + "t") or "" for r in elem.findall(_NS + "r"))
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> List[str]:
+    try:
+        src = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    strings = []
+    with src:
+        for _, elem in ET.iterparse(src):
+            if elem.tag == _NS + "si":
+                strings.append(_text(elem))
+                elem.clear()
+    return strings
+
+
+def _sheet_member(zf: zipfile.ZipFile, sheet: Optional[str]) -> str:
+    """Zip member of the named sheet (first sheet by default)."""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    sheets = workbook.find(_NS + "sheets")
+    chosen = None
+    for s in sheets:
+        if sheet is None or s.get("name") == sheet:
+            chosen = s
+            break
+    if chosen is None:
+        raise ValueError(f"Sheet {sheet!r} not found")
+    rid = chosen.get(_REL_NS + "id")
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(_PKG_REL_NS + "Relationship"):
+        if rel.get("Id") == rid:
+            target = rel.get("Target")
+            return target.lstrip("/") if target.startswith("/") else posixpath.normpath("xl/" + target)
+    raise ValueError(f"No worksheet part for sheet {chosen.get('name')!r}")
+
+
+def _cell_value(cell, shared: List[str]):
+    kind = cell.get("t")
+    if kind == "inlineStr":
+        inline = cell.find(_NS + "is")
+        return _text(inline) if inline is not None else None
+    v = cell.findtext(_NS + "v")
+    if v is None:
+        return None
+    if kind == "s":
+        return shared[int(v)]
+    if kind in ("str", "d"):
+        return v
+    if kind == "b":
+        return v == "1"
+    if kind == "e":
+        return None
+    num = float(v)
+    return int(num) if num.is_integer() else num
+
+
+def iter_rows(xlsx_path: str, sheet: Optional[str] = None) -> Iterator[List[Any]]:
+    """Yield each sheet row as a list of cell values, parsing one row at a time.
+
+    Only "end" events are requested (about half the cost of start+end);
+    each row is cleared once yielded, so just its empty shell stays behind.
+    """
+    cell_tag, row_tag = _NS + "c", _NS + "row"
+    with zipfile.ZipFile(xlsx_path) as zf:
+        shared = _shared_strings(zf)
+        with zf.open(_sheet_member(zf, sheet)) as src:
+            cells = []
+            for _, elem in ET.iterparse(src):
+                tag = elem.tag
+                if tag == cell_tag:
+                    value = _cell_value(elem, shared)
+                    if value is not None and value != "":
+                        ref = elem.get("r")
+                        cells.append((_column_index(ref) if ref else len(cells), value))
+                elif tag == row_tag:
+                    values: List[Any] = []
+                    if cells:
+                        values = [None] * (max(idx for idx, _ in cells) + 1)
+                        for idx, value in cells:
+                            values[idx] = value
+                        cells = []
+                    elem.clear()
+                    yield values
+
+
+def _photo_paths(value, images_dir: str) -> List[str]:
+    paths = []
+    sep = "\\" if "\\" in images_dir else "/"
+    for name in get_photo_paths({"Photo_Paths": value}):
+        if not (os.path.isabs(name) or re.match(r"^[A-Za-z]:[\\/]", name) or name.startswith("\\\\")):
+            name = images_dir.rstrip("\\/") + sep + name
+        paths.append(name)
+    return paths
+
+
+def _header(rows: Iterator[List[Any]]) -> List[Optional[str]]:
+    """Consume rows up to the first non-empty one and map it to canonical field names."""
+    for values in rows:
+        if values:
+            return [canonical_field(v) if v is not None else None for v in values]
+    return []
+
+
+def _row_to_item(header: List[Optional[str]], values: List[Any], images_dir: str) -> Dict[str, Any]:
+    item = {field: None for field in header if field}
+    for field, value in zip(header, values):
+        if field:
+            item[field] = value.strip() if isinstance(value, str) else value
+    for field in NUMERIC_FIELDS:
+        value = item.get(field)
+        if isinstance(value, str):
+            try:
+                num = float(value.replace(",", "").lstrip("$"))
+                item[field] = int(num) if num.is_integer() else num
+            except ValueError:
+                pass
+    if "Photo_Paths" in item:
+        item["Photo_Paths"] = _photo_paths(item["Photo_Paths"], images_dir)
+    return item
+
+
+def iter_items(xlsx_path: str, sheet: Optional[str] = None,
+               images_dir: str = DEFAULT_IMAGES_DIR) -> Iterator[Dict[str, Any]]:
+    """Yield one inventory item per sheet row that has an ID, in output.json's shape."""
+    rows = iter_rows(xlsx_path, sheet)
+    header = _header(rows)
+    for values in rows:
+        item = _row_to_item(header, values, images_dir)
+        if item.get("ID") is not None:
+            yield item
+
+
+def row_hash(values: List[Any], skip: int = -1) -> str:
+    """Digest of a raw sheet row, leaving out column ``skip`` (Status, tracked separately)."""
+    data = "\x1f".join("" if v is None else str(v) for i, v in enumerate(values) if i != skip)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def hash_path(json_path: str) -> str:
+    return json_path + ".rowhash.json"
+
+
+def _load_hashes(path: str) -> Dict[str, Dict[str, List]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def sync(xlsx_path: str, json_path: str = OUTPUT_JSON, sheet: Optional[str] = None,
+         images_dir: str = DEFAULT_IMAGES_DIR, dry_run: bool = False) -> Dict[str, Any]:
+    """Push sheet changes since the last sync into the inventory store.
+
+    Returns counts of added/changed/deleted/unchanged rows plus parse and
+    write timings (seconds).
+    """
+    json_path = os.path.join(SCRIPT_DIR, json_path)
+    hashes = _load_hashes(hash_path(json_path))
+    source = os.path.basename(xlsx_path)
+    previous = hashes.get(source, {})
+    seen: Dict[str, List] = {}
+    records = []
+    stats = {"added": 0, "changed": 0, "deleted": 0, "unchanged": 0}
+
+    t0 = time.perf_counter()
+    rows = iter_rows(xlsx_path, sheet)
+    header = _header(rows)
+    if "ID" not in header:
+        raise ValueError(f"{xlsx_path}: no ID column in the header row")
+    id_col = header.index("ID")
+    status_col = header.index("Status") if "Status" in header else -1
+    # Rows are compared by hashing the raw cells; only rows whose hash moved
+    # are converted into items.
+    for values in rows:
+        if id_col >= len(values) or values[id_col] is None:
+            continue
+        status = values[status_col] if 0 <= status_col < len(values) else None
+        status = status.strip() if isinstance(status, str) else status
+        key = str(values[id_col]).strip()
+        digest = row_hash(values, status_col)
+        seen[key] = [digest, status]
+        old = previous.get(key)
+        if old == [digest, status]:
+            stats["unchanged"] += 1
+            continue
+        stats["added" if old is None else "changed"] += 1
+        item = _row_to_item(header, values, images_dir)
+        fields = {k: v for k, v in item.items() if k != "Status"}
+        rec = {"id": item["ID"], "f": fields}
+        if old is not None and old[1] != status:
+            fields["Status"] = status  # edited in the sheet: the sheet wins
+        elif status:
+            rec["s"] = status  # only fills in a missing Status
+        records.append(rec)
+    for key, (digest, status) in previous.items():
+        if key not in seen:
+            stats["deleted"] += 1
+            records.append({"id": int(key) if key.lstrip("-").isdigit() else key, "d": 1})
+    parse_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    if records and not dry_run:
+        append_item_changes(json_path, records)
+        hashes[source] = seen
+        atomic_write_json(hash_path(json_path), hashes, ensure_ascii=False, separators=(",", ":"))
+    write_time = time.perf_counter() - t0
+
+    stats.update(parse_seconds=parse_time, write_seconds=write_time)
+    return stats
+
+
+def journal_records(json_path: str = OUTPUT_JSON) -> int:
+    try:
+        with open(journal_path(os.path.join(SCRIPT_DIR, json_path)), "rb") as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the inventory spreadsheet into output.json")
+    parser.add_argument("xlsx", nargs="*", default=[DEFAULT_XLSX], help="Spreadsheet(s) to import")
+    parser.add_argument("--json", default=OUTPUT_JSON, help="Inventory JSON to update")
+    parser.add_argument("--sheet", default=None, help="Sheet name (default: first sheet)")
+    parser.add_argument("--images-dir", default=DEFAULT_IMAGES_DIR,
+                        help="Folder prefixed to bare photo file names")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing")
+    parser.add_argument("--compact", action="store_true", help="Fold the journal into output.json afterwards")
+    args = parser.parse_args()
+
+    for xlsx_path in args.xlsx:
+        stats = sync(xlsx_path, args.json, args.sheet, args.images_dir, args.dry_run)
+        print(f"📥 {os.path.basename(xlsx_path)}: {stats['added']} added, {stats['changed']} changed, "
+              f"{stats['deleted']} deleted, {stats['unchanged']} unchanged "
+              f"(parse {stats['parse_seconds'] * 1000:.0f} ms, write {stats['write_seconds'] * 1000:.1f} ms)")
+    if not args.dry_run and (args.compact or journal_records(args.json) >= COMPACT_THRESHOLD):
+        count = compact_items(os.path.join(SCRIPT_DIR, args.json))
+        print(f"🗜️ Compacted journal into {args.json} ({count} items)")
+
+
+if __name__ == "__main__":
+    main()